@@ -1,13 +1,23 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 import random
-from email_formation import intiation_email, error_email, ammendment_email
-from pdf_formation import create_pdf
+from email_formation import intiation_email, error_email, ammendment_email, duplicate_email
+from pdf_formation import create_pdf, create_pdf_and_image
+from run_planner import RunPlan, dry_run_requested
+from duplicate_detection import DuplicateIndex, merge_values, same_person
+from preference_index import update_preferences
+from search_index import update_search_index
+from artifact_store import collect_garbage
+from run_journal import RunJournal, frame_to_json, frame_from_json
+from render_pipeline import run_pipeline
+from sheet_stream import read_sheet
+from sheets_client import authorize
+from tenancy import current_tenant, open_sheets, data_path
+from profiling import profile_stage
+from work_leases import Worker, LEASE_TTL_SECONDS, submission_key, amendment_key, parse_timestamp, sheet_timestamp
 from dotenv import load_dotenv
+from gspread.utils import rowcol_to_a1
 import os
 from datetime import datetime
-import yaml
 import warnings
 
 # Ignore FutureWarning about dtype incompatibility
@@ -15,9 +25,11 @@ warnings.filterwarnings('ignore', category=FutureWarning)
 
 load_dotenv()
 
+# Community being processed (the .env setup unless run_tenants.py selected one)
+tenant = current_tenant()
+
 # Load config.yaml
-with open("category_names.yaml", "r") as file:
-    config = yaml.safe_load(file)
+config = tenant.load_config()
 
 # RAW_PROFILE_GENERATOR (variables)
 raw = config['2a']
@@ -36,27 +48,44 @@ proc = config ['3ab']
 SERVICE_ACCOUNT_JSON = os.getenv("SERVICE_ACCOUNT_JSON")
 
 # Google Sheet name (linked to your Form responses)
-RAW_PROFILE_GENERATOR = os.getenv("RAW_PROFILE_GENERATOR")
-AMMENDED_PROFILE_GENERATOR  = os.getenv("AMMENDED_PROFILE_GENERATOR")
-PROC_PROFILE_GENERATOR = os.getenv("PROC_PROFILE_GENERATOR")
+RAW_PROFILE_GENERATOR = tenant.sheets["raw"]
+AMMENDED_PROFILE_GENERATOR  = tenant.sheets["amendments"]
+PROC_PROFILE_GENERATOR = tenant.sheets["processed"]
 
 
 # Gmail credentials for sending emails (can use App Password)
 GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")  # Replace with your app password
 
+# Pre-render the Telegram channel image alongside each PDF (bot then only uploads)
+PRERENDER_IMAGES = os.getenv("PRERENDER_IMAGES", "").strip().lower() in ("1", "true", "yes")
+
+# Submissions sharing an email / phone with another profile (e.g. siblings filed by one representative):
+# "annotate" (process as a new profile, log to data/duplicates.csv), "flag" (skip, log and email the
+# applicant why) or "merge" into the earlier profile
+DUPLICATE_ACTION = os.getenv("DUPLICATE_ACTION", "annotate").strip().lower()
+DUPLICATES_LOG = data_path("data/duplicates.csv")
+
+# Dry run (--dry-run or DRY_RUN=1): do all reads and diffing, only report the planned writes
+DRY_RUN = dry_run_requested()
+
+# Email senders by kind; a dry run swaps in stand-ins that only record the email
+send_email = {"initiation": intiation_email, "error": error_email, "amendment": ammendment_email, "duplicate": duplicate_email}
+
 # -----------------------------
 # AUTHENTICATE WITH GOOGLE SHEETS
 # -----------------------------
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_ACCOUNT_JSON, scope)
-client = gspread.authorize(creds)
-raw_profile_generator = client.open(RAW_PROFILE_GENERATOR).sheet1
-amm_profile_generator = client.open(AMMENDED_PROFILE_GENERATOR).sheet1
-proc_profile_generator = client.open(PROC_PROFILE_GENERATOR).sheet1
+# Cached access token and spreadsheet keys; the sheets are opened in parallel
+client = authorize(SERVICE_ACCOUNT_JSON)
+raw_profile_generator, amm_profile_generator, proc_profile_generator = open_sheets(client, "raw", "amendments", "processed")
+
+if DRY_RUN:
+    plan = RunPlan("profile_generator")
+    raw_profile_generator = plan.track(raw_profile_generator, "raw")
+    amm_profile_generator = plan.track(amm_profile_generator, "amendments")
+    proc_profile_generator = plan.track(proc_profile_generator, "processed")
+    send_email = {kind: plan.email_stub(kind, send) for kind, send in send_email.items()}
+    print("🧪 DRY RUN: no sheets, PDFs or emails will be written")
 
 print(
     "Authenticated! Read from:",
@@ -72,51 +101,92 @@ print(
 # -----------------------------
 
 
-def load_sheets(sheet):
-    df = pd.DataFrame(sheet.get_all_records())
-    if df.empty:
-        headers = sheet.row_values(1)
-        df = pd.DataFrame(columns=headers)
-    return df 
+def load_sheets(sheet, keep=None):
+    # Streamed in SHEET_CHUNK_ROWS pages; keep(chunk) filters rows as they arrive
+    return read_sheet(sheet, keep)
 
-raw_records = load_sheets(raw_profile_generator)  # returns a list of dicts
-amm_records = load_sheets(amm_profile_generator)
-proc_records = load_sheets(proc_profile_generator)
 
+def load_records():
+    """
+    Download the three sheets and work out what this run has to do.
 
-# Filter newer records
-if proc_records.empty:
-    new_records = raw_records.copy()
+    Returns (proc_records, new_records, amm_records): the processed sheet,
+    raw submissions newer than it (renamed to processed column names) and
+    amendments newer than it.
 
+    Sharded workers finish at different times, so the newest processed
+    timestamp says nothing about another shard's submissions. With more than
+    one shard, new submissions are instead those not yet in the processed
+    sheet (by timestamp + email) nor completed in the lease store, and
+    amendments are selected by their empty Amendment Status alone.
+    """
+    proc_records = load_sheets(proc_profile_generator)
 
-else:
-    raw_records[raw["Timestamp"]] = pd.to_datetime(raw_records[raw["Timestamp"]], format='mixed', dayfirst=True)
-    proc_records[proc["Timestamp"]] = pd.to_datetime(proc_records[proc["Timestamp"]], format='mixed', dayfirst=True)
-    proc_records[proc["Ammended Timestamp"]] = pd.to_datetime(proc_records[proc["Ammended Timestamp"]], format='mixed', dayfirst=True)
 
+    # Filter newer records (chunk by chunk, so only new raw / amendment rows are held in memory)
+    if worker.shards > 1:
+        processed = worker.done_keys("submission:")
+        if not proc_records.empty:
+            processed |= {submission_key(t, e) for t, e in zip(proc_records[proc["Timestamp"]], proc_records[proc["Email"]])}
+            for col in (proc["Timestamp"], proc["Ammended Timestamp"]):
+                proc_records[col] = proc_records[col].map(parse_timestamp)
 
-    latest_proc_row = proc_records[[proc["Timestamp"],proc["Ammended Timestamp"]]].max()
-    latest_proc_time = latest_proc_row.max()
+        def unprocessed_raw(chunk):
+            keys = [submission_key(t, e) for t, e in zip(chunk[raw["Timestamp"]], chunk[raw["Email"]])]
+            return chunk[[key not in processed for key in keys]].copy()
 
-    new_records = raw_records[raw_records["Timestamp"] > latest_proc_time].copy()
-    new_records["Timestamp"] = new_records["Timestamp"].astype(str)
+        new_records = load_sheets(raw_profile_generator, unprocessed_raw)
+        amm_records = load_sheets(amm_profile_generator)
 
-    if not amm_records.empty:
-        amm_records[amm["Ammended Timestamp"]] = pd.to_datetime(amm_records[amm["Ammended Timestamp"]], format='mixed', dayfirst=True)
-        amm_records = amm_records[amm_records[amm["Ammended Timestamp"]] > latest_proc_time].copy()
+    elif proc_records.empty:
+        new_records = load_sheets(raw_profile_generator)
+        amm_records = load_sheets(amm_profile_generator)
+
+    else:
+        proc_records[proc["Timestamp"]] = pd.to_datetime(proc_records[proc["Timestamp"]], format='mixed', dayfirst=True)
+        proc_records[proc["Ammended Timestamp"]] = pd.to_datetime(proc_records[proc["Ammended Timestamp"]], format='mixed', dayfirst=True)
+
+        latest_proc_row = proc_records[[proc["Timestamp"],proc["Ammended Timestamp"]]].max()
+        latest_proc_time = latest_proc_row.max()
 
-new_records.insert(1, proc["Ammended Timestamp"], "")
-new_records.insert(2, proc["Profile ID"], "")
-new_records.insert(3, proc["Profile Key"], "")
-new_records.columns = [col.strip() for col in new_records.columns]
+        def newer_raw(chunk):
+            chunk[raw["Timestamp"]] = pd.to_datetime(chunk[raw["Timestamp"]], format='mixed', dayfirst=True)
+            chunk = chunk[chunk["Timestamp"] > latest_proc_time].copy()
+            chunk["Timestamp"] = chunk["Timestamp"].astype(str)
+            return chunk
 
-# Rename columns from raw (2a) to proc (3ab) using shared keys
-column_rename_map = {}
-for key in raw.keys():
-    if key in proc:  # If the key exists in both raw and proc configs
-        column_rename_map[raw[key]] = proc[key]
+        def newer_amendments(chunk):
+            chunk[amm["Ammended Timestamp"]] = pd.to_datetime(chunk[amm["Ammended Timestamp"]], format='mixed', dayfirst=True)
+            return chunk[chunk[amm["Ammended Timestamp"]] > latest_proc_time].copy()
 
-new_records.rename(columns=column_rename_map, inplace=True)
+        new_records = load_sheets(raw_profile_generator, newer_raw)
+        amm_records = load_sheets(amm_profile_generator, newer_amendments)
+
+    new_records.insert(1, proc["Ammended Timestamp"], "")
+    new_records.insert(2, proc["Profile ID"], "")
+    new_records.insert(3, proc["Profile Key"], "")
+    new_records.columns = [col.strip() for col in new_records.columns]
+
+    # Rename columns from raw (2a) to proc (3ab) using shared keys
+    column_rename_map = {}
+    for key in raw.keys():
+        if key in proc:  # If the key exists in both raw and proc configs
+            column_rename_map[raw[key]] = proc[key]
+
+    new_records.rename(columns=column_rename_map, inplace=True)
+
+    return proc_records, new_records, amm_records
+
+
+# Shard of the pending records this process works on (--shard I/N or WORKER_SHARD, default 0/1);
+# leases in data/leases.sqlite keep overlapping runs off each other's records
+worker = Worker("profile_generator", enabled=not DRY_RUN)
+
+# Crash-safe journal: an interrupted run resumes from it instead of re-reading the sheets
+journal = RunJournal(
+    path="data/run_journal.jsonl" if worker.shards == 1 else f"data/run_journal_{worker.label}.jsonl",
+    enabled=not DRY_RUN,
+)
 
 
 # -----------------------------
@@ -126,25 +196,127 @@ new_records.rename(columns=column_rename_map, inplace=True)
 
 from datetime import datetime
 
+
+def render_profile(data, profile_id):
+    """Create the profile PDF (and its channel image if PRERENDER_IMAGES is set); returns the PDF path."""
+    if DRY_RUN:
+        plan.record_pdf(profile_id)
+        return None
+    if PRERENDER_IMAGES:
+        pdf_file, _ = create_pdf_and_image(data, profile_id)
+        return pdf_file
+    return create_pdf(data, profile_id)
+
+
+def render_profile_once(key, data, profile_id):
+    """render_profile, skipped on resume if the journal already has this PDF."""
+    rendered = journal.data(key, "pdf_rendered")
+    if rendered.get("pdf") and os.path.exists(rendered["pdf"]):
+        return rendered["pdf"]
+    pdf_file = render_profile(data, profile_id)
+    journal.record(key, "pdf_rendered", pdf=pdf_file)
+    return pdf_file
+
+
+def cell_text(values):
+    """Sheet values as strings, with blanks (None / NaN) as ""."""
+    return values.map(lambda value: "" if pd.isna(value) else str(value))
+
+
+def normalise_amendment_ids(amm_records, amm):
+    """Validate stage helper: the amendments' Profile IDs (stripped, uppercased) and Keys (leading ' dropped)."""
+    profile_ids = cell_text(amm_records[amm["Profile ID"]]).str.strip().str.upper()
+    profile_keys = cell_text(amm_records[amm["Profile Key"]]).str.lstrip("'").str.strip()
+    return profile_ids, profile_keys
+
+
+def merge_amendments(amendments, current, protected, proc, amm):
+    """
+    Merge stage: apply every valid amendment to its processed row at once, without touching the sheet.
+
+    amendments – amendment rows with a "_row" column holding the position of
+                 their profile in current, sorted oldest first;
+    current    – the amended profiles' processed rows (columns = sheet headers).
+
+    (1) Keep existing PDF – Only update non-empty fields.
+    (2) Replace PDF completely – Replace all fields except the protected columns.
+    Several amendments to one profile apply in order, so each column ends up
+    with the value of the latest amendment that wrote it.
+
+    Returns (merged, changes): the final rows indexed like current, and
+    {row position: columns whose value changed}.
+    """
+    # Sheet header -> amendment sheet column, through the shared config keys
+    proc_keys = {}
+    for key, value in proc.items():
+        proc_keys.setdefault(value, key)
+    unmapped = [col_name for col_name in current.columns if col_name not in protected and col_name not in proc_keys]
+    if unmapped:
+        print(f"  ⚠️  WARNING: Columns {unmapped} not found in proc config - skipping")
+    mergeable = [col_name for col_name in current.columns if col_name not in protected and col_name in proc_keys]
+
+    def amendment_values(proc_key):
+        amm_col_name = amm.get(proc_key)
+        if amm_col_name in amendments.columns:
+            return cell_text(amendments[amm_col_name])
+        return pd.Series("", index=amendments.index)  # Replace blanks fields the amendment sheet doesn't have
+
+    values = pd.DataFrame({col_name: amendment_values(proc_keys[col_name]) for col_name in mergeable}, index=amendments.index)
+    non_empty = values.apply(lambda column: column.str.strip() != "")
+
+    style = cell_text(amendments[amm["Amendment Style"]]).str.strip()
+    replace = style.str.contains("Replace PDF completely", regex=False)
+    keep = style.str.contains("Keep existing", regex=False) & ~replace
+
+    # Replace writes every mergeable column, Keep only the non-empty ones
+    writes = non_empty.mul(keep, axis=0) | pd.DataFrame(True, index=values.index, columns=values.columns).mul(replace, axis=0)
+
+    # Amendment timestamp update, whatever the style
+    amended_col = proc["Ammended Timestamp"]
+    if amended_col in current.columns:
+        values[amended_col] = amendments[amm["Ammended Timestamp"]].map(sheet_timestamp)
+        writes[amended_col] = writes.get(amended_col, False) | (values[amended_col].str.strip() != "")
+
+    # Latest written value per profile and column (last() skips the unwritten NaNs), over the current row
+    latest = values.where(writes).groupby(amendments["_row"], sort=False).last()
+    merged = latest.combine_first(current.loc[latest.index])[current.columns]
+
+    changed = merged.ne(current.loc[merged.index])
+    changes = {row_pos: list(current.columns[mask]) for row_pos, mask in zip(changed.index, changed.to_numpy())}
+    return merged, changes
+
+
+@profile_stage("process_amendments")
 def process_amendments(amm_records, proc_profile_generator, proc, amm):
     """
     Process amendments directly in the Google Sheet without loading into DataFrame.
 
-    (1) Keep existing PDF – Only update non-empty fields.
-    (2) Replace PDF completely – Replace all fields except:
-        proc['Profile ID'], proc['Profile Key'], proc['Timestamp'].
+    Amendments go through three stages, each over the whole batch:
+        validate – the Profile ID / Key pair must exist in the processed sheet,
+                   otherwise the amendment is rejected before any PDF work;
+        merge    – all amendments are applied to their processed rows in memory
+                   (see merge_amendments for the two amendment styles) and the
+                   changed cells are written in one batch update;
+        render   – one PDF per amended profile, from its final merged row,
+                   sent with every amendment that went into it.
 
-    Updates are written directly into the sheet.
     Uses proc and amm config dicts to map between sheet column names.
+    Returns a dict with the applied / rendered / rejected counts.
     """
 
-    # Load entire sheet once
-    rows = proc_profile_generator.get_all_values()
+    # Load entire sheet once (journaled, so a resumed run sees the values its steps were planned against)
+    rows = journal.snapshot("amendment_rows", proc_profile_generator.get_all_values)
     headers = rows[0]
     
     # Map header -> column index (0-based)
     col_index = {h: i for i, h in enumerate(headers)}
 
+    # Map (Profile ID, Profile Key) -> row position for O(1) validation
+    profile_index = {
+        (rows[i][col_index[proc["Profile ID"]]], rows[i][col_index[proc["Profile Key"]]]): i
+        for i in range(1, len(rows))
+    }
+
     # Protected columns
     protected = {
         proc["Profile ID"],
@@ -153,130 +325,243 @@ def process_amendments(amm_records, proc_profile_generator, proc, amm):
     }
 
     # Get amendment sheet headers and ensure "Amendment Status" column exists
-    amm_headers = amm_profile_generator.row_values(1)
+    amm_headers = journal.snapshot("amendment_headers", lambda: amm_profile_generator.row_values(1))
     if "Amendment Status" not in amm_headers:
         # Add new column header
         amm_headers.append("Amendment Status")
-        amm_profile_generator.update([amm_headers], range_name='1:1')
+        if not journal.done("amendments", "status_column_added"):
+            amm_profile_generator.update([amm_headers], range_name='1:1')
+            journal.record("amendments", "status_column_added")
     amm_status_col = amm_headers.index("Amendment Status") + 1  # 1-indexed for gspread
 
-    for idx, amm_row in amm_records.iterrows():
+    counts = {"applied": 0, "rendered": 0, "rejected": 0}
+
+    def set_status(idx, key, status):
         # Calculate amendment sheet row number (idx + 2 because: +1 for header, +1 for 0-based to 1-based)
-        amm_sheet_row = idx + 2
+        if not journal.done(key, "status_written"):
+            amm_profile_generator.update_cell(idx + 2, amm_status_col, status)
+            journal.record(key, "status_written")
+            worker.complete(key)
+
+    # ---- Validate ----
+    profile_ids, profile_keys = normalise_amendment_ids(amm_records, amm)
+    amendments = amm_records.assign(**{amm["Profile ID"]: profile_ids, amm["Profile Key"]: profile_keys})
+    amendments["_row"] = [profile_index.get(pair) for pair in zip(profile_ids, profile_keys)]
+
+    # Leases and journal entries are keyed on the amendment itself (not its row, which moves if the
+    # sheet is sorted or rows are deleted); sharded by Profile ID so one profile's amendments stay in
+    # order on one worker
+    keys = pd.Series([
+        amendment_key(profile_id, amm_row[amm["Ammended Timestamp"]], amm_row[amm["Email"]])
+        for profile_id, (_, amm_row) in zip(profile_ids, amm_records.iterrows())
+    ], index=amm_records.index)
+    claimed = [worker.claim(keys[idx], shard_key=profile_id) for idx, profile_id in profile_ids.items()]
+    amendments = amendments[claimed]
+
+    for idx in amendments.index[amendments[amm["Profile ID"]] == ""]:
+        print(f"⚠️ Amendment on row {idx + 2} has no Profile ID - skipping")
+        worker.release(keys[idx])  # left as is, so a later run looks at it again
+        counts["rejected"] += 1
+
+    # If profile not found or key mismatch, mark as Failed and send error email
+    unknown = amendments[(amendments[amm["Profile ID"]] != "") & amendments["_row"].isna()]
+    for idx, amm_row in unknown.iterrows():
+        key = keys[idx]
+        profile_id, profile_key = amm_row[amm["Profile ID"]], amm_row[amm["Profile Key"]]
+        counts["rejected"] += 1
+        set_status(idx, key, "Failed")
+        if journal.done(key, "email_sent"):
+            continue
 
-        # Normalize Profile ID and Key: strip whitespace and uppercase
-        profile_id = str(amm_row.get(amm["Profile ID"], "")).strip().upper()
-        profile_key = str(amm_row.get(amm["Profile Key"], "")).lstrip("'").lstrip().strip()
+        try:
+            print(f"⚠️ Profile ID {profile_id} not found or key mismatch in processed sheet.")
+            send_email["error"](amm_row[amm['Email']], amm_row[amm['Full Name']], profile_id, profile_key)
+            journal.record(key, "email_sent")
+            print(f"📩 Profile {profile_id}: Sent ERROR email")
+        except Exception as e:
+            print(f"Profile {profile_id}: Failed to send error email: {e}")
+
+    valid = amendments[amendments["_row"].notna()].copy()
+    if valid.empty:
+        print(f"📄 Amendments applied: 0 | rendered: 0 | rejected: {counts['rejected']}")
+        return counts
+    valid["_row"] = valid["_row"].astype(int)
+
+    # ---- Merge ----
+    # Oldest first, so later amendments to a profile win (sheet order breaks ties)
+    amended_at = cell_text(valid[amm["Ammended Timestamp"]]).map(parse_timestamp)
+    valid = valid.assign(_amended_at=amended_at).sort_values(["_amended_at"], kind="stable", na_position="first")
+
+    positions = valid["_row"].unique()
+    current = pd.DataFrame(
+        [rows[row_pos] + [""] * (len(headers) - len(rows[row_pos])) for row_pos in positions],
+        index=positions, columns=headers,
+    )
+    merged, changes = merge_amendments(valid, current, protected, proc, amm)
+
+    # Write only the cells whose value actually changed, for every profile in one request.
+    # The merge is recomputed from the journaled snapshots on resume, so the journal only records that it happened.
+    if not journal.done("amendments", "cells_written"):
+        cells = [
+            {"range": rowcol_to_a1(row_pos + 1, col_index[col_name] + 1), "values": [[merged.at[row_pos, col_name]]]}
+            for row_pos, columns in changes.items() for col_name in columns
+        ]
+        if cells:
+            # USER_ENTERED like update_cell, so dates and numbers are stored as values rather than text
+            proc_profile_generator.batch_update(cells, value_input_option="USER_ENTERED")
+        journal.record("amendments", "cells_written")
+
+    # ---- Render ----
+    for row_pos, profile_amendments in valid.groupby("_row", sort=False):
+        profile_id = profile_amendments[amm["Profile ID"]].iloc[0]
+        styles = [str(style).strip() for style in profile_amendments[amm["Amendment Style"]]]
+        print(f"📊 Updated Profile ID {profile_id} from {len(profile_amendments)} amendment(s) {styles}: "
+              f"{len(changes[row_pos])} fields changed ({changes[row_pos]})")
+
+        data = merged.loc[row_pos].to_dict()
+        pdf_file = render_profile_once(f"amendment_profile:{profile_id}", data, profile_id)
+        counts["rendered"] += 1
+
+        # Mark each amendment as Complete in amendment sheet and send its email
+        for idx, amm_row in profile_amendments.iterrows():
+            key = keys[idx]
+            counts["applied"] += 1
+            set_status(idx, key, "Complete")
+            if journal.done(key, "email_sent"):
+                continue
 
-        data = amm_row.to_dict()
-        name = amm_row[amm['Full Name']]
-        email = amm_row[amm['Email']]
-        pdf_file = create_pdf(data, profile_id)
-        if not profile_id:
-            continue
+            email = amm_row[amm['Email']]
+            try:
+                send_email["amendment"](email, amm_row[amm['Full Name']], profile_id, amm_row[amm["Profile Key"]], pdf_file)
+                journal.record(key, "email_sent")
+                print(f"📩 Profile {profile_id}: Sent AMENDMENT email to {email}")
+            except Exception as e:
+                print(f"Profile {profile_id}: Failed to send amendment email: {e}")
 
-        # Update the normalized Profile ID and Key back to the dataframe
-        amm_records.at[idx, amm["Profile ID"]] = profile_id
-        amm_records.at[idx, amm["Profile Key"]] = profile_key
+    print(f"📄 Amendments applied: {counts['applied']} | rendered: {counts['rendered']} | rejected: {counts['rejected']}")
+    return counts
 
-        # Find row number in sheet (skip header → start at row 1)
-        row_num = None
-        for i in range(1, len(rows)):
-            if rows[i][col_index[proc["Profile ID"]]] == profile_id and rows[i][col_index[proc["Profile Key"]]] == profile_key:
-                row_num = i + 1   # convert to 1-indexed for gspread
-                row_data = rows[i]
-                break
 
-        # If profile not found or key mismatch, send error email
-        if row_num is None:
-            # Mark as Failed in amendment sheet
-            amm_profile_generator.update_cell(amm_sheet_row, amm_status_col, "Failed")
 
-            try:
-                print(f"⚠️ Profile ID {profile_id} not found or key mismatch in processed sheet.")
-                error_email(email, name, profile_id, profile_key)
-                print(f"📩 Profile {profile_id}: Sent ERROR email")
-            except Exception as e:
-                print(f"Profile {profile_id}: Failed to send error email: {e}")
-            continue
+def log_duplicates(entries):
+    """Append annotated / flagged duplicate submissions to DUPLICATES_LOG (each submission is logged once)."""
+    if not entries or DRY_RUN:
+        return
+    log = pd.DataFrame(entries)
+    if os.path.exists(DUPLICATES_LOG):
+        logged = pd.read_csv(DUPLICATES_LOG, dtype=str)
+        seen = set(zip(logged["Timestamp"], logged["Email"]))
+        log = log[[(str(t), str(e)) not in seen for t, e in zip(log["Timestamp"], log["Email"])]]
+    if log.empty:
+        return
+    os.makedirs(os.path.dirname(DUPLICATES_LOG), exist_ok=True)
+    log.to_csv(DUPLICATES_LOG, mode="a", header=not os.path.exists(DUPLICATES_LOG), index=False)
 
-        style = str(amm_row.get(amm["Amendment Style"], "")).strip()
-        print(f"🔍 Processing Profile ID {profile_id} with style: '{style}'")
 
-        updates_made = 0
-        column_name_list = []
-        for col_name in headers:
-            if col_name in protected:
-                continue
+def handle_duplicates(proc_records, submissions, new_records, duplicates):
+    """
+    Log (annotate / flag) or merge duplicate submissions found by DuplicateIndex.
 
-            # Find the key in proc config that matches this column name
-            proc_key = None
-            for key, value in proc.items():
-                if value == col_name:
-                    proc_key = key
-                    break
+    In "merge" mode a duplicate's non-empty answers overwrite the profile it
+    matched: in memory for profiles created in this run, or collected per
+    existing profile (returned as {proc_records position: merged row}) so the
+    processed sheet can be updated once per profile. Only a submission that
+    names the same person is merged; one that merely shares an email / phone
+    (e.g. a sibling) is annotated instead and returned in the unmerged list,
+    to become a profile of its own.
 
-            # Skip if no key found (column not in config)
-            if proc_key is None:
-                print(f"  ⚠️  WARNING: Column '{col_name}' not found in proc config - skipping")
-                continue
+    Returns (existing_merges, unmerged submission indexes).
+    """
+    protected = {proc["Profile ID"], proc["Profile Key"], proc["Timestamp"], proc["Ammended Timestamp"]}
+    existing_merges = {}
+    unmerged = []
+    flagged = []
+
+    for duplicate in duplicates:
+        row = submissions.loc[duplicate["index"]]
+        owner_type, position = duplicate["owner"]
+        if owner_type == "existing":
+            owner_label = proc_records.at[position, proc["Profile ID"]]
+            current = existing_merges.get(position, proc_records.loc[position].to_dict())
+        else:
+            owner_label = f"new submission at {submissions.at[position, proc['Timestamp']]}"
+            current = new_records.loc[position].to_dict()
+        print(f"♻️ Duplicate submission from {row[proc['Email']]} matches {owner_label} on {duplicate['matched_on']}")
+
+        merge = DUPLICATE_ACTION == "merge" and same_person(row, current, proc)
+        if DUPLICATE_ACTION == "merge" and not merge:
+            print(f"   Different name or gender from {owner_label} - kept as a new profile instead of merging")
+            unmerged.append(duplicate["index"])
+
+        if not merge:
+            flagged.append({
+                "Timestamp": row[proc["Timestamp"]],
+                "Email": row[proc["Email"]],
+                "Full Name": row[proc["Full Name"]],
+                "Matched Profile": owner_label,
+                "Matched On": duplicate["matched_on"],
+            })
+            continue
 
-            # Get the corresponding amendment sheet column name using the same key
-            amm_col_name = amm.get(proc_key)
-
-            # Replace completely → always update ALL fields (even if empty or not in amm)
-            if "Replace PDF completely" in style:
-                # Get value from amendment sheet, or empty string if no mapping
-                new_value = amm_row.get(amm_col_name, "") if amm_col_name else ""
-
-                column_name_list.append(col_name)
-                proc_profile_generator.update_cell(
-                    row_num,
-                    col_index[col_name] + 1,
-                    str(new_value) if new_value else ""
-                )
-                updates_made += 1
-
-            # Keep existing → only update if new data is non-empty
-            elif "Keep existing" in style:
-                # Skip if no mapping exists for this key in amm
-                if amm_col_name is None:
-                    continue
-
-                # Get the value from amendment sheet using the mapped column name
-                new_value = amm_row.get(amm_col_name, "")
-
-                if new_value and str(new_value).strip():
-                    column_name_list.append(col_name)
-                    proc_profile_generator.update_cell(
-                        row_num,
-                        col_index[col_name] + 1,
-                        str(new_value)
-                    )
-                    updates_made += 1
-
-        # Amendment timestamp update
-        ammend_time_val = amm_row.get(amm["Ammended Timestamp"], "")
-        if ammend_time_val and str(ammend_time_val).strip():
-            proc_profile_generator.update_cell(
-                row_num,
-                col_index[proc["Ammended Timestamp"]] + 1,
-                str(ammend_time_val)
-            )
+        merged = merge_values(current, row.to_dict(), protected)
+        if owner_type == "new":
+            for col, value in merged.items():
+                new_records.at[position, col] = value
+        else:
+            merged[proc["Ammended Timestamp"]] = sheet_timestamp(row[proc["Timestamp"]])
+            existing_merges[position] = merged
 
-        print(f"📊 Updated Profile ID {profile_id} with {updates_made} fields: ({column_name_list})")
+    log_duplicates(flagged)
+    return existing_merges, unmerged
 
-        # Mark as Complete in amendment sheet and send email
-        amm_profile_generator.update_cell(amm_sheet_row, amm_status_col, "Complete")
 
+def plan_existing_merges(proc_records, existing_merges):
+    """
+    Turn {proc_records position: merged row} into a list of cell writes per
+    profile: {"sheet_row", "profile_id", "merged", "changed": [(column number, value)]}.
+    """
+    headers = proc_records.columns.tolist()
+    merges = []
+    for position, merged in existing_merges.items():
+        original = proc_records.loc[position]
+        changed = [
+            (headers.index(col) + 1, str(merged[col])) for col in headers
+            if col in merged and str(merged[col]) != str(original.get(col, ""))
+        ]
+        merges.append({
+            "sheet_row": int(position) + 2,  # +1 for header, +1 for 0-based to 1-based
+            "profile_id": merged[proc["Profile ID"]],
+            "merged": merged,
+            "changed": changed,
+        })
+    return merges
+
+
+@profile_stage("apply_existing_merges")
+def apply_existing_merges(merges):
+    """Write merged duplicate answers into existing processed rows, re-render and email the update."""
+    for merge in merges:
+        profile_id = merge["profile_id"]
+        merged = merge["merged"]
+        key = f"merge:{profile_id}"
+
+        if not journal.done(key, "cells_written"):
+            for col_number, value in merge["changed"]:
+                proc_profile_generator.update_cell(merge["sheet_row"], col_number, value)
+            journal.record(key, "cells_written")
+            print(f"📊 Merged duplicate into Profile ID {profile_id}: ({len(merge['changed'])} cells)")
+
+        pdf_file = render_profile_once(key, merged, profile_id)
+        if journal.done(key, "email_sent"):
+            continue
         try:
-            ammendment_email(email, name, profile_id, profile_key, pdf_file)
-            print(f"📩 Profile {profile_id}: Sent AMENDMENT email to {email}")
+            send_email["amendment"](merged[proc["Email"]], merged[proc["Full Name"]], profile_id, merged[proc["Profile Key"]], pdf_file)
+            journal.record(key, "email_sent")
+            print(f"📩 Profile {profile_id}: Sent AMENDMENT email")
         except Exception as e:
             print(f"Profile {profile_id}: Failed to send amendment email: {e}")
 
 
-
 def generate_profile_key(existing_profile_key: set) -> str:
     """
     Generate a unique match authorisation code (profile_key): 5-digit code.
@@ -289,6 +574,7 @@ def generate_profile_key(existing_profile_key: set) -> str:
         if profile_key not in existing_profile_key:
             return profile_key
 
+
 def generate_unique_id(gender: str, existing_ids: set) -> str:
     """
     Generate a unique Profile ID: gender + 4-digit code.
@@ -309,7 +595,46 @@ def generate_unique_id(gender: str, existing_ids: set) -> str:
 # -----------------------------
 # MAIN WORKFLOW
 # -----------------------------
-if __name__ == "__main__":
+@profile_stage("plan_run")
+def plan_run():
+    """
+    Everything the run decides before touching a sheet: dedupe new submissions,
+    assign Profile IDs / Keys, plan merges into existing profiles and pick the
+    pending amendments. Returned as JSON so the journal can replay it on resume.
+    """
+    proc_records, new_records, amm_records = load_records()
+
+    # Claim this worker's share of the new submissions. They are sharded by email so one
+    # applicant's repeat submissions meet in the same duplicate check
+    keys = [submission_key(t, e) for t, e in zip(new_records[proc["Timestamp"]], new_records[proc["Email"]])]
+    emails = new_records[proc["Email"]].astype(str).str.strip().str.lower()
+    claimed = [worker.claim(key, shard_key=email) for key, email in zip(keys, emails)]
+    new_records = new_records[claimed]
+    submission_keys = [key for key, ok in zip(keys, claimed) if ok]
+
+    # Detect repeat submissions before any Profile IDs are assigned
+    submissions = new_records
+    duplicate_index = DuplicateIndex.from_records(proc_records, proc)
+    new_records, duplicates = duplicate_index.split_new_records(submissions)
+    existing_merges, unmerged = handle_duplicates(proc_records, submissions, new_records, duplicates)
+
+    duplicate_notices = []
+    if DUPLICATE_ACTION == "flag":
+        # Skipped submissions are answered by email (sent once the plan is journaled)
+        key_of = dict(zip(submissions.index, submission_keys))
+        duplicate_notices = [{
+            "key": key_of[duplicate["index"]],
+            "email": submissions.at[duplicate["index"], proc["Email"]],
+            "name": submissions.at[duplicate["index"], proc["Full Name"]],
+            "matched_on": duplicate["matched_on"],
+        } for duplicate in duplicates]
+    elif DUPLICATE_ACTION != "merge":
+        # Annotate only: every submission becomes a profile
+        new_records = submissions.copy()
+    elif unmerged:
+        # Matches that name someone else become profiles too, in sheet order
+        new_records = pd.concat([new_records, submissions.loc[unmerged]]).sort_index()
+    print(f"♻️ Duplicate submissions: {len(duplicates)} ({DUPLICATE_ACTION}) | New profiles: {len(new_records)}")
 
     # Generating Profile ID's
     if proc_records.empty:
@@ -321,45 +646,121 @@ if __name__ == "__main__":
 
 
     for i, row in new_records.iterrows():
+        # Reserved in the lease store so concurrent shards never hand out the same ID / key
         new_id = generate_unique_id(row[proc["Gender"]], existing_ids)
+        while not worker.reserve(f"profile_id:{new_id}"):
+            existing_ids.append(new_id)
+            new_id = generate_unique_id(row[proc["Gender"]], existing_ids)
         new_records.at[i, proc["Profile ID"]] = new_id
         existing_ids.append(new_id)
 
         new_profile_key = generate_profile_key(existing_profile_key)
+        while not worker.reserve(f"profile_key:{new_profile_key}"):
+            existing_profile_key.append(new_profile_key)
+            new_profile_key = generate_profile_key(existing_profile_key)
         new_records.at[i, proc["Profile Key"]] = new_profile_key
         existing_profile_key.append(new_profile_key)
-        print(f'{row["Profile ID"]}')
+        print(f'{new_id}')
 
-    # Write new records to processed sheet
-    if not new_records.empty:
-        if proc_records.empty:
+    # Pending amendments
+    if not amm_records.empty:
+        amm_records = amm_records[amm_records[amm['Amendment Status']].isnull()]
+
+    return {
+        "proc_was_empty": bool(proc_records.empty),
+        "submission_keys": submission_keys,
+        "new_records": frame_to_json(new_records),
+        "merges": plan_existing_merges(proc_records, existing_merges),
+        "duplicate_notices": duplicate_notices,
+        "amm_records": frame_to_json(amm_records),
+    }
+
+
+# -----------------------------
+# MAIN WORKFLOW
+# -----------------------------
+if __name__ == "__main__":
+
+    if not worker.start():
+        print(f"⏭️ Shard {worker.label} is already being processed by another run - exiting (a crashed run frees it after {LEASE_TTL_SECONDS}s)")
+        raise SystemExit(0)
+
+    # Decide what to do once; an interrupted run replays the same plan from the journal
+    run_plan = journal.snapshot("run_plan", plan_run)
+    new_records = frame_from_json(run_plan["new_records"])
+    amm_records = frame_from_json(run_plan["amm_records"])
+
+    # Write new records to processed sheet. The write is journaled (with the Profile IDs it carries)
+    # before it is sent, so a run that died around it only appends the rows the sheet is missing
+    if not new_records.empty and not journal.done("batch", "rows_written"):
+        rows = new_records
+        sheet_is_empty = run_plan["proc_was_empty"]
+        if journal.done("batch", "rows_writing"):
+            headers = proc_profile_generator.row_values(1)
+            written = set()
+            if proc["Profile ID"] in headers:
+                written = set(proc_profile_generator.col_values(headers.index(proc["Profile ID"]) + 1)[1:])
+            rows = new_records[~new_records[proc["Profile ID"]].isin(written)]
+            sheet_is_empty = not headers
+            print(f"↩️ Resumed write: {len(new_records) - len(rows)} of {len(new_records)} new rows already in the processed sheet")
+        else:
+            journal.record("batch", "rows_writing", profile_ids=new_records[proc["Profile ID"]].tolist())
+
+        if rows.empty:
+            pass
+        elif sheet_is_empty:
             # Sheet is empty → add headers + data
             proc_profile_generator.update(
-                [new_records.columns.values.tolist()] + new_records.values.tolist()
+                [rows.columns.values.tolist()] + rows.values.tolist()
             )
         else:
             # Sheet has data → append only values
-            proc_profile_generator.append_rows(new_records.values.tolist())
+            proc_profile_generator.append_rows(rows.values.tolist())
+        journal.record("batch", "rows_written")
 
-    # Handle new profiles - create PDFs and send emails
-    for i, row in new_records.iterrows():
-        data = row.to_dict()
+    # Submissions handled by this run (written, flagged or merged) are never picked up again
+    worker.complete(*run_plan["submission_keys"])
+
+    # Handle new profiles - render PDFs and send emails in overlapping stages
+    @profile_stage("render_new_profile")
+    def render_new_profile(row):
+        return render_profile_once(row[proc["Profile ID"]], row.to_dict(), row[proc["Profile ID"]])
+
+    @profile_stage("send_new_profile")
+    def send_new_profile(row, pdf_file):
         profile_id = row[proc["Profile ID"]]
         profile_key = row[proc["Profile Key"]]
         name = row[proc['Full Name']]
         email = row[proc['Email']]
-        pdf_file = create_pdf(data, profile_id)
 
         if row.get(proc["Profile ID"]) and row.get(proc["Profile Key"]):
             try:
-                intiation_email(email, name, profile_id, profile_key, pdf_file)
+                send_email["initiation"](email, name, profile_id, profile_key, pdf_file)
+                journal.record(profile_id, "email_sent")
                 print(f"📩 Profile {profile_id}: Sent NEW profile email")
             except Exception as e:
-                print(f"Profile {profile_id}: Failed to send email")
+                print(f"Profile {profile_id}: Failed to send email: {e}")
+
+    pending_profiles = [row for _, row in new_records.iterrows() if not journal.done(row[proc["Profile ID"]], "email_sent")]
+    if pending_profiles:
+        run_pipeline(pending_profiles, render_new_profile, send_new_profile)
+
+
+    # Merge duplicates into existing profiles
+    apply_existing_merges(run_plan["merges"])
 
+    # Tell applicants whose flagged submission was skipped
+    for notice in run_plan.get("duplicate_notices", []):
+        if journal.done(notice["key"], "email_sent"):
+            continue
+        try:
+            send_email["duplicate"](notice["email"], notice["name"], notice["matched_on"])
+            journal.record(notice["key"], "email_sent")
+            print(f"📩 Sent DUPLICATE email to {notice['email']} (matched on {notice['matched_on']})")
+        except Exception as e:
+            print(f"Failed to send duplicate email to {notice['email']}: {e}")
 
     # Process amendments
-    amm_records = amm_records[amm_records[amm['Amendment Status']].isnull()]
     print(f"\n📋 Amendment records found: {len(amm_records)}")
     if not amm_records.empty:
         print("Starting amendment processing...")
@@ -367,6 +768,20 @@ if __name__ == "__main__":
     else:
         print("No amendments to process.")
 
-
-                
-
+    # Refresh parsed preferences and the free-text search index from the updated processed sheet
+    if DRY_RUN:
+        plan.report()
+    elif worker.claim_exclusive("maintenance:profile_generator"):
+        # One shard at a time rebuilds the indexes; the others skip it this round
+        with profile_stage("maintenance"):
+            latest_proc_records = load_sheets(proc_profile_generator)
+            update_preferences(latest_proc_records, proc)
+            update_search_index(latest_proc_records, proc)
+
+            # Retention pass over superseded PDFs / images in data/
+            collect_garbage()
+        worker.release("maintenance:profile_generator")
+
+    # Every step finished: the next run starts from fresh sheet reads
+    journal.complete()
+    worker.stop()
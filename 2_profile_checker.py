@@ -1,15 +1,21 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from gspread.utils import rowcol_to_a1
 import pandas as pd
 from dotenv import load_dotenv
 import os
-import yaml
+from run_planner import RunPlan, dry_run_requested
+from sheet_stream import iter_sheet_chunks
+from sheets_client import authorize
+from tenancy import current_tenant, open_sheets
+from profiling import profile_stage
+from post_sync import ROW_HASH_COLUMN, synced_columns, latest_timestamp, cell_text, row_hash, classify_chunk
 
 load_dotenv()
 
+# Community being processed (the .env setup unless run_tenants.py selected one)
+tenant = current_tenant()
+
 # Load config.yaml
-with open("category_names.yaml", "r") as file:
-    config = yaml.safe_load(file)
+config = tenant.load_config()
 
 # PROC_PROFILE_GENERATOR (variables)
 proc = config['3ab']
@@ -21,213 +27,228 @@ proc = config['3ab']
 SERVICE_ACCOUNT_JSON = os.getenv("SERVICE_ACCOUNT_JSON")
 
 # Google Sheet names
-PROC_PROFILE_GENERATOR = os.getenv("PROC_PROFILE_GENERATOR")
-POST_F_PROF = os.getenv("POST_F_PROF")
-POST_M_PROF = os.getenv("POST_M_PROF")
+PROC_PROFILE_GENERATOR = tenant.sheets["processed"]
+
+# Posting sheets and the rule routing processed profiles to each (tenant "partitions")
+PARTITION_RULES = tenant.partitions
+
+# Posting sheets the Telegram bot broadcasts from (partitions with "post: true"; others are lists for other uses)
+BOT_SHEETS = tenant.post_sheets
+
+# Dry run (--dry-run or DRY_RUN=1): do all reads and diffing, only report the planned writes
+DRY_RUN = dry_run_requested()
 
 # -----------------------------
 # AUTHENTICATE WITH GOOGLE SHEETS
 # -----------------------------
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_ACCOUNT_JSON, scope)
-client = gspread.authorize(creds)
+# Cached access token and spreadsheet keys; the sheets are opened in parallel
+client = authorize(SERVICE_ACCOUNT_JSON)
+proc_profile_generator, *partition_sheets = open_sheets(client, "processed", *[rule["sheet"] for rule in PARTITION_RULES])
+
+if DRY_RUN:
+    plan = RunPlan("profile_checker")
+    proc_profile_generator = plan.track(proc_profile_generator, "processed")
+    print("🧪 DRY RUN: no sheets will be written")
+
+# -----------------------------
+# CLASSIFY PROCESSED PROFILES
+# -----------------------------
+
+# Columns copied from processed profiles into the posting sheets
+columns_to_keep = synced_columns(proc)
+
+
+@profile_stage("index_post_sheet")
+def index_post_sheet(sheet):
+    """
+    Stream a posting sheet into a compact lookup.
+
+    Returns (post_index, ready_ids, headers, unhashed_rows): post_index maps
+    Profile ID to (sheet row, row hash, synced values, latest timestamp) for
+    the first row of each profile, and ready_ids lists profiles confirmed but
+    not yet posted. Rows written before hashes existed are hashed from their
+    current values and listed in unhashed_rows so the hash can be filled in.
+    """
+    post_index = {}
+    ready_ids = []
+    headers = []
+    unhashed_rows = []
+    for chunk in iter_sheet_chunks(sheet):
+        headers = chunk.columns.tolist()
+        synced = chunk.reindex(columns=columns_to_keep)
+        stored = chunk[ROW_HASH_COLUMN].map(cell_text) if ROW_HASH_COLUMN in chunk.columns else pd.Series("", index=chunk.index)
+        latest = latest_timestamp(chunk, proc)
+        for position, profile_id, values, stored_hash, post_time in zip(
+            chunk.index, chunk[proc["Profile ID"]], synced.itertuples(index=False), stored, latest
+        ):
+            if profile_id in post_index:
+                continue
+            if not stored_hash:
+                stored_hash = row_hash(values)
+                unhashed_rows.append((position + 2, stored_hash))
+            post_index[profile_id] = (position + 2, stored_hash, values, post_time)  # +2 for header and 0-index
+        if "Posted?" in chunk.columns and "Confirm?" in chunk.columns:
+            ready = chunk[
+                (chunk["Posted?"].astype(str).str.strip().str.lower() == "no") &
+                (chunk["Confirm?"].astype(str).str.strip().str.lower() == "yes")
+            ]
+            ready_ids.extend(ready[proc["Profile ID"]])
+    return post_index, ready_ids, headers, unhashed_rows
+
+
+# -----------------------------
+# PARTITIONS
+# -----------------------------
+
+class Partition:
+    """
+    One posting sheet and the rule selecting its profiles.
+
+    where maps processed columns to the value(s) a profile must have in each;
+    a rule without where takes every profile.
+    """
+
+    def __init__(self, rule, sheet):
+        self.name = rule["sheet"]
+        self.where = {
+            proc.get(column, column): {str(value) for value in (values if isinstance(values, list) else [values])}
+            for column, values in (rule.get("where") or {}).items()
+        }
+        self.sheet = plan.track(sheet, self.name) if DRY_RUN else sheet
+        self.index, self.ready, self.headers, self.unhashed_rows = index_post_sheet(self.sheet)
+        self.updates = []
+        self.new_chunks = []
+
+    def matches(self, group_values):
+        return all(group_values[column] in allowed for column, allowed in self.where.items())
+
+
+partitions = [Partition(rule, sheet) for rule, sheet in zip(PARTITION_RULES, partition_sheets)]
 
-proc_profile_generator = client.open(PROC_PROFILE_GENERATOR).sheet1
-post_f_prof = client.open(POST_F_PROF).sheet1
-post_m_prof = client.open(POST_M_PROF).sheet1
+# Columns any rule looks at: each chunk is grouped by these once, and rules are checked per group
+partition_columns = list(dict.fromkeys(column for partition in partitions for column in partition.where))
 
 print(
     "Authenticated! Read from:",
     PROC_PROFILE_GENERATOR.title(),
     "| Write to:",
-    POST_F_PROF.title(),
-    "and",
-    POST_M_PROF.title(),
+    ", ".join(str(partition.name) for partition in partitions),
 )
 
-# -----------------------------
-# LOAD PROCESSED PROFILES
-# -----------------------------
-
-def load_sheets(sheet):
-    df = pd.DataFrame(sheet.get_all_records())
-    if df.empty:
-        headers = sheet.row_values(1)
-        df = pd.DataFrame(columns=headers)
-    return df
 
-proc_records = load_sheets(proc_profile_generator)
-post_f_records = load_sheets(post_f_prof)
-post_m_records = load_sheets(post_m_prof)
+@profile_stage("split_chunk")
+def split_chunk(chunk):
+    """Route one chunk of processed rows to the partitions in a single groupby pass."""
+    if partition_columns:
+        groups = chunk.groupby(partition_columns, dropna=False, sort=False)
+    else:
+        groups = [((), chunk)]
+
+    for key, group in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        group_values = dict(zip(partition_columns, map(str, key)))
+        targets = [partition for partition in partitions if partition.matches(group_values)]
+        if not targets:
+            continue
+
+        # Filter only the columns we need, with the posting columns at the beginning
+        selected_records = group[columns_to_keep].copy()
+        selected_records.insert(0, "Confirm?", "No")
+        selected_records.insert(1, "Posted?", "No")
+
+        for partition in targets:
+            updates, new_rows = classify_chunk(selected_records, partition.index, proc)
+            partition.updates.extend(updates)
+            partition.new_chunks.append(new_rows)
+
+
+def ensure_columns(sheet, count):
+    """Grow the sheet's grid to at least count columns (writes past the last column fail)."""
+    if sheet.col_count < count:
+        sheet.add_cols(count - sheet.col_count)
+
+
+@profile_stage("sync_partition")
+def sync_partition(partition):
+    """Write one partition's changed cells and new profiles to its posting sheet."""
+    sheet = partition.sheet
+    empty_records = pd.DataFrame(columns=["Confirm?", "Posted?"] + columns_to_keep + [ROW_HASH_COLUMN])
+    new_records = pd.concat(partition.new_chunks) if partition.new_chunks else empty_records
+
+    print(f"📄 {partition.name}: {len(partition.updates)} profile(s) to update | new: {len(new_records)}")
+
+    # Changed cells of existing profiles, written together as (sheet row, column, value)
+    headers = list(partition.headers)
+    cells = []
+    if headers and ROW_HASH_COLUMN not in headers:
+        # Sheet written before row hashes: add the column and fill in the hash of every row
+        headers.append(ROW_HASH_COLUMN)
+        ensure_columns(sheet, len(headers))
+        cells.append((1, ROW_HASH_COLUMN, ROW_HASH_COLUMN))
+    updated_rows = {sheet_row for sheet_row, *_ in partition.updates}
+    cells.extend(
+        (sheet_row, ROW_HASH_COLUMN, stored_hash)
+        for sheet_row, stored_hash in partition.unhashed_rows if sheet_row not in updated_rows
+    )
+
+    for sheet_row, row_data, changed, new_hash, reset in partition.updates:
+        # An amended profile goes back to Posted? / Confirm? = "No"; other edits are copied over as they are
+        columns = changed + (["Posted?", "Confirm?"] if reset else [])
+        cells.extend((sheet_row, column, row_data[column]) for column in columns if column in headers)
+        cells.append((sheet_row, ROW_HASH_COLUMN, new_hash))
+
+        note = " (Posted? and Confirm? reset to No)" if reset else ""
+        print(f"✅ Updated {partition.name} profile {row_data[proc['Profile ID']]}: {', '.join(changed)}{note}")
+
+    if cells:
+        # USER_ENTERED like the update_cell writes this replaced, so timestamps and phone numbers stay dates and numbers
+        sheet.batch_update([
+            {"range": rowcol_to_a1(row, headers.index(column) + 1), "values": [[cell_text(value)]]}
+            for row, column, value in cells
+        ], value_input_option="USER_ENTERED")
+        print(f"📝 Wrote {len(cells)} cell(s) to {partition.name}")
+
+    # Write new profiles
+    if not new_records.empty:
+        if not headers:
+            # Sheet is empty → add headers + data
+            ensure_columns(sheet, len(new_records.columns))
+            sheet.update([new_records.columns.values.tolist()] + new_records.values.tolist())
+            print(f"✅ Wrote {len(new_records)} {partition.name} profiles (with headers)")
+        else:
+            # Sheet has data → append only values, in the sheet's column order
+            sheet.append_rows(new_records.reindex(columns=headers).fillna("").values.tolist())
+            print(f"✅ Appended {len(new_records)} {partition.name} profiles")
+    else:
+        print(f"ℹ️  No new {partition.name} profiles to add")
 
-print(f"📊 Loaded {len(proc_records)} processed profiles")
 
 # -----------------------------
 # MAIN WORKFLOW
 # -----------------------------
 if __name__ == "__main__":
 
-    # Select specific columns from processed profiles
-    columns_to_keep = [
-        proc["Timestamp"],
-        proc["Ammended Timestamp"],
-        proc["Profile ID"],
-        proc["Profile Key"],
-        proc["Full Name"],
-        proc["Gender"],
-        proc["Email"],
-        proc["Phone Number"]
-    ]
-
-    # Filter only the columns we need
-    selected_records = proc_records[columns_to_keep].copy()
-
-    # Insert new columns at the beginning
-    selected_records.insert(0, "Confirm?", "No")
-    selected_records.insert(1, "Posted?", "No")
-
-    print(f"📋 Selected columns: {selected_records.columns.tolist()}")
-
-    # Separate by gender
-    female_records = selected_records[selected_records[proc["Gender"]] == "Female"].copy()
-    male_records = selected_records[selected_records[proc["Gender"]] == "Male"].copy()
-
-    print(f"👩 Female profiles: {len(female_records)}")
-    print(f"👨 Male profiles: {len(male_records)}")
-
-    # Process existing profiles - update if processed sheet is newer
-    profiles_to_update_f = []
-    profiles_to_update_m = []
-
-    if not post_f_records.empty:
-        # Convert timestamps to datetime for comparison
-        post_f_records[proc["Timestamp"]] = pd.to_datetime(post_f_records[proc["Timestamp"]], format='mixed', dayfirst=True, errors='coerce')
-        post_f_records[proc["Ammended Timestamp"]] = pd.to_datetime(post_f_records[proc["Ammended Timestamp"]], format='mixed', dayfirst=True, errors='coerce')
-
-        for idx, f_row in female_records.iterrows():
-            profile_id = f_row[proc["Profile ID"]]
-            existing = post_f_records[post_f_records[proc["Profile ID"]] == profile_id]
-
-            if not existing.empty:
-                # Get most recent timestamp from both sheets
-                proc_timestamps = [f_row[proc["Timestamp"]], f_row[proc["Ammended Timestamp"]]]
-                proc_timestamps = [pd.to_datetime(t, format='mixed', dayfirst=True, errors='coerce') for t in proc_timestamps if pd.notna(t) and str(t).strip()]
-                proc_max_time = max([t for t in proc_timestamps if pd.notna(t)]) if proc_timestamps else None
-
-                post_timestamps = [existing.iloc[0][proc["Timestamp"]], existing.iloc[0][proc["Ammended Timestamp"]]]
-                post_timestamps = [t for t in post_timestamps if pd.notna(t) and str(t).strip()]
-                post_max_time = max([t for t in post_timestamps if pd.notna(t)]) if post_timestamps else None
-
-                # If processed sheet is newer, mark for update
-                if proc_max_time and post_max_time and proc_max_time > post_max_time:
-                    sheet_row = existing.index[0] + 2  # +2 for header and 0-index
-                    profiles_to_update_f.append((sheet_row, f_row))
-                    # Remove from new records since we're updating existing
-                    female_records = female_records.drop(idx)
-                else:
-                    # Remove from new records since it already exists and is up to date
-                    female_records = female_records.drop(idx)
-
-        print(f"   Female profiles to update: {len(profiles_to_update_f)}")
-        print(f"   New female profiles to add: {len(female_records)}")
-    else:
-        print(f"   New female profiles to add: {len(female_records)}")
-
-    if not post_m_records.empty:
-        # Convert timestamps to datetime for comparison
-        post_m_records[proc["Timestamp"]] = pd.to_datetime(post_m_records[proc["Timestamp"]], format='mixed', dayfirst=True, errors='coerce')
-        post_m_records[proc["Ammended Timestamp"]] = pd.to_datetime(post_m_records[proc["Ammended Timestamp"]], format='mixed', dayfirst=True, errors='coerce')
-
-        for idx, m_row in male_records.iterrows():
-            profile_id = m_row[proc["Profile ID"]]
-            existing = post_m_records[post_m_records[proc["Profile ID"]] == profile_id]
-
-            if not existing.empty:
-                # Get most recent timestamp from both sheets
-                proc_timestamps = [m_row[proc["Timestamp"]], m_row[proc["Ammended Timestamp"]]]
-                proc_timestamps = [pd.to_datetime(t, format='mixed', dayfirst=True, errors='coerce') for t in proc_timestamps if pd.notna(t) and str(t).strip()]
-                proc_max_time = max([t for t in proc_timestamps if pd.notna(t)]) if proc_timestamps else None
-
-                post_timestamps = [existing.iloc[0][proc["Timestamp"]], existing.iloc[0][proc["Ammended Timestamp"]]]
-                post_timestamps = [t for t in post_timestamps if pd.notna(t) and str(t).strip()]
-                post_max_time = max([t for t in post_timestamps if pd.notna(t)]) if post_timestamps else None
-
-                # If processed sheet is newer, mark for update
-                if proc_max_time and post_max_time and proc_max_time > post_max_time:
-                    sheet_row = existing.index[0] + 2  # +2 for header and 0-index
-                    profiles_to_update_m.append((sheet_row, m_row))
-                    # Remove from new records since we're updating existing
-                    male_records = male_records.drop(idx)
-                else:
-                    # Remove from new records since it already exists and is up to date
-                    male_records = male_records.drop(idx)
-
-        print(f"   Male profiles to update: {len(profiles_to_update_m)}")
-        print(f"   New male profiles to add: {len(male_records)}")
-    else:
-        print(f"   New male profiles to add: {len(male_records)}")
-
-    # Update existing female profiles
-    if profiles_to_update_f:
-        headers = post_f_prof.row_values(1)
-        for sheet_row, row_data in profiles_to_update_f:
-            # Reset Posted? and Confirm? to "No"
-            row_data["Posted?"] = "No"
-            row_data["Confirm?"] = "No"
-
-            # Update entire row
-            row_values = [row_data.get(col, "") for col in headers]
-            for col_idx, value in enumerate(row_values, start=1):
-                post_f_prof.update_cell(sheet_row, col_idx, str(value) if pd.notna(value) else "")
-
-            print(f"✅ Updated female profile {row_data[proc['Profile ID']]} (Posted? and Confirm? reset to No)")
-
-    # Write female profiles to POST_F_PROF
-    if not female_records.empty:
-        if post_f_records.empty:
-            # Sheet is empty → add headers + data
-            post_f_prof.update(
-                [female_records.columns.values.tolist()] + female_records.values.tolist()
-            )
-            print(f"✅ Wrote {len(female_records)} female profiles (with headers)")
-        else:
-            # Sheet has data → append only values
-            post_f_prof.append_rows(female_records.values.tolist())
-            print(f"✅ Appended {len(female_records)} female profiles")
-    else:
-        print("ℹ️  No new female profiles to add")
-
-    # Update existing male profiles
-    if profiles_to_update_m:
-        headers = post_m_prof.row_values(1)
-        for sheet_row, row_data in profiles_to_update_m:
-            # Reset Posted? and Confirm? to "No"
-            row_data["Posted?"] = "No"
-            row_data["Confirm?"] = "No"
-
-            # Update entire row
-            row_values = [row_data.get(col, "") for col in headers]
-            for col_idx, value in enumerate(row_values, start=1):
-                post_m_prof.update_cell(sheet_row, col_idx, str(value) if pd.notna(value) else "")
-
-            print(f"✅ Updated male profile {row_data[proc['Profile ID']]} (Posted? and Confirm? reset to No)")
-
-    # Write male profiles to POST_M_PROF
-    if not male_records.empty:
-        if post_m_records.empty:
-            # Sheet is empty → add headers + data
-            post_m_prof.update(
-                [male_records.columns.values.tolist()] + male_records.values.tolist()
-            )
-            print(f"✅ Wrote {len(male_records)} male profiles (with headers)")
-        else:
-            # Sheet has data → append only values
-            post_m_prof.append_rows(male_records.values.tolist())
-            print(f"✅ Appended {len(male_records)} male profiles")
-    else:
-        print("ℹ️  No new male profiles to add")
+    # Classify processed profiles chunk by chunk; only rows to write are kept
+    processed_count = 0
+    for chunk in iter_sheet_chunks(proc_profile_generator):
+        processed_count += len(chunk)
+        split_chunk(chunk)
+
+    print(f"📊 Loaded {processed_count} processed profiles")
+
+    for partition in partitions:
+        sync_partition(partition)
 
     print("\n✅ Profile check and separation complete!")
+
+    if DRY_RUN:
+        # Telegram posts the bot would make next: confirmed, unposted rows that this run does not reset
+        for partition in partitions:
+            if partition.name not in BOT_SHEETS:
+                continue
+            reset_ids = {row_data[proc["Profile ID"]] for _, row_data, *_, reset in partition.updates if reset}
+            for profile_id in partition.ready:
+                if profile_id not in reset_ids:
+                    plan.record_telegram_post(profile_id, partition.name)
+
+        plan.report()
@@ -1,12 +1,21 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from gspread.utils import rowcol_to_a1
 import pandas as pd
 from dotenv import load_dotenv
 import os
-from pdf2image import convert_from_path
-from telegram import Bot
+from telegram import Bot, InputMediaPhoto
 import asyncio
+import json
+import sys
+import time
+from datetime import datetime
 from pdf_formation import create_pdf
+from artifact_store import collect_garbage, current_artifact
+from image_formation import render_pdf_image, load_prepared_images, FILE_EXTENSIONS, IMAGE_FORMAT
+from sheets_client import authorize
+from tenancy import current_tenant, open_sheets, tenant_slot, data_path
+from work_leases import Worker, LEASE_TTL_SECONDS
+from profiling import profile_stage
+from telegram_albums import album_groups, MIN_ALBUM_SIZE
 
 load_dotenv()
 
@@ -14,61 +23,76 @@ load_dotenv()
 # CONFIGURATION
 # -----------------------------
 SERVICE_ACCOUNT_JSON = os.getenv("SERVICE_ACCOUNT_JSON")
-POST_F_PROF = os.getenv("POST_F_PROF")
-POST_M_PROF = os.getenv("POST_M_PROF")
-PROC_PROFILE_GENERATOR = os.getenv("PROC_PROFILE_GENERATOR")
+
+# Community being posted for (the .env setup unless run_tenants.py selected one)
+tenant = current_tenant()
+PROC_PROFILE_GENERATOR = tenant.sheets["processed"]
+
+# Posting sheets to confirm and post from: the partitions marked "post: true" (post_female / post_male by default)
+POST_SHEETS = tenant.post_sheets
 
 # Telegram Bot Configuration
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID")
+TELEGRAM_BOT_TOKEN = tenant.telegram.get("bot_token")
+TELEGRAM_CHANNEL_ID = tenant.telegram.get("channel_id")
+
+# Bot API server to post through instead of api.telegram.org, e.g. the stand-in in stand_ins.py for load tests
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Album mode: group ready profiles (per posting sheet) into send_media_group calls
+TELEGRAM_ALBUM_MODE = os.getenv("TELEGRAM_ALBUM_MODE", "").strip().lower() in ("1", "true", "yes")
+
+# "Posted?" marks are buffered and written per sheet in one grouped update, when this many are
+# waiting or this many seconds have passed since the last write (and always at the end of the run)
+POSTED_FLUSH_ROWS = int(os.getenv("POSTED_FLUSH_ROWS", 50))
+POSTED_FLUSH_SECONDS = float(os.getenv("POSTED_FLUSH_SECONDS", 30))
+
+# Marks for posts already in the channel but not yet written to the sheet
+POSTED_PENDING_FILE = "data/posted_pending.jsonl"
+
+# Posting-sheet column holding when a profile was last posted (added on first use; read by digest.py)
+POSTED_AT_COLUMN = "Posted At"
+
+# Interactive admin mode: `python 3_telegram_bot.py --admin` serves admin commands instead of posting
+if "--admin" in sys.argv:
+    from admin_bot import run_admin_bot
+    run_admin_bot()
+    sys.exit(0)
 
 # -----------------------------
 # AUTHENTICATE WITH GOOGLE SHEETS
 # -----------------------------
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_ACCOUNT_JSON, scope)
-client = gspread.authorize(creds)
-
-print(f"Attempting to open POST_F_PROF: '{POST_F_PROF}'")
-post_f_sheet = client.open(POST_F_PROF).sheet1
-print(f"✅ Successfully opened: {POST_F_PROF}")
+# Cached access token and spreadsheet keys; the sheets are opened in parallel
+client = authorize(SERVICE_ACCOUNT_JSON)
 
-print(f"Attempting to open POST_M_PROF: '{POST_M_PROF}'")
-post_m_sheet = client.open(POST_M_PROF).sheet1
-print(f"✅ Successfully opened: {POST_M_PROF}")
-
-print(f"Attempting to open PROC_PROFILE_GENERATOR: '{PROC_PROFILE_GENERATOR}'")
-proc_sheet = client.open(PROC_PROFILE_GENERATOR).sheet1
-print(f"✅ Successfully opened: {PROC_PROFILE_GENERATOR}")
+sheet_names = ", ".join(f"'{tenant.sheets.get(role, role)}'" for role in POST_SHEETS)
+print(f"Attempting to open: {sheet_names}, '{PROC_PROFILE_GENERATOR}'")
+proc_sheet, *opened_post_sheets = open_sheets(client, "processed", *POST_SHEETS)
+post_sheets = dict(zip(POST_SHEETS, opened_post_sheets))
+print(f"✅ Successfully opened: {sheet_names}, {PROC_PROFILE_GENERATOR}")
 
 # -----------------------------
 # GET ALL RECORDS
 # -----------------------------
-post_f_records = pd.DataFrame(post_f_sheet.get_all_records())
-post_m_records = pd.DataFrame(post_m_sheet.get_all_records())
+post_records = {role: pd.DataFrame(sheet.get_all_records()) for role, sheet in post_sheets.items()}
 proc_full_records = pd.DataFrame(proc_sheet.get_all_records())
 
 print(f"📊 Loaded {len(proc_full_records)} profiles from processed sheet")
 
-# Combine both POST sheets
+# Channel images prepared by the profile generator (profile ID -> image/PDF paths)
+prepared_images = load_prepared_images()
+print(f"🖼️ Found {len(prepared_images)} prepared profile image(s)")
+
+# Combine the POST sheets
 all_records = []
 sheet_mapping = []  # Track which sheet each record belongs to
 
-if not post_f_records.empty:
-    for idx, row in post_f_records.iterrows():
+for role, records in post_records.items():
+    for idx, row in records.iterrows():
         all_records.append(row)
-        sheet_mapping.append(('female', post_f_sheet, idx))
-
-if not post_m_records.empty:
-    for idx, row in post_m_records.iterrows():
-        all_records.append(row)
-        sheet_mapping.append(('male', post_m_sheet, idx))
+        sheet_mapping.append((role, post_sheets[role], idx))
 
 if not all_records:
-    print("⚠️ No records found in POST_F_PROF or POST_M_PROF sheets")
+    print(f"⚠️ No records found in the posting sheets ({sheet_names})")
     exit(0)
 
 proc_records = pd.DataFrame(all_records)
@@ -86,87 +110,359 @@ if "Confirm?" not in proc_records.columns:
 # HELPER FUNCTIONS
 # -----------------------------
 
-async def send_pdf_as_image(bot, chat_id, pdf_path, profile_id):
+# Running totals of encoded image uploads for the run summary
+upload_stats = {"uploads": 0, "bytes": 0}
+
+
+def profile_caption(profile_id):
+    """Create the HTML caption posted alongside a profile image"""
+    return f"""
+🌙 <b>{tenant.branding["name"]} Matrimonial Profile</b>
+<b>Profile ID:</b> {profile_id}
+<i>May Allah guide you to the right match 💚</i>
+    """.strip()
+
+
+def pdf_to_image(pdf_path):
     """
-    Convert PDF to image and send as photo to Telegram channel
+    Convert the first page of a PDF to a temporary size-budgeted image next to it
+
+    Returns:
+        str: Path to the temporary image, or None if conversion failed
+    """
+    temp_image_path = pdf_path.replace('.pdf', f'_temp.{FILE_EXTENSIONS[IMAGE_FORMAT]}')
+    image_path, _ = render_pdf_image(pdf_path, temp_image_path)
+    return image_path
+
+
+def count_upload(image_path):
+    """Add an uploaded image to the running upload totals"""
+    upload_stats["uploads"] += 1
+    upload_stats["bytes"] += os.path.getsize(image_path)
+
+
+async def send_image(bot, chat_id, image_path, profile_id):
+    """
+    Send a prepared profile image as a photo to the Telegram channel
 
     Args:
         bot: Telegram Bot instance
         chat_id: Telegram channel/chat ID
-        pdf_path: Path to PDF file
+        image_path: Path to the image file
         profile_id: Profile ID for caption
 
     Returns:
         tuple: (success: bool, message: str)
     """
     try:
-        # Convert PDF to image (first page only since PDFs are single page)
-        images = convert_from_path(pdf_path, dpi=300)
-
-        if not images:
-            return False, "Failed to convert PDF to image"
-
-        # Get the first (and only) page
-        image = images[0]
-
-        # Save temporarily
-        temp_image_path = pdf_path.replace('.pdf', '_temp.jpg')
-        image.save(temp_image_path, 'JPEG', quality=95)
-
-        # Create caption
-        caption = f"""
-🌙 <b>Al Rawdha Matrimonial Profile</b>
-<b>Profile ID:</b> {profile_id}
-<i>May Allah guide you to the right match 💚</i>
-        """.strip()
-
         # Send as photo
-        with open(temp_image_path, 'rb') as photo:
+        with open(image_path, 'rb') as photo, tenant_slot("telegram"):
             await bot.send_photo(
                 chat_id=chat_id,
                 photo=photo,
-                caption=caption,
+                caption=profile_caption(profile_id),
                 parse_mode='HTML'
             )
-        
 
-        # Clean up temp file
-        os.remove(temp_image_path)
+        count_upload(image_path)
         return True, "Success"
 
     except Exception as e:
         return False, f"Error: {str(e)}"
 
 
-def mark_as_posted(sheet, row_number, posted_column_index):
-    """Mark a profile as posted in Google Sheets"""
+async def send_album(bot, chat_id, image_items):
+    """
+    Send several prepared profile images as one Telegram album
+
+    Args:
+        bot: Telegram Bot instance
+        chat_id: Telegram channel/chat ID
+        image_items: List of (image_path, profile_id) tuples, MIN_ALBUM_SIZE to ALBUM_SIZE long
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    handles = []
     try:
-        sheet.update_cell(row_number, posted_column_index, "Yes")
-        return True
+        media = []
+        for image_path, profile_id in image_items:
+            handle = open(image_path, 'rb')
+            handles.append(handle)
+            media.append(InputMediaPhoto(media=handle, caption=profile_caption(profile_id), parse_mode='HTML'))
+
+        # One API call for the whole group - either every photo is posted or none are
+        with tenant_slot("telegram"):
+            await bot.send_media_group(chat_id=chat_id, media=media)
+
+        for image_path, _ in image_items:
+            count_upload(image_path)
+        return True, "Success"
+
     except Exception as e:
-        print(f"❌ Failed to mark row {row_number} as posted: {e}")
-        return False
+        return False, f"Error: {str(e)}"
+
+    finally:
+        for handle in handles:
+            handle.close()
+
+
+def remove_temp_image(image_path, is_temp):
+    """Delete an image rendered at posting time (prepared images are kept)"""
+    if is_temp and image_path and os.path.exists(image_path):
+        os.remove(image_path)
+
+
+@profile_stage("prepare_image")
+def prepare_image(profile_id):
+    """
+    Get the channel image for a profile
+
+    Reuses the image prepared at profile creation time when there is one,
+    otherwise renders the PDF from the processed sheet and rasterizes it.
+
+    Returns:
+        tuple: (image_path or None, is_temp: bool)
+    """
+    prepared = prepared_images.get(profile_id)
+    if prepared and os.path.exists(prepared["image"]):
+        # Every PDF render is recorded in the artifact store; amendments and merges re-render
+        # without an image, so the prepared one is only used while its PDF is still the latest
+        if prepared["pdf"] == current_artifact(profile_id, "pdf"):
+            print(f"   ✅ Using prepared image: {prepared['image']}")
+            return prepared["image"], False
+        print(f"   ♻️ Prepared image is from an older render of {profile_id}, rendering it again")
+
+    # Get full profile data from processed sheet
+    full_profile = proc_full_records[proc_full_records["Profile ID"] == profile_id]
+
+    if full_profile.empty:
+        print(f"   ⚠️ Profile ID {profile_id} not found in processed sheet, skipping...")
+        return None, False
+
+    # Create PDF from full profile data
+    try:
+        data = full_profile.iloc[0].to_dict()
+        pdf_path = create_pdf(data, profile_id)
+        print(f"   ✅ Created PDF: {pdf_path}")
+    except Exception as e:
+        print(f"   ❌ Failed to create PDF: {e}")
+        return None, False
+
+    try:
+        image_path = pdf_to_image(pdf_path)
+    except Exception as e:
+        print(f"   ❌ Failed to convert PDF to image: {e}")
+        return None, False
+
+    if not image_path:
+        print("   ❌ Failed to convert PDF to image")
+        return None, False
+    return image_path, True
+
+
+def post_key(profile):
+    """Lease key for one version of a profile's post (an amendment makes a new version)."""
+    version = str(profile.get("Ammended Timestamp", "")).strip() or str(profile.get("Timestamp", "")).strip()
+    return f"post:{profile.get('Profile ID', 'Unknown')}:{version}"
+
+
+# -----------------------------
+# POSTED WRITEBACK
+# -----------------------------
+
+class PostedWriteback:
+    """
+    Write-behind buffer for "Posted?" = "Yes" marks, each with its "Posted At" time.
+
+    Each mark is appended (fsync'd) to POSTED_PENDING_FILE as soon as the
+    post is in the channel, and only dropped from it once the sheet write
+    succeeded. flush() writes each sheet's waiting marks in one batch_update,
+    with consecutive rows grouped into one range. Marks left in the file by a
+    crashed run are written at the start of the next one, and those profiles
+    are not posted again.
+    """
+
+    def __init__(self, sheets, records):
+        self.sheets = sheets      # posting sheet role -> worksheet
+        self.records = records    # posting sheet role -> DataFrame of that sheet as loaded
+        self.path = data_path(POSTED_PENDING_FILE)
+        self.columns = {}         # role -> ("Posted?", "Posted At") column letters, read once per sheet
+        self.pending = []         # [{"sheet", "profile_id", "row", "posted_at"}], oldest first
+        self.last_flush = time.monotonic()
+
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                for line in file:
+                    try:
+                        mark = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final line from a crash mid-write
+                    if "gender" in mark:
+                        # Saved before marks named their sheet
+                        mark["sheet"] = {"female": "post_female", "male": "post_male"}.get(mark.pop("gender"))
+                    self.pending.append(mark)
+            if self.pending:
+                print(f"♻️ Writing {len(self.pending)} posted mark(s) left by the previous run")
+                self.flush()
+
+    def posted_ids(self):
+        """Profiles posted but not yet marked in the sheet."""
+        return {mark["profile_id"] for mark in self.pending}
+
+    def add(self, role, profile_id, sheet_idx):
+        mark = {
+            "sheet": role, "profile_id": profile_id, "row": sheet_idx + 2,  # +1 header, +1 1-based
+            "posted_at": datetime.now().isoformat(sep=" ", timespec="seconds"),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(mark) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.pending.append(mark)
+
+        if len(self.pending) >= POSTED_FLUSH_ROWS or time.monotonic() - self.last_flush >= POSTED_FLUSH_SECONDS:
+            self.flush()
+
+    def _columns(self, role):
+        """Column letters of "Posted?" and "Posted At"; a sheet without "Posted At" gets it as a new last column."""
+        if role not in self.columns:
+            sheet = self.sheets[role]
+            headers = sheet.row_values(1)
+            if POSTED_AT_COLUMN not in headers:
+                if len(headers) >= sheet.col_count:
+                    sheet.add_cols(1)
+                sheet.update_cell(1, len(headers) + 1, POSTED_AT_COLUMN)
+                headers.append(POSTED_AT_COLUMN)
+            self.columns[role] = tuple(
+                rowcol_to_a1(1, headers.index(name) + 1).rstrip("0123456789") for name in ("Posted?", POSTED_AT_COLUMN)
+            )
+        return self.columns[role]
+
+    def _row(self, mark):
+        """Current sheet row of a mark's profile (rows can move between runs), or None if it is gone."""
+        records = self.records.get(mark["sheet"])
+        if records is None or records.empty or "Profile ID" not in records.columns:
+            return None
+        if mark["row"] - 2 in records.index and records.at[mark["row"] - 2, "Profile ID"] == mark["profile_id"]:
+            return mark["row"]
+        matches = records.index[records["Profile ID"] == mark["profile_id"]]
+        return matches[0] + 2 if len(matches) else None
+
+    def flush(self):
+        """Write every waiting mark; marks of a sheet whose write fails, or whose profile is not found, stay pending."""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+
+        kept = []
+        now = datetime.now().isoformat(sep=" ", timespec="seconds")
+        for role in dict.fromkeys(mark["sheet"] for mark in self.pending):
+            marks = [mark for mark in self.pending if mark["sheet"] == role]
+            resolved = {id(mark): self._row(mark) for mark in marks}
+
+            # A profile missing from the sheet as loaded (e.g. moved or re-added since, or a sheet no longer
+            # posted from) keeps its mark for the next run
+            unresolved = [mark for mark in marks if resolved[id(mark)] is None]
+            for mark in unresolved:
+                print(f"⚠️ Posted profile {mark['profile_id']} not found in the {role} sheet - mark kept for the next run")
+            kept.extend(unresolved)
+
+            # Sheet row -> posting time (the latest, should a profile have been posted twice; now for marks saved without one)
+            posted_at = {}
+            for mark in marks:
+                row = resolved[id(mark)]
+                if row is not None:
+                    posted_at[row] = max(posted_at.get(row, ""), mark.get("posted_at") or now)
+            rows = sorted(posted_at)
+            if not rows:
+                continue
+            try:
+                posted_column, posted_at_column = self._columns(role)
+                runs = consecutive_runs(rows)
+                self.sheets[role].batch_update([
+                    {"range": f"{posted_column}{first}:{posted_column}{last}", "values": [["Yes"]] * (last - first + 1)}
+                    for first, last in runs
+                ] + [
+                    {"range": f"{posted_at_column}{first}:{posted_at_column}{last}",
+                     "values": [[posted_at[row]] for row in range(first, last + 1)]}
+                    for first, last in runs
+                ])
+                print(f"📝 Marked {len(rows)} {role} profile(s) as posted")
+            except Exception as e:
+                print(f"❌ Failed to mark {len(rows)} {role} profile(s) as posted: {e}")
+                kept.extend(mark for mark in marks if resolved[id(mark)] is not None)
+
+        # Rewrite the pending file with only what is still unwritten
+        if kept:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as file:
+                file.writelines(json.dumps(mark) + "\n" for mark in kept)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self.pending = kept
+
+
+def consecutive_runs(rows):
+    """Sorted row numbers -> [(first, last)] ranges of consecutive rows."""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return [tuple(run) for run in runs]
 
 
 # -----------------------------
 # MAIN WORKFLOW
 # -----------------------------
 
+# Several bot processes can share the channel work: --shard I/N / WORKER_SHARD=I/N
+worker = Worker("telegram_bot")
+
 async def main():
     """Main async function to post profiles to Telegram"""
 
+    # Writes marks a crashed run left behind before anything is posted
+    writeback = PostedWriteback(post_sheets, post_records)
+
     # Filter profiles that need to be posted
-    # Condition: Posted? = "No" AND Confirm? = "Yes" (case insensitive)
+    # Condition: Posted? = "No" AND Confirm? = "Yes" (case insensitive), and not already posted but unmarked
     profiles_to_post_mask = (
         (proc_records["Posted?"].str.strip().str.lower() == "no") &
-        (proc_records["Confirm?"].str.strip().str.lower() == "yes")
+        (proc_records["Confirm?"].str.strip().str.lower() == "yes") &
+        ~proc_records["Profile ID"].isin(writeback.posted_ids())
     )
 
     if not profiles_to_post_mask.any():
         print("✅ No profiles ready to post (all posted or not confirmed)")
         return
 
-    profiles_to_post_indices = [i for i, mask in enumerate(profiles_to_post_mask) if mask]
+    # A profile routed to several posting sheets is posted once and marked in each of them
+    ready_rows = {}  # Profile ID -> [(posting sheet role, sheet index)]
+    first_indices = []
+    for i, mask in enumerate(profiles_to_post_mask):
+        if not mask:
+            continue
+        role, _, sheet_idx = sheet_mapping[i]
+        profile_id = proc_records.iloc[i].get("Profile ID")
+        if profile_id not in ready_rows:
+            first_indices.append(i)
+        ready_rows.setdefault(profile_id, []).append((role, sheet_idx))
+
+    # Claim each ready profile so no other bot worker posts it as well
+    profiles_to_post_indices = [
+        i for i in first_indices
+        if worker.claim(post_key(proc_records.iloc[i]), shard_key=proc_records.iloc[i].get("Profile ID"))
+    ]
+    if not profiles_to_post_indices:
+        print(f"✅ No profiles ready to post in shard {worker.label}")
+        return
 
     print(f"\n📋 Found {len(profiles_to_post_indices)} profile(s) ready to post to Telegram\n")
 
@@ -174,65 +470,108 @@ async def main():
     failed_count = 0
 
     # Initialize Telegram bot
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    if TELEGRAM_API_URL:
+        bot = Bot(token=TELEGRAM_BOT_TOKEN, base_url=f"{TELEGRAM_API_URL}/bot", base_file_url=f"{TELEGRAM_API_URL}/file/bot")
+    else:
+        bot = Bot(token=TELEGRAM_BOT_TOKEN)
+
+    # Album mode: profiles waiting to be sent, grouped by posting sheet
+    album_queues = {}
 
     for record_idx in profiles_to_post_indices:
         profile = proc_records.iloc[record_idx]
-        gender, sheet, sheet_idx = sheet_mapping[record_idx]
+        role = sheet_mapping[record_idx][0]
 
         profile_id = profile.get("Profile ID", "Unknown")
 
-        print(f"📤 Posting Profile ID: {profile_id} ({gender})")
+        print(f"📤 Posting Profile ID: {profile_id} ({role})")
 
-        # Get full profile data from processed sheet
-        full_profile = proc_full_records[proc_full_records["Profile ID"] == profile_id]
+        key = post_key(profile)
 
-        if full_profile.empty:
-            print(f"   ⚠️ Profile ID {profile_id} not found in processed sheet, skipping...")
+        image_path, is_temp = prepare_image(profile_id)
+        if image_path is None:
+            worker.release(key)
             failed_count += 1
             continue
 
-        # Create PDF from full profile data
-        try:
-            data = full_profile.iloc[0].to_dict()
-            pdf_path = create_pdf(data, profile_id)
-            print(f"   ✅ Created PDF: {pdf_path}")
-        except Exception as e:
-            print(f"   ❌ Failed to create PDF: {e}")
-            failed_count += 1
+        if TELEGRAM_ALBUM_MODE:
+            album_queues.setdefault(role, []).append((image_path, is_temp, profile_id, key))
             continue
 
         # Send to Telegram as image
-        success, message = await send_pdf_as_image(bot, TELEGRAM_CHANNEL_ID, pdf_path, profile_id)
+        with profile_stage("send_image"):
+            success, message = await send_image(bot, TELEGRAM_CHANNEL_ID, image_path, profile_id)
+        remove_temp_image(image_path, is_temp)
 
         if success:
             print(f"   ✅ Successfully posted to Telegram as image")
-
-            # Mark as posted in Google Sheets
-            # Get column index for "Posted?" from the correct sheet
-            headers = sheet.row_values(1)
-            posted_column_index = headers.index("Posted?") + 1
-
-            # Calculate sheet row number (DataFrame index + 2: +1 for 0-index, +1 for header)
-            sheet_row = sheet_idx + 2
-
-            if mark_as_posted(sheet, sheet_row, posted_column_index):
-                print(f"   ✅ Marked as posted in Google Sheets")
-                posted_count += 1
-            else:
-                print(f"   ⚠️ Posted to Telegram but failed to mark in sheet")
-                failed_count += 1
+            # Done as soon as it is in the channel; the sheet mark is written behind
+            worker.complete(key)
+            for sheet_role, sheet_idx in ready_rows[profile_id]:
+                writeback.add(sheet_role, profile_id, sheet_idx)
+            posted_count += 1
         else:
             print(f"   ❌ Failed to post: {message}")
+            worker.release(key)
             failed_count += 1
 
+    # Send queued profiles as albums of 2 to ALBUM_SIZE photos per posting sheet
+    for role, queued in album_queues.items():
+        for group in album_groups(queued):
+            group_ids = [profile_id for _, _, profile_id, _ in group]
+
+            if len(group) < MIN_ALBUM_SIZE:
+                # Telegram rejects a media group of one, so a lone profile goes out as a plain photo
+                (image_path, _, profile_id, _), = group
+                print(f"📤 Posting lone {role} profile {profile_id} as a photo")
+                with profile_stage("send_image"):
+                    success, message = await send_image(bot, TELEGRAM_CHANNEL_ID, image_path, profile_id)
+            else:
+                print(f"🖼️ Posting {role} album of {len(group)}: {', '.join(group_ids)}")
+                with profile_stage("send_album"):
+                    success, message = await send_album(
+                        bot, TELEGRAM_CHANNEL_ID, [(image_path, profile_id) for image_path, _, profile_id, _ in group]
+                    )
+            for image_path, is_temp, _, _ in group:
+                remove_temp_image(image_path, is_temp)
+
+            if not success:
+                # Nothing in the group was posted, so nothing is marked
+                print(f"   ❌ Failed to post: {message}")
+                for *_, key in group:
+                    worker.release(key)
+                failed_count += len(group)
+                continue
+
+            print(f"   ✅ Successfully posted {len(group)} profile(s) to Telegram")
+            worker.complete(*[key for *_, key in group])
+            for profile_id in group_ids:
+                for sheet_role, sheet_idx in ready_rows[profile_id]:
+                    writeback.add(sheet_role, profile_id, sheet_idx)
+            posted_count += len(group)
+
+    # Shutdown flush: everything posted this run is marked in the sheets now (or retried next run)
+    writeback.flush()
+
     print(f"\n{'='*50}")
     print(f"📊 SUMMARY:")
     print(f"   ✅ Successfully posted: {posted_count}")
     print(f"   ❌ Failed: {failed_count}")
     print(f"   📝 Total processed: {len(profiles_to_post_indices)}")
+    if writeback.pending:
+        print(f"   ⚠️ Posted but not yet marked in sheet: {len(writeback.pending)} (retried next run)")
+    if upload_stats["uploads"]:
+        average_kb = upload_stats["bytes"] / upload_stats["uploads"] / 1024
+        print(f"   🖼️ Average upload size: {average_kb:.0f} KB over {upload_stats['uploads']} image(s)")
     print(f"{'='*50}\n")
 
+    # Retention pass (also clears temp images left by failed sends)
+    collect_garbage()
+
 
 if __name__ == "__main__":
+    if not worker.start():
+        print(f"⏭️ Shard {worker.label} is already being posted by another run - exiting (a crashed run frees it after {LEASE_TTL_SECONDS}s)")
+        sys.exit(0)
     asyncio.run(main())
+    worker.stop()
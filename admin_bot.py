@@ -0,0 +1,256 @@
+import asyncio
+import html
+import os
+import threading
+import time
+import pandas as pd
+from dotenv import load_dotenv
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes
+from search_index import SearchIndex
+from sheet_stream import read_sheet
+from sheets_client import authorize, open_spreadsheets
+from tenancy import current_tenant
+
+load_dotenv()
+
+# Load config.yaml (the active tenant's mapping)
+config = current_tenant().load_config()
+
+# PROC_PROFILE_GENERATOR (variables)
+proc = config['3ab']
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+SERVICE_ACCOUNT_JSON = os.getenv("SERVICE_ACCOUNT_JSON")
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+
+# Telegram user IDs allowed to use admin commands (comma separated)
+TELEGRAM_ADMIN_IDS = {int(i) for i in os.getenv("TELEGRAM_ADMIN_IDS", "").replace(" ", "").split(",") if i}
+
+# How often the cache checks the sheets for changes
+ADMIN_REFRESH_SECONDS = int(os.getenv("ADMIN_REFRESH_SECONDS", 60))
+
+# Fields shown by /profile
+PROFILE_FIELDS = ["Gender", "Age", "Marraige Status", "Children?", "Ethnicity", "Residence", "Preferred Age Range", "Open to matches from"]
+
+
+# -----------------------------
+# PROFILE CACHE
+# -----------------------------
+
+class ProfileCache:
+    """
+    In-memory copy of the processed and posting sheets for admin commands.
+
+    refresh() asks Drive for each spreadsheet's last modified time and only
+    re-downloads the sheets that changed, so commands never hit the Sheets API.
+    Each reload builds new objects and swaps them in, so concurrent commands
+    always read a consistent snapshot.
+    """
+
+    def __init__(self, spreadsheets):
+        self.spreadsheets = spreadsheets  # name -> gspread Spreadsheet
+        self.modified = {}
+        self.frames = {name: pd.DataFrame() for name in spreadsheets}
+        self.profiles = {}
+        self.search_index = SearchIndex()
+        self.search_lock = threading.Lock()  # the index is updated in place
+        self.refreshed_at = None
+
+    def refresh(self):
+        """Reload changed sheets (blocking; run it in a worker thread). Returns the names reloaded."""
+        reloaded = []
+        for name, spreadsheet in self.spreadsheets.items():
+            modified = spreadsheet.get_lastUpdateTime()
+            if self.modified.get(name) == modified:
+                continue
+            self.frames = {**self.frames, name: read_sheet(spreadsheet.sheet1)}
+            self.modified[name] = modified
+            reloaded.append(name)
+
+        if "processed" in reloaded:
+            records = self.frames["processed"]
+            self.profiles = {
+                str(row[proc["Profile ID"]]).strip().upper(): row
+                for row in records.to_dict("records") if str(row.get(proc["Profile ID"], "")).strip()
+            }
+            with self.search_lock:
+                self.search_index.update(records, proc)
+
+        self.refreshed_at = time.time()
+        return reloaded
+
+    def search(self, query, limit=10):
+        with self.search_lock:
+            return self.search_index.search(query, limit)
+
+    def posting_rows(self, required=()):
+        """All posting sheet rows as one DataFrame with a Sheet column (only sheets having the required columns)."""
+        frames = [
+            frame.assign(Sheet=name) for name, frame in self.frames.items()
+            if name != "processed" and not frame.empty and all(column in frame.columns for column in required)
+        ]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# -----------------------------
+# COMMANDS
+# -----------------------------
+
+def is_admin(update):
+    return update.effective_user is not None and update.effective_user.id in TELEGRAM_ADMIN_IDS
+
+
+def _status(value):
+    return str(value).strip().lower()
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile F1234 – show a profile's key details and posting status."""
+    if not is_admin(update):
+        return
+    cache = context.application.bot_data["cache"]
+    if not context.args:
+        await update.message.reply_text("Usage: /profile F1234")
+        return
+
+    profile_id = context.args[0].strip().upper()
+    profile = cache.profiles.get(profile_id)
+    if profile is None:
+        await update.message.reply_text(f"Profile {profile_id} not found")
+        return
+
+    lines = [f"<b>Profile {html.escape(profile_id)}</b>"]
+    for key in PROFILE_FIELDS:
+        value = profile.get(proc[key], "")
+        if str(value).strip():
+            lines.append(f"<b>{html.escape(proc[key])}:</b> {html.escape(str(value))}")
+
+    posting = cache.posting_rows()
+    if not posting.empty:
+        row = posting[posting[proc["Profile ID"]].astype(str).str.upper() == profile_id]
+        if not row.empty:
+            row = row.iloc[0]
+            lines.append(f"<b>Confirm?</b> {html.escape(str(row.get('Confirm?', '')))} | "
+                         f"<b>Posted?</b> {html.escape(str(row.get('Posted?', '')))}")
+
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+
+
+async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/pending – profiles awaiting confirmation, and confirmed profiles not yet posted."""
+    if not is_admin(update):
+        return
+    # Sheets without both status columns yet (e.g. a new partition sheet) are left out
+    posting = context.application.bot_data["cache"].posting_rows(required=("Posted?", "Confirm?"))
+    if posting.empty:
+        await update.message.reply_text("No posting sheet data with 'Posted?' and 'Confirm?' columns")
+        return
+
+    unposted = posting[posting["Posted?"].map(_status) == "no"]
+    ready = unposted[unposted["Confirm?"].map(_status) == "yes"]
+    awaiting = unposted[unposted["Confirm?"].map(_status) != "yes"]
+
+    def id_list(frame):
+        ids = frame[proc["Profile ID"]].astype(str).tolist()
+        return ", ".join(ids[:50]) + (f" … (+{len(ids) - 50})" if len(ids) > 50 else "") if ids else "none"
+
+    await update.message.reply_text(
+        f"Awaiting confirmation ({len(awaiting)}): {id_list(awaiting)}\n\n"
+        f"Confirmed, not posted ({len(ready)}): {id_list(ready)}"
+    )
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search words or "a phrase" – ranked full-text search over profile text."""
+    if not is_admin(update):
+        return
+    query = " ".join(context.args)
+    if not query:
+        await update.message.reply_text('Usage: /search hanafi "software engineer"')
+        return
+
+    results = context.application.bot_data["cache"].search(query)
+    if not results:
+        await update.message.reply_text("No matching profiles")
+        return
+    lines = [f"{rank}. {profile_id} ({score:.2f})" for rank, (profile_id, score) in enumerate(results, start=1)]
+    await update.message.reply_text("\n".join(lines))
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats – profile counts by gender and posting status, plus cache age."""
+    if not is_admin(update):
+        return
+    cache = context.application.bot_data["cache"]
+    processed = cache.frames["processed"]
+    posting = cache.posting_rows(required=("Posted?",))
+
+    lines = [f"Profiles: {len(processed)}"]
+    if not processed.empty:
+        for gender, count in processed[proc["Gender"]].value_counts().items():
+            lines.append(f"   {gender}: {count}")
+    if not posting.empty:
+        lines.append(f"Posted: {(posting['Posted?'].map(_status) == 'yes').sum()} / {len(posting)}")
+    if cache.refreshed_at:
+        lines.append(f"Cache refreshed {int(time.time() - cache.refreshed_at)}s ago")
+    await update.message.reply_text("\n".join(lines))
+
+
+# -----------------------------
+# BOT LIFECYCLE
+# -----------------------------
+
+async def refresh_loop(cache):
+    """Keep the cache in step with the sheets without blocking command handling."""
+    while True:
+        await asyncio.sleep(ADMIN_REFRESH_SECONDS)
+        try:
+            reloaded = await asyncio.to_thread(cache.refresh)
+            if reloaded:
+                print(f"🔄 Reloaded: {', '.join(reloaded)}")
+        except Exception as e:
+            print(f"⚠️ Cache refresh failed: {e}")
+
+
+async def start_cache(application):
+    cache = application.bot_data["cache"]
+    reloaded = await asyncio.to_thread(cache.refresh)
+    print(f"✅ Profile cache loaded ({', '.join(reloaded)}): {len(cache.profiles)} profiles")
+    application.create_task(refresh_loop(cache))
+
+
+def run_admin_bot():
+    """Authenticate with Google Sheets and serve admin commands until stopped."""
+    client = authorize(SERVICE_ACCOUNT_JSON)
+
+    # The processed sheet and every sheet the posting bot confirms and posts from
+    tenant = current_tenant()
+    roles = ["processed", *tenant.post_sheets]
+    spreadsheets = open_spreadsheets(client, [tenant.sheet_title(role) for role in roles])
+    cache = ProfileCache(dict(zip(roles, spreadsheets)))
+
+    if not TELEGRAM_ADMIN_IDS:
+        print("⚠️ TELEGRAM_ADMIN_IDS is empty - every command will be ignored")
+
+    application = (
+        Application.builder()
+        .token(current_tenant().telegram.get("bot_token") or TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_init(start_cache)
+        .build()
+    )
+    application.bot_data["cache"] = cache
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("pending", pending_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+
+    print("🤖 Admin bot running (Ctrl+C to stop)")
+    application.run_polling()
+
+
+if __name__ == "__main__":
+    run_admin_bot()
@@ -0,0 +1,202 @@
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from tenancy import data_path
+
+load_dotenv()
+
+# Content-addressed storage for generated PDFs / images
+STORE_DIR = "data/store"
+MANIFEST_FILE = "data/artifacts.json"
+
+# Retention: superseded artifacts are deleted once older than ARTIFACT_MAX_AGE_DAYS,
+# or when more than ARTIFACT_KEEP newer superseded versions exist for the same profile
+ARTIFACT_MAX_AGE_DAYS = float(os.getenv("ARTIFACT_MAX_AGE_DAYS", 30))
+ARTIFACT_KEEP = int(os.getenv("ARTIFACT_KEEP", 2))
+
+# Leftover posting-time images (e.g. a failed Telegram send) are removed after this long
+TEMP_FILE_MAX_AGE_SECONDS = 3600
+
+# Serialises manifest updates between threads; manifest_lock() adds a file lock
+# for the other processes sharing the data folder (sharded workers, bot, checker)
+_manifest_lock = threading.Lock()
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest():
+    """Return the manifest: {"profiles": {id: {kind: hash}}, "artifacts": {hash: {...}}}."""
+    path = data_path(MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"profiles": {}, "artifacts": {}}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+@contextmanager
+def file_lock(path, thread_lock):
+    """Hold a JSON state file for a read-modify-write: thread_lock in this process, path.lock across processes."""
+    lock_path = path + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with thread_lock, open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def manifest_lock():
+    """Hold the manifest for a read-modify-write, across threads and processes."""
+    return file_lock(data_path(MANIFEST_FILE), _manifest_lock)
+
+
+def save_manifest(manifest):
+    path = data_path(MANIFEST_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def store_artifact(path, profile_id, kind):
+    """
+    Move a freshly generated file into the content-addressed store.
+
+    Identical content is stored once: if the hash already exists the new file
+    is deleted and the existing copy is reused. The file keeps its readable
+    name (data/store/<hash>/<name>) so email attachments stay recognisable.
+    The artifact becomes the profile's current one for that kind, and the
+    previous one is marked superseded for the retention pass.
+
+    Returns the stored path.
+    """
+    content_hash = file_hash(path)
+    with manifest_lock():
+        return _store_hashed(path, content_hash, profile_id, kind)
+
+
+def _store_hashed(path, content_hash, profile_id, kind):
+    manifest = load_manifest()
+    artifacts = manifest["artifacts"]
+    now = time.time()
+
+    existing = artifacts.get(content_hash)
+    if existing and os.path.exists(existing["path"]):
+        os.remove(path)
+        stored_path = existing["path"]
+    else:
+        stored_dir = os.path.join(data_path(STORE_DIR), content_hash[:16])
+        os.makedirs(stored_dir, exist_ok=True)
+        stored_path = os.path.join(stored_dir, os.path.basename(path))
+        os.replace(path, stored_path)
+        artifacts[content_hash] = {"path": stored_path, "kind": kind, "profile_id": profile_id, "created": now}
+    artifacts[content_hash]["superseded"] = None
+
+    current = manifest["profiles"].setdefault(profile_id, {})
+    previous_hash = current.get(kind)
+    if previous_hash and previous_hash != content_hash and previous_hash in artifacts:
+        artifacts[previous_hash]["superseded"] = now
+    current[kind] = content_hash
+
+    save_manifest(manifest)
+    return stored_path
+
+
+def current_artifact(profile_id, kind):
+    """Path of a profile's current artifact of the given kind, or None."""
+    manifest = load_manifest()
+    content_hash = manifest["profiles"].get(profile_id, {}).get(kind)
+    artifact = manifest["artifacts"].get(content_hash)
+    return artifact["path"] if artifact and os.path.exists(artifact["path"]) else None
+
+
+def collect_garbage(max_age_days=ARTIFACT_MAX_AGE_DAYS, keep=ARTIFACT_KEEP):
+    """
+    Retention pass: delete superseded artifacts past the age or count limit,
+    plus leftover *_temp.* images anywhere under data/. Current artifacts are never deleted.
+
+    Returns the number of files deleted.
+    """
+    with manifest_lock():
+        return _collect_garbage(max_age_days, keep)
+
+
+def _collect_garbage(max_age_days, keep):
+    manifest = load_manifest()
+    artifacts = manifest["artifacts"]
+    current = {h for kinds in manifest["profiles"].values() for h in kinds.values()}
+    now = time.time()
+    max_age = max_age_days * 86400
+
+    # Group superseded artifacts per (profile, kind), newest first
+    superseded = {}
+    for content_hash, artifact in artifacts.items():
+        if content_hash in current or not artifact.get("superseded"):
+            continue
+        superseded.setdefault((artifact["profile_id"], artifact["kind"]), []).append(content_hash)
+
+    deleted = 0
+    for hashes in superseded.values():
+        hashes.sort(key=lambda h: artifacts[h]["superseded"], reverse=True)
+        for rank, content_hash in enumerate(hashes):
+            artifact = artifacts[content_hash]
+            if rank < keep and now - artifact["superseded"] < max_age:
+                continue
+            if os.path.exists(artifact["path"]):
+                os.remove(artifact["path"])
+                deleted += 1
+            stored_dir = os.path.dirname(artifact["path"])
+            if os.path.isdir(stored_dir) and not os.listdir(stored_dir):
+                os.rmdir(stored_dir)
+            del artifacts[content_hash]
+
+    # Posting-time images sit next to their PDF, so look through the store folders too
+    data_dir = data_path("data")
+    for folder, _, names in os.walk(data_dir):
+        for name in names:
+            path = os.path.join(folder, name)
+            if "_temp." in name and now - os.path.getmtime(path) > TEMP_FILE_MAX_AGE_SECONDS:
+                os.remove(path)
+                deleted += 1
+
+    # Store folders emptied above (or by an earlier pass that left a temp image behind)
+    store_dir = data_path(STORE_DIR)
+    if os.path.isdir(store_dir):
+        for name in os.listdir(store_dir):
+            stored_dir = os.path.join(store_dir, name)
+            if os.path.isdir(stored_dir) and not os.listdir(stored_dir):
+                os.rmdir(stored_dir)
+
+    save_manifest(manifest)
+    print(f"🧹 Artifact GC: deleted {deleted} file(s), {len(artifacts)} artifact(s) kept")
+    return deleted
+
+
+# -----------------------------
+# MAINTENANCE WORKFLOW
+# -----------------------------
+if __name__ == "__main__":
+    # Usage: python artifact_store.py [gc]
+    if sys.argv[1:] == ["gc"]:
+        collect_garbage()
+    else:
+        manifest = load_manifest()
+        sizes = [os.path.getsize(a["path"]) for a in manifest["artifacts"].values() if os.path.exists(a["path"])]
+        print(f"📦 {len(manifest['profiles'])} profiles, {len(sizes)} artifacts, {sum(sizes) / 1e6:.1f} MB "
+              f"(as of {datetime.now().strftime('%d/%m/%y %H:%M')})")
@@ -0,0 +1,281 @@
+import os
+import re
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+import pandas as pd
+from dotenv import load_dotenv
+from fpdf.fonts import CoreFont
+from pdf_formation import fit_profile
+from profiling import profile_stage
+from sheet_stream import read_sheet
+from sheets_client import authorize
+from tenancy import current_tenant, open_sheets, tenant_slot, data_path
+from work_leases import parse_timestamp
+
+load_dotenv()
+
+# Window of posted profiles a digest covers, ending now (--days N overrides)
+DIGEST_DAYS = int(os.getenv("DIGEST_DAYS", 7))
+DIGEST_DIR = os.getenv("DIGEST_DIR", "data/digests")
+
+# Posting-sheet column the Telegram bot records each post's time in (as in 3_telegram_bot.py)
+POSTED_AT_COLUMN = "Posted At"
+
+# A4 in points, as fpdf2 lays the pages out
+PAGE_SIZE = (595.28, 841.89)
+
+# Resource names a page's content stream uses (the patterns fpdf2 itself scans for)
+FONT_USE = re.compile(rb"/F(\d+)\s+[-+]?\d+(?:\.\d+)?\s+Tf")
+IMAGE_USE = re.compile(rb"/I(\d+) Do")
+OTHER_USE = re.compile(rb"/(GS\d+) gs|/(P\d+)\s+(?:scn|SCN)")
+
+# Image filters whose data needs the DecodeParms fpdf2 records (a predictor is meaningless for DCTDecode / JPEG)
+DECODE_PARMS_FILTERS = ("FlateDecode", "LZWDecode", "CCITTFaxDecode")
+
+
+class DigestWriter:
+    """
+    Streams profile pages into one PDF file.
+
+    Each profile is still laid out and fitted on its own by pdf_formation;
+    only the resulting page content is copied here. Each page gets resources
+    for exactly the font and image names its content uses, looked up in the
+    profile's own document. Fonts and images are written the first time a
+    page uses them and shared by every later page (profile documents share
+    the same fonts and logo). Pages are compressed and written out as soon as
+    they are added, so memory stays flat however many profiles the digest
+    holds (only object offsets are kept). A page using anything else (a
+    graphics state, a pattern, an embedded TrueType font) raises ValueError.
+    """
+
+    def __init__(self, path, title):
+        self.path = path
+        self.title = title
+        self.file = open(path + ".tmp", "wb")
+        self.offsets = {}
+        self.page_ids = []
+        self.profiles = 0
+        self.next_id = 1
+        self.fonts = {}       # fpdf font key -> font object id
+        self.images = {}      # image name (logo path) -> XObject id
+        self.resources = {}   # (font names, image names) -> resources object id
+        self.pages_id = self._reserve()
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _reserve(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def _write(self, object_id, entries, stream=None):
+        """Write object_id as the dictionary << entries >>, followed by stream if given."""
+        self.offsets[object_id] = self.file.tell()
+        if stream is None:
+            self.file.write(f"{object_id} 0 obj\n<< {entries} >>\nendobj\n".encode("latin-1", "replace"))
+        else:
+            self.file.write(f"{object_id} 0 obj\n<< {entries} /Length {len(stream)} >>\nstream\n".encode("latin-1", "replace"))
+            self.file.write(stream)
+            self.file.write(b"\nendstream\nendobj\n")
+        return object_id
+
+    def _write_image(self, info, icc_profiles):
+        """Image XObject for an fpdf2 image entry (same dictionary fpdf2 writes for it)."""
+        color_space = f"/{info['cs']}"
+        if info["cs"] == "Indexed":
+            palette_id = self._write(self._reserve(), "/Filter /FlateDecode", zlib.compress(info["pal"]))
+            color_space = f"[/Indexed /DeviceRGB {len(info['pal']) // 3 - 1} {palette_id} 0 R]"
+        elif info.get("iccp_i") is not None:
+            profile = next(content for content, i in icc_profiles.items() if i == info["iccp_i"])
+            icc_id = self._write(self._reserve(), f"/N {info['dpn']} /Alternate /{info['cs']} /Filter /FlateDecode",
+                                 zlib.compress(profile))
+            color_space = f"[/ICCBased {icc_id} 0 R]"
+
+        entries = [
+            "/Type /XObject", "/Subtype /Image", f"/Width {info['w']}", f"/Height {info['h']}",
+            f"/ColorSpace {color_space}", f"/BitsPerComponent {info['bpc']}", f"/Filter /{info['f']}",
+        ]
+        if info["f"] in DECODE_PARMS_FILTERS:
+            entries.append(f"/DecodeParms <<{info['dp']} /BitsPerComponent {info['bpc']}>>")
+        if info["cs"] == "DeviceCMYK" and info.get("inverted"):
+            entries.append("/Decode [1 0 1 0 1 0 1 0]")
+        if "smask" in info:
+            mask = {"w": info["w"], "h": info["h"], "cs": "DeviceGray", "bpc": 8, "f": info["f"],
+                    "dp": f"/Predictor 15 /Colors 1 /Columns {info['w']}", "data": info["smask"]}
+            entries.append(f"/SMask {self._write_image(mask, icc_profiles)} 0 R")
+        return self._write(self._reserve(), " ".join(entries), bytes(info["data"]))
+
+    def _font(self, font):
+        if font.fontkey not in self.fonts:
+            if not isinstance(font, CoreFont):
+                raise ValueError(f"Font {font.fontkey} is not a core font; the digest only carries core fonts")
+            self.fonts[font.fontkey] = self._write(
+                self._reserve(), f"/Type /Font /Subtype /Type1 /BaseFont /{font.name} /Encoding /WinAnsiEncoding"
+            )
+        return self.fonts[font.fontkey]
+
+    def _image(self, name, info, icc_profiles):
+        if name not in self.images:
+            self.images[name] = self._write_image(info, icc_profiles)
+        return self.images[name]
+
+    def _page_resources(self, pdf, content):
+        """Resources object for the names a page's content uses, resolved in its own document."""
+        other = sorted({name.decode() for match in OTHER_USE.findall(content) for name in match if name})
+        if other:
+            raise ValueError(f"Profile page uses resources the digest does not carry: {', '.join(other)}")
+
+        fonts_by_index = {font.i: font for font in pdf.fonts.values()}
+        images_by_index = {info["i"]: (name, info) for name, info in pdf.image_cache.images.items()}
+        font_ids, image_ids = {}, {}
+        for index in sorted({int(i) for i in FONT_USE.findall(content)}):
+            if index not in fonts_by_index:
+                raise ValueError(f"Profile page uses /F{index}, which is not a font of its document")
+            font_ids[f"F{index}"] = self._font(fonts_by_index[index])
+        for index in sorted({int(i) for i in IMAGE_USE.findall(content)}):
+            if index not in images_by_index:
+                raise ValueError(f"Profile page uses /I{index}, which is not an image of its document")
+            name, info = images_by_index[index]
+            image_ids[f"I{index}"] = self._image(name, info, pdf.image_cache.icc_profiles)
+
+        key = (tuple(font_ids.items()), tuple(image_ids.items()))
+        if key not in self.resources:
+            fonts = " ".join(f"/{name} {object_id} 0 R" for name, object_id in font_ids.items())
+            images = " ".join(f"/{name} {object_id} 0 R" for name, object_id in image_ids.items())
+            entries = f"/Font << {fonts} >> /ProcSet [/PDF /Text /ImageB /ImageC /ImageI]"
+            if images:
+                entries += f" /XObject << {images} >>"
+            self.resources[key] = self._write(self._reserve(), entries)
+        return self.resources[key]
+
+    def add_profile(self, pdf):
+        """Append the page(s) of one rendered profile document."""
+        for page in pdf.pages.values():
+            content = bytes(page.contents)
+            resources_id = self._page_resources(pdf, content)
+            contents_id = self._write(self._reserve(), "/Filter /FlateDecode", zlib.compress(content))
+            self.page_ids.append(self._write(
+                self._reserve(),
+                f"/Type /Page /Parent {self.pages_id} 0 R /Resources {resources_id} 0 R /Contents {contents_id} 0 R",
+            ))
+        self.profiles += 1
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table, then move the file into place."""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write(self.pages_id, f"/Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} "
+                                   f"/MediaBox [0 0 {PAGE_SIZE[0]:.2f} {PAGE_SIZE[1]:.2f}]")
+        catalog_id = self._write(self._reserve(), f"/Type /Catalog /Pages {self.pages_id} 0 R /PageLayout /OneColumn")
+        title = self.title.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        info_id = self._write(self._reserve(), f"/Title ({title}) /CreationDate (D:{datetime.now().strftime('%Y%m%d%H%M%S')})")
+
+        xref_offset = self.file.tell()
+        self.file.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self.next_id):
+            self.file.write(f"{self.offsets[object_id]:010d} 00000 n \n".encode())
+        self.file.write(f"trailer\n<< /Size {self.next_id} /Root {catalog_id} 0 R /Info {info_id} 0 R >>\n"
+                        f"startxref\n{xref_offset}\n%%EOF\n".encode())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+# -----------------------------
+# SELECT POSTED PROFILES
+# -----------------------------
+
+def posted_profiles(sheet, proc, since, until):
+    """
+    Profile IDs in a posting sheet marked Posted? = Yes and posted in [since, until),
+    with their posting time. The time is the bot's Posted At; rows posted before
+    that column existed fall back to their newest Timestamp / Ammended Timestamp.
+    """
+    def keep(chunk):
+        if "Posted?" not in chunk.columns:
+            return chunk.iloc[0:0]
+        posted = chunk[chunk["Posted?"].astype(str).str.strip().str.lower() == "yes"]
+        submitted = pd.concat([
+            posted[proc["Timestamp"]].map(parse_timestamp),
+            posted[proc["Ammended Timestamp"]].map(parse_timestamp),
+        ], axis=1).max(axis=1)
+        if POSTED_AT_COLUMN in posted.columns:
+            posted_at = posted[POSTED_AT_COLUMN].map(parse_timestamp).fillna(submitted)
+        else:
+            posted_at = submitted
+        in_window = (posted_at >= since) & (posted_at < until)
+        return pd.DataFrame({"Profile ID": posted[proc["Profile ID"]].astype(str), "Posted At": posted_at})[in_window]
+
+    return read_sheet(sheet, keep)
+
+
+@profile_stage("digest")
+def build_digest(proc_sheet, posting_sheets, proc, since, until, path):
+    """Render every profile posted in the window into one PDF at path; returns the number of profiles."""
+    selected = pd.concat([posted_profiles(sheet, proc, since, until) for sheet in posting_sheets])
+    if selected.empty:
+        return 0
+    # One page per profile, oldest first, even if it sits in more than one posting sheet
+    selected = selected.sort_values("Posted At", kind="stable").drop_duplicates("Profile ID")
+    wanted = set(selected["Profile ID"])
+
+    # Full profile text comes from the processed sheet (posting sheets only keep contact columns)
+    profiles = read_sheet(proc_sheet, lambda chunk: chunk[chunk[proc["Profile ID"]].astype(str).isin(wanted)])
+    profiles = profiles.drop_duplicates(proc["Profile ID"]).set_index(profiles[proc["Profile ID"]].astype(str))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer = DigestWriter(path, f"{current_tenant().branding['name']} Matrimony - profiles {since:%d/%m/%Y} to {until:%d/%m/%Y}")
+    try:
+        for profile_id in selected["Profile ID"]:
+            if profile_id not in profiles.index:
+                print(f"⚠️ Profile {profile_id} is posted but missing from the processed sheet - skipping")
+                continue
+            with tenant_slot("render"):
+                pdf = fit_profile(profiles.loc[profile_id].to_dict(), profile_id)
+            writer.add_profile(pdf)
+    except BaseException:
+        writer.file.close()
+        os.remove(path + ".tmp")
+        raise
+    writer.close()
+    return writer.profiles
+
+
+def window_days():
+    """--days N from the command line, or DIGEST_DAYS."""
+    for i, arg in enumerate(sys.argv):
+        if arg == "--days" and i + 1 < len(sys.argv):
+            return int(sys.argv[i + 1])
+    return DIGEST_DAYS
+
+
+# -----------------------------
+# WEEKLY DIGEST
+# -----------------------------
+if __name__ == "__main__":
+    # Usage: python digest.py [--days N] [--sheet ROLE ...]
+    tenant = current_tenant()
+    proc = tenant.load_config()['3ab']
+    # The sheets the bot posts from, unless --sheet ROLE (repeatable) picks others, e.g. one partition for a representative
+    roles = [sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == "--sheet"] or tenant.post_sheets
+
+    until = datetime.now()
+    since = until - timedelta(days=window_days())
+
+    client = authorize(os.getenv("SERVICE_ACCOUNT_JSON"))
+    proc_sheet, *posting_sheets = open_sheets(client, "processed", *roles)
+
+    path = data_path(f"{DIGEST_DIR}/digest_{since:%Y-%m-%d}_{until:%Y-%m-%d}.pdf")
+    start = time.perf_counter()
+    count = build_digest(proc_sheet, posting_sheets, proc, since, until, path)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'='*50}")
+    if not count:
+        print(f"📭 No profiles posted between {since:%d/%m/%Y} and {until:%d/%m/%Y} in {', '.join(roles)}")
+    else:
+        print(f"📚 Digest: {count} profile(s) posted between {since:%d/%m/%Y} and {until:%d/%m/%Y} ({', '.join(roles)})")
+        print(f"   ⏱️ {elapsed:.1f}s ({count / elapsed:.1f} profiles/s), {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"   📁 {path}")
+    print(f"{'='*50}\n")
@@ -0,0 +1,149 @@
+import re
+import pandas as pd
+
+# Email providers that ignore dots and "+tag" suffixes in the local part
+DOTLESS_EMAIL_DOMAINS = {"gmail.com", "googlemail.com"}
+
+
+def normalize_email(value):
+    """Lowercase an email and strip provider aliases (dots / +tags for Gmail)."""
+    if not value or pd.isna(value):
+        return None
+    email = str(value).strip().lower()
+    if "@" not in email:
+        return None
+    local, domain = email.rsplit("@", 1)
+    local = local.split("+", 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}"
+
+
+def normalize_phone(value):
+    """Reduce a phone number to its digits in national (0...) format."""
+    if not value or pd.isna(value):
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    if digits.startswith("0044"):
+        digits = "0" + digits[4:]
+    elif digits.startswith("44") and len(digits) == 12:
+        digits = "0" + digits[2:]
+    elif len(digits) == 10 and not digits.startswith("0"):
+        # Sheets drops the leading zero when a number is stored as a number
+        digits = "0" + digits
+    return digits if len(digits) >= 7 else None
+
+
+def normalize_name(value):
+    """Lowercase a name and collapse its whitespace, or None if blank."""
+    if not value or pd.isna(value):
+        return None
+    return " ".join(str(value).lower().split()) or None
+
+
+def normalize_name_dob(name, dob):
+    """Build a name + date of birth key, or None if either part is missing."""
+    name_key = normalize_name(name)
+    if not name_key or not dob or pd.isna(dob):
+        return None
+    parsed = pd.to_datetime(str(dob), dayfirst=True, errors="coerce")
+    if pd.isna(parsed):
+        return None
+    return f"{name_key}|{parsed.date().isoformat()}"
+
+
+class DuplicateIndex:
+    """
+    Hash indexes over blocking keys (normalised email, normalised phone number,
+    and name + date of birth if the schema has one) mapping each key to the
+    profile that owns it.
+
+    Built once from the processed sheet; each new submission is then checked
+    with a few dictionary lookups, so detection is O(new records).
+    """
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.indexes = {"email": {}, "phone": {}, "name_dob": {}}
+
+    @classmethod
+    def from_records(cls, records, proc):
+        """Index every profile in the processed records."""
+        index = cls(proc)
+        if records.empty:
+            return index
+        for position, row in records.iterrows():
+            index.add(row, ("existing", position))
+        return index
+
+    def keys(self, row):
+        """Return the {index name: key} blocking keys present in a row."""
+        proc = self.proc
+        keys = {
+            "email": normalize_email(row.get(proc["Email"])),
+            "phone": normalize_phone(row.get(proc["Phone Number"])),
+            # Only when the tenant's processed schema maps a "Date of Birth" column
+            "name_dob": normalize_name_dob(row.get(proc["Full Name"]), row.get(proc["Date of Birth"])) if "Date of Birth" in proc else None,
+        }
+        return {name: key for name, key in keys.items() if key}
+
+    def add(self, row, owner):
+        """Register a row's keys; the first owner of a key wins."""
+        for name, key in self.keys(row).items():
+            self.indexes[name].setdefault(key, owner)
+
+    def find(self, row):
+        """Return (owner, matched_on) for the first matching blocking key, or None."""
+        for name, key in self.keys(row).items():
+            owner = self.indexes[name].get(key)
+            if owner is not None:
+                return owner, name
+        return None
+
+    def split_new_records(self, new_records):
+        """
+        Separate duplicate submissions from genuinely new records.
+
+        Records are checked in order and added to the index as they are kept,
+        so repeat submissions within the same batch are caught too.
+
+        Returns:
+            tuple: (kept new_records DataFrame, list of duplicate dicts with
+                    "index", "owner" ("existing"/"new", position) and "matched_on")
+        """
+        duplicates = []
+        for i, row in new_records.iterrows():
+            match = self.find(row)
+            if match:
+                owner, matched_on = match
+                duplicates.append({"index": i, "owner": owner, "matched_on": matched_on})
+            else:
+                self.add(row, ("new", i))
+
+        kept = new_records.drop(index=[d["index"] for d in duplicates])
+        return kept, duplicates
+
+
+def merge_values(target, source, protected):
+    """Return target updated with source's non-empty values, skipping protected columns."""
+    merged = dict(target)
+    for col, value in source.items():
+        if col in protected or pd.isna(value) or not str(value).strip():
+            continue
+        merged[col] = value
+    return merged
+
+
+def same_person(row, other, proc):
+    """
+    True if two rows name the same person: same normalised Full Name, and the
+    same Gender where both give one. Email and phone alone do not say that,
+    as siblings filed by one representative share them.
+    """
+    name = normalize_name(row.get(proc["Full Name"]))
+    if not name or name != normalize_name(other.get(proc["Full Name"])):
+        return False
+    gender = str(row.get(proc["Gender"], "")).strip().lower()
+    other_gender = str(other.get(proc["Gender"], "")).strip().lower()
+    return not gender or not other_gender or gender == other_gender
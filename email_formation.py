@@ -2,6 +2,7 @@ import os
 import yagmail
 from dotenv import load_dotenv
 from datetime import datetime
+from tenancy import current_tenant, tenant_slot
 
 load_dotenv()
 
@@ -9,17 +10,32 @@ load_dotenv()
 GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")  # Replace with your app password
 
+# Plain SMTP server to send through instead of Gmail, e.g. the local sink in stand_ins.py for load tests
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 1025))
+
+
+def _smtp_and_brand():
+    """SMTP client and community name for the active tenant (defaults to the .env account)."""
+    tenant = current_tenant()
+    user = tenant.gmail.get("user") or GMAIL_USER
+    password = tenant.gmail.get("app_password") or GMAIL_APP_PASSWORD
+    if SMTP_HOST:
+        return yagmail.SMTP(user or "stand-in@localhost", host=SMTP_HOST, port=SMTP_PORT, smtp_ssl=False,
+                            smtp_starttls=False, smtp_skip_login=True), tenant.branding["name"]
+    return yagmail.SMTP(user, password), tenant.branding["name"]
+
 
 def intiation_email(to_email, name, profile_id, profile_key, pdf_file):
     """Send first-time profile creation email with PDF attachment"""
-    yag = yagmail.SMTP(GMAIL_USER, GMAIL_APP_PASSWORD)
-    subject = f'🎉 Welcome to Al Rawdha! Your Matrimonial Profile is Ready {datetime.now().strftime("%d/%m/%y")}'
+    yag, brand = _smtp_and_brand()
+    subject = f'🎉 Welcome to {brand}! Your Matrimonial Profile is Ready {datetime.now().strftime("%d/%m/%y")}'
 
     body = f"""Assalamu Alaykum {name},
 
-Your Al Rawdha Matrimonial Profile has been successfully created.
+Your {brand} Matrimonial Profile has been successfully created.
 Attached is your professionally prepared profile PDF. Feel free to review it and ensure everything looks correct. 
-This is the version that will be shared anonymously through our Al Rawdha Matrimonial WhatsApp Broadcast, insha’Allah.
+This is the version that will be shared anonymously through our {brand} Matrimonial WhatsApp Broadcast, insha’Allah.
 
 ✨ Your unique Profile ID: {profile_id}
 🔐 Your unique Profile Key: {profile_key}
@@ -27,14 +43,15 @@ This is the version that will be shared anonymously through our Al Rawdha Matrim
 The above details give you access to update or refine your profile in the future.
 Please keep your Profile Key safe and private,  it’s your personal way to securely manage your information.
 
-Attached is your profile PDF for your reference. Please review it and this will be sent on our AlRawdha Matrimonial WhatsApp Broadcast.
+Attached is your profile PDF for your reference. Please review it and this will be sent on our {brand} Matrimonial WhatsApp Broadcast.
 
 May Allah bless your efforts and guide you towards the right match.
 
 Warm regards,
-Al Rawdha Community Matchmaking
+{brand} Community Matchmaking
 """
-    yag.send(to=to_email, subject=subject, contents=body, attachments=pdf_file)
+    with tenant_slot("email"):
+        yag.send(to=to_email, subject=subject, contents=body, attachments=pdf_file)
 
 
 def error_email(to_email, name, profile_id, profile_key):
@@ -42,9 +59,9 @@ def error_email(to_email, name, profile_id, profile_key):
     Send an error email if the user entered an invalid Profile ID
     in the 'If updating, add Profile ID (from email)' field.
     """
-    yag = yagmail.SMTP(GMAIL_USER, GMAIL_APP_PASSWORD)
+    yag, brand = _smtp_and_brand()
     subject = (
-        f'⚠️ Al Rawdha Matrimonial Ammendment Error {datetime.now().strftime("%d/%m/%y")}'
+        f'⚠️ {brand} Matrimonial Ammendment Error {datetime.now().strftime("%d/%m/%y")}'
     )
     body = f"""Assalamu Alaykum {name},
 
@@ -53,18 +70,47 @@ It looks like either the Profile ID ({profile_id}), the Profile Key ({profile_ke
 If you are trying to amend an existing profile, please use the correct Profile ID and Profile Key that were emailed to you when your profile was first created.
 
 Warm regards,
-Al Rawdha Community Matrimonal Team
+{brand} Community Matrimonal Team
+"""
+    with tenant_slot("email"):
+        yag.send(to=to_email, subject=subject, contents=body)
+
+
+# How a duplicate's matching detail is named in the email to the applicant
+MATCHED_ON_LABELS = {"email": "email address", "phone": "phone number", "name_dob": "name and date of birth"}
+
+
+def duplicate_email(to_email, name, matched_on):
+    """
+    Send an error email if a new submission was not processed because it
+    matches an existing profile (DUPLICATE_ACTION=flag).
+    """
+    yag, brand = _smtp_and_brand()
+    subject = f'⚠️ {brand} Matrimonial Submission Not Processed {datetime.now().strftime("%d/%m/%y")}'
+    body = f"""Assalamu Alaykum {name},
+
+We received your profile submission, but its {MATCHED_ON_LABELS.get(matched_on, matched_on)} is already used by an existing profile,
+so no new profile was created.
+
+If you are trying to update your profile, please use the amendment form with the Profile ID and Profile Key
+that were emailed to you when your profile was first created.
+
+If you are submitting a profile for someone else (for example a sibling), please reply to this email and we will create it for you.
+
+Warm regards,
+{brand} Community Matrimonal Team
 """
-    yag.send(to=to_email, subject=subject, contents=body)
+    with tenant_slot("email"):
+        yag.send(to=to_email, subject=subject, contents=body)
 
 
 def ammendment_email(to_email, name, profile_id, profile_key, pdf_file):
     """Send email with ID and PDF attachment"""
-    yag = yagmail.SMTP(GMAIL_USER, GMAIL_APP_PASSWORD)
-    subject = f'📝 Al Rawdha Profile Updated Successfully {datetime.now().strftime("%d/%m/%y")}'
+    yag, brand = _smtp_and_brand()
+    subject = f'📝 {brand} Profile Updated Successfully {datetime.now().strftime("%d/%m/%y")}'
     body = f"""Assalamu Alaikum {name},
 
-MashAllah! Your Al Rawdha Matrimonial Profile has been successfully updated.
+MashAllah! Your {brand} Matrimonial Profile has been successfully updated.
 
 You can continue to your Profile ID and Profile Key for any future updates.
 
@@ -73,8 +119,9 @@ Attached is the updated profile PDF for your reference. Please review it to ensu
 May Allah bless your efforts and guide you towards the right match.
 
 Warm regards,
-Al Rawdha Community Matrimonial Team
+{brand} Community Matrimonial Team
 """
-    yag.send(to=to_email, subject=subject, contents=body, attachments=pdf_file)
+    with tenant_slot("email"):
+        yag.send(to=to_email, subject=subject, contents=body, attachments=pdf_file)
 
 
@@ -0,0 +1,144 @@
+from io import BytesIO
+from datetime import datetime
+import json
+import threading
+from pdf2image import convert_from_path, pdfinfo_from_path
+from dotenv import load_dotenv
+from tenancy import data_path
+from artifact_store import file_lock
+import os
+
+load_dotenv()
+
+# Image encoding budget for channel posts (Telegram recompresses photos to 2560px anyway)
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 1_000_000))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 2560))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").strip().upper()  # JPEG, WEBP or PNG
+
+# Quality ladder tried in order until the encoded image fits the byte budget
+QUALITY_STEPS = [90, 85, 80, 72, 65, 55]
+MIN_DPI = 72
+A4_INCHES = (8.27, 11.69)
+FILE_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+# Channel images rendered at profile creation time, read by the Telegram bot.
+# Sharded generator processes update it concurrently, under a file lock
+PREPARED_IMAGES_FILE = "data/prepared_images.json"
+_prepared_lock = threading.Lock()
+
+
+def page_size_inches(pdf_path):
+    """Return the (width, height) of the first PDF page in inches, assuming A4 if unknown."""
+    try:
+        # pdfinfo reports e.g. "595.276 x 841.89 pts (A4)"
+        size = pdfinfo_from_path(pdf_path, first_page=1, last_page=1)["Page size"]
+        width_pts, _, height_pts = size.split()[:3]
+        return float(width_pts) / 72, float(height_pts) / 72
+    except Exception:
+        return A4_INCHES
+
+
+def pick_dpi(pdf_path, max_dimension=IMAGE_MAX_DIMENSION):
+    """Pick the highest DPI at which the page stays within max_dimension pixels."""
+    longest_side = max(page_size_inches(pdf_path))
+    return max(MIN_DPI, int(max_dimension / longest_side))
+
+
+def _encode(image, fmt, quality):
+    """Encode a PIL image in memory and return the bytes."""
+    buffer = BytesIO()
+    if fmt == "PNG":
+        # Profiles are mostly flat colours and text, so a small palette keeps PNGs compact
+        image.quantize(colors=64).save(buffer, "PNG", optimize=True)
+    elif fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=6)
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def encode_image(image, max_bytes=IMAGE_MAX_BYTES, fmt=IMAGE_FORMAT):
+    """
+    Encode an image to fit within max_bytes.
+
+    Walks down QUALITY_STEPS first; if the lowest quality is still too large,
+    the image is scaled down by 20% and the ladder is tried again.
+
+    Returns:
+        tuple: (encoded bytes, quality used, (width, height))
+    """
+    if fmt not in FILE_EXTENSIONS:
+        raise ValueError(f"Unsupported image format '{fmt}' (use JPEG, WEBP or PNG)")
+
+    while True:
+        for quality in QUALITY_STEPS:
+            encoded = _encode(image, fmt, quality)
+            if len(encoded) <= max_bytes:
+                return encoded, quality, image.size
+            if fmt == "PNG":
+                break  # PNG is lossless, quality has no effect
+
+        width, height = image.size
+        if max(width, height) <= 600:
+            # Give up shrinking - a smaller page would no longer be readable
+            return encoded, quality, image.size
+        image = image.resize((int(width * 0.8), int(height * 0.8)))
+
+
+def render_pdf_image(pdf_path, output_path=None, max_bytes=IMAGE_MAX_BYTES,
+                     max_dimension=IMAGE_MAX_DIMENSION, fmt=IMAGE_FORMAT):
+    """
+    Rasterize the first page of a PDF into a size-budgeted image file.
+
+    Args:
+        pdf_path: Path to the PDF file
+        output_path: Where to write the image (defaults to the PDF path with an image extension)
+        max_bytes: Target upper bound on the encoded file size
+        max_dimension: Upper bound on the longest side in pixels
+        fmt: "JPEG", "WEBP" or "PNG"
+
+    Returns:
+        tuple: (image path, size in bytes), or (None, 0) if the PDF could not be rasterized
+    """
+    dpi = pick_dpi(pdf_path, max_dimension)
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=1, last_page=1)
+
+    if not images:
+        return None, 0
+
+    encoded, quality, (width, height) = encode_image(images[0], max_bytes, fmt)
+
+    if output_path is None:
+        output_path = f"{os.path.splitext(pdf_path)[0]}.{FILE_EXTENSIONS[fmt]}"
+
+    with open(output_path, "wb") as file:
+        file.write(encoded)
+
+    print(f"  → Encoded {fmt} at {dpi} dpi, q={quality}, {width}x{height}px, {len(encoded) / 1024:.0f} KB")
+    return output_path, len(encoded)
+
+
+def load_prepared_images():
+    """Return the prepared image manifest: {profile_id: {"image", "pdf", "created"}}."""
+    path = data_path(PREPARED_IMAGES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def record_prepared_image(profile_id, image_path, pdf_path):
+    """Record (or replace) the channel-ready image for a profile in the manifest."""
+    path = data_path(PREPARED_IMAGES_FILE)
+    with file_lock(path, _prepared_lock):
+        prepared = load_prepared_images()
+        prepared[profile_id] = {
+            "image": image_path,
+            "pdf": pdf_path,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(prepared, file, indent=2)
+        os.replace(temp_path, path)
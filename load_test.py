@@ -0,0 +1,150 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from stand_ins import TelegramStub, SmtpSink
+from telegram_albums import album_groups, MIN_ALBUM_SIZE
+
+load_dotenv()
+
+# Load shape: messages in flight at once and the size of each upload
+LOAD_TEST_CONCURRENCY = int(os.getenv("LOAD_TEST_CONCURRENCY", 4))
+LOAD_TEST_IMAGE_KB = int(os.getenv("LOAD_TEST_IMAGE_KB", 150))
+LOAD_TEST_ATTACHMENT_KB = int(os.getenv("LOAD_TEST_ATTACHMENT_KB", 200))
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] if ordered else 0.0
+
+
+def report(name, latencies, failures, wall, items=None, outcomes=None):
+    """Print throughput, latency percentiles and failures by type for one run."""
+    calls = len(latencies)
+    ok = calls - sum(failures.values())
+    items = ok if items is None else items
+    print(f"\n{'='*50}")
+    print(f"📊 {name}: {calls} call(s) in {wall:.1f}s")
+    print(f"   ✅ Succeeded: {ok} | ❌ Failed: {calls - ok} {dict(failures) if failures else ''}")
+    print(f"   🚀 Throughput: {ok / wall if wall else 0:.1f} calls/s, {items / wall if wall else 0:.1f} messages/s")
+    print(f"   ⏱️ Latency ms: p50 {percentile(latencies, 50) * 1000:.0f} | p95 {percentile(latencies, 95) * 1000:.0f} | "
+          f"p99 {percentile(latencies, 99) * 1000:.0f} | max {max(latencies, default=0) * 1000:.0f}")
+    if outcomes:
+        # Server side: includes responses the client library retried on its own
+        print(f"   🧪 Stand-in outcomes: {dict(outcomes)}")
+    print(f"{'='*50}\n")
+
+
+# -----------------------------
+# TELEGRAM
+# -----------------------------
+
+async def _post_photos(stub, count, album):
+    from telegram import Bot, InputMediaPhoto
+    from telegram.error import RetryAfter
+    from telegram.request import HTTPXRequest
+
+    image = os.urandom(LOAD_TEST_IMAGE_KB * 1024)
+    sizes = [len(group) for group in album_groups(range(count))] if album else [1] * count
+    latencies, failures = [], {}
+    limit = asyncio.Semaphore(LOAD_TEST_CONCURRENCY)
+
+    bot = Bot(token="stand-in", base_url=f"{stub.url}/bot", base_file_url=f"{stub.url}/file/bot",
+              request=HTTPXRequest(connection_pool_size=LOAD_TEST_CONCURRENCY))
+
+    async def send(size, number):
+        async with limit:
+            start = time.perf_counter()
+            try:
+                # Same calls and captions the bot makes
+                caption = f"🌙 <b>Load test</b>\n<b>Profile ID:</b> L{number:04d}"
+                if size < MIN_ALBUM_SIZE:
+                    await bot.send_photo(chat_id=-100, photo=image, caption=caption, parse_mode="HTML")
+                else:
+                    media = [InputMediaPhoto(media=image, caption=caption, parse_mode="HTML") for _ in range(size)]
+                    await bot.send_media_group(chat_id=-100, media=media)
+            except RetryAfter:
+                failures["retry_after"] = failures.get("retry_after", 0) + 1
+            except Exception as e:
+                failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+    async with bot:
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(send(size, number) for number, size in enumerate(sizes)))
+        wall = time.perf_counter() - wall_start
+    return latencies, failures, wall
+
+
+def run_telegram(count):
+    album = os.getenv("TELEGRAM_ALBUM_MODE", "").strip().lower() in ("1", "true", "yes")
+    stub = TelegramStub(port=0).start()
+    try:
+        latencies, failures, wall = asyncio.run(_post_photos(stub, count, album))
+    finally:
+        stub.stop()
+    report(f"Telegram {'albums' if album else 'photos'}", latencies, failures, wall, items=stub.photos, outcomes=stub.faults.outcomes)
+
+
+def run_bot(args):
+    """Run 3_telegram_bot.py end to end (sheets from .env) with posts going to the stand-in."""
+    stub = TelegramStub(port=0).start()
+    env = {**os.environ, "TELEGRAM_API_URL": stub.url}
+    wall_start = time.perf_counter()
+    try:
+        result = subprocess.run([sys.executable, "3_telegram_bot.py", *args], env=env)
+    finally:
+        stub.stop()
+    wall = time.perf_counter() - wall_start
+    print(f"📊 Bot exited with {result.returncode} after {wall:.1f}s")
+    print(f"   Stand-in calls: {dict(stub.methods)} | outcomes: {dict(stub.faults.outcomes)} | photos: {stub.photos}")
+
+
+# -----------------------------
+# EMAIL
+# -----------------------------
+
+def run_email(count):
+    sink = SmtpSink(port=0).start()
+    os.environ.update(SMTP_HOST="127.0.0.1", SMTP_PORT=str(sink.port))
+    import email_formation  # reads SMTP_HOST at import
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as attachment:
+        attachment.write(b"%PDF-1.4\n" + os.urandom(LOAD_TEST_ATTACHMENT_KB * 1024))
+
+    latencies, failures = [], {}
+
+    def send(number):
+        start = time.perf_counter()
+        try:
+            email_formation.intiation_email(f"load{number}@example.com", "Load Test", f"L{number:04d}", "00000", attachment.name)
+        except Exception as e:
+            failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+        latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=LOAD_TEST_CONCURRENCY) as pool:
+            list(pool.map(send, range(count)))
+    finally:
+        sink.stop()
+        os.remove(attachment.name)
+    report("Email", latencies, failures, time.perf_counter() - wall_start, items=sink.messages, outcomes=sink.faults.outcomes)
+
+
+if __name__ == "__main__":
+    # Usage: python load_test.py telegram|email [COUNT]
+    #        python load_test.py bot [BOT ARGS...]
+    mode = sys.argv[1] if len(sys.argv) > 1 else "telegram"
+    if mode == "bot":
+        run_bot(sys.argv[2:])
+    elif mode in ("telegram", "email"):
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+        run_telegram(count) if mode == "telegram" else run_email(count)
+    else:
+        print(f"❌ Unknown mode {mode}: expected telegram, email or bot")
+        sys.exit(1)
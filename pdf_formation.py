@@ -2,11 +2,22 @@ from fpdf import FPDF
 import pandas as pd
 from datetime import datetime
 from fpdf.enums import XPos, YPos
+from fpdf.fonts import CoreFont
+from fpdf.image_datastructures import RasterImageInfo
+from fpdf.image_parsing import preload_image
 import os
+import random
+import sys
+import threading
+import time
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from oauth2client.service_account import ServiceAccountCredentials
 from dotenv import load_dotenv
+from image_formation import render_pdf_image, record_prepared_image
+from artifact_store import store_artifact
+from tenancy import current_tenant, tenant_slot, data_path
+from profiling import profile_stage
 
 load_dotenv()
 
@@ -24,16 +35,177 @@ HIGHLIGHT_CREAM = (248, 246, 240)  # #F8F6F0 - Cream
 FEMALE_PINK = (241, 98, 123)      # Rose Pink #E91E63
 MALE_BLUE = (2, 119, 189)        # Ocean Blue #0277BD
 
-def create_gender_buttons(values_str, pdf, gender, button_font_size=10):
-    """Create gender-colored buttons for 'Open to matches from' field."""
+# Fonts, logo and colours are prepared once per process and shared by every render
+# (PDF_RESOURCE_CACHE=0 rebuilds them for each render, as before)
+PDF_RESOURCE_CACHE = os.getenv("PDF_RESOURCE_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+# Content font sizes tried when fitting a profile on one page (titles are 2pt larger)
+MAX_CONTENT_FONT = 10
+MIN_CONTENT_FONT = 6  # Minimum readable font size
+
+# Fonts the layout uses, registered in this order in every document
+LAYOUT_FONTS = [("helvetica", "B"), ("helvetica", "")]
+TEXT_WIDTH_MEMO = 20000  # memoized line widths kept per font before the memo is reset
+
+
+def gender_colour(gender, branding=None):
+    """Header / button colour for a gender, from the (active tenant's) branding if it sets one."""
+    branding = branding or current_tenant().branding
+    if str(gender).lower() == 'female':
+        return tuple(branding.get("female", FEMALE_PINK))
+    return tuple(branding.get("male", MALE_BLUE))
+
+
+class LayoutFont(CoreFont):
+    """
+    Core font object shared by all renders in the process, with memoized text widths.
+
+    fpdf2's line breaker re-measures the whole current line after every
+    character it adds, so each width is built from the width of the same text
+    minus its last character instead of being summed again.
+    """
+
+    __slots__ = ("widths",)
+
+    def __init__(self, i, fontkey, style):
+        super().__init__(i, fontkey, style)
+        self.widths = {}
+
+    def get_text_width(self, text, font_size_pt, _):
+        widths = self.widths
+        width = widths.get(text)
+        if width is None:
+            previous = widths.get(text[:-1]) if text else None
+            width = previous + self.cw[text[-1]] if previous is not None else sum(map(self.cw.__getitem__, text))
+            if len(widths) >= TEXT_WIDTH_MEMO:
+                widths.clear()
+            widths[text] = width
+        return (len(text), width * font_size_pt * 0.001)
+
+
+_layout_fonts = {}
+
+
+def layout_fonts():
+    """fpdf font key -> shared LayoutFont, numbered as a fresh document would number them."""
+    if not _layout_fonts:
+        fonts = {}
+        for i, (family, style) in enumerate(LAYOUT_FONTS, start=1):
+            fonts[family + style] = LayoutFont(i, family + style, style)
+        _layout_fonts.update(fonts)
+    return _layout_fonts
+
+
+class PageTemplate:
+    """
+    Static parts of a profile page for one tenant and gender, prepared once.
+
+    Holds the colour table (header / button colour, button shadow, footer),
+    the header title, the decoded logo and the shared fonts. new_document()
+    starts a document with those resources already loaded, and draw_header /
+    draw_footer lay out the fixed geometry, so a render only adds the
+    Profile ID, the profile's text and the representative's number.
+    """
+
+    def __init__(self, branding, gender, cached=True):
+        self.colour = gender_colour(gender, branding)
+        self.shadow = tuple(max(0, int(c * 0.8)) for c in self.colour)
+        self.footer_colour = tuple(branding.get("primary", PRIMARY_GREEN))
+        self.title = f"{branding['name']} Matrimony"
+        self.logo_path = branding["logo"]
+        self.fonts = layout_fonts() if cached else {}
+
+        # Logo decoded once; each document gets its own copy of the image entry
+        self.logo = None
+        self.icc_profiles = {}
+        if os.path.exists(self.logo_path):
+            try:
+                scratch = FPDF()
+                _, _, self.logo = preload_image(scratch.image_cache, self.logo_path)
+                self.icc_profiles = dict(scratch.image_cache.icc_profiles)
+            except Exception as e:
+                print(f"Warning: Could not load logo - {e}")
+
+    def new_document(self):
+        pdf = FPDF()
+        pdf.fonts.update(self.fonts)
+        if self.logo is not None:
+            pdf.image_cache.images[self.logo_path] = RasterImageInfo({**self.logo, "usages": 0})
+            pdf.image_cache.icc_profiles.update(self.icc_profiles)
+        pdf.add_page()
+        return pdf
+
+    def draw_header(self, pdf, user_id):
+        # Header Section with gender-specific background
+        pdf.set_fill_color(*self.colour)
+        pdf.rect(0, 0, 210, 40, 'F')
+
+        # Title: Al Rawdha Matrimony (centered)
+        pdf.set_font("helvetica", "B", 20)
+        pdf.set_text_color(255, 255, 255)  # White text
+        pdf.set_xy(0, 12)
+        pdf.cell(210, 8, self.title, align="C")
+
+        # Subheading: Profile ID (centered)
+        pdf.set_font("helvetica", "B", 14)
+        pdf.set_text_color(255, 255, 255)
+        pdf.set_xy(0, 24)
+        pdf.cell(210, 6, f"Profile ID: {user_id}", align="C")
+
+    def draw_footer(self, pdf, rep_number, content_font):
+        # Disable auto page break temporarily
+        pdf.set_auto_page_break(False)
+
+        # Draw green footer background at bottom of page
+        pdf.set_fill_color(*self.footer_colour)
+        footer_height = 15
+        footer_y = 297 - footer_height  # A4 height is 297mm
+        pdf.rect(0, footer_y, 210, footer_height, 'F')
+
+        # Add logo above the green footer
+        if self.logo is not None:
+            try:
+                # Position logo above footer (footer starts at 282mm, logo is 25mm wide and proportional height)
+                logo_y = footer_y - 30  # Place logo 30mm above footer
+                pdf.image(self.logo_path, x=170, y=logo_y, w=25)
+            except Exception as e:
+                print(f"Warning: Could not add logo - {e}")
+
+        # Add contact text in white - scaled with content font
+        pdf.set_xy(5, footer_y + 4)
+        footer_font_size = max(8, min(10, content_font))  # Scale footer font but keep between 8-10pt
+        pdf.set_font("helvetica", "B", footer_font_size)
+        pdf.set_text_color(255, 255, 255)  # White text
+        contact_text = f"Interested? Contact representative: {rep_number}"
+        pdf.cell(200, 7, contact_text, align="C")
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def page_template(gender):
+    """The active tenant's PageTemplate for a gender (built on first use unless PDF_RESOURCE_CACHE is off)."""
+    tenant = current_tenant()
+    if not PDF_RESOURCE_CACHE:
+        return PageTemplate(tenant.branding, gender, cached=False)
+    key = (tenant.name, str(gender).lower() == 'female')
+    with _templates_lock:
+        if key not in _templates:
+            _templates[key] = PageTemplate(tenant.branding, gender)
+        return _templates[key]
+
+
+def create_gender_buttons(values_str, pdf, template, button_font_size=10):
+    """Create gender-colored buttons (colours from the page template) for 'Open to matches from' field."""
     if not values_str or pd.isna(values_str):
         return
 
     # Split values by comma
     values = [v.strip() for v in str(values_str).split(',')]
 
-    # Determine button color based on gender
-    button_color = FEMALE_PINK if gender.lower() == 'female' else MALE_BLUE
+    # Button color from the gender's colour table
+    button_color = template.colour
 
     # Calculate total width needed for all buttons (scaled with font size)
     total_width = 0
@@ -58,11 +230,8 @@ def create_gender_buttons(values_str, pdf, gender, button_font_size=10):
     for i, value in enumerate(values):
         tag_width = button_widths[i]
 
-        # Calculate darker color for shadow
-        shadow_color = tuple(max(0, int(c * 0.8)) for c in button_color)
-
         # Draw shadow (slightly offset and darker)
-        pdf.set_fill_color(*shadow_color)
+        pdf.set_fill_color(*template.shadow)
         pdf.set_line_width(0)
         pdf.rect(x_position + 0.5, y_position + 0.5, tag_width, button_height, 'F', round_corners=True, corner_radius=1.5)
 
@@ -84,6 +253,7 @@ def create_gender_buttons(values_str, pdf, gender, button_font_size=10):
     # Move cursor after buttons
     pdf.set_xy(20, y_position + button_height + 3)
 
+
 def calculate_content_length(data):
     """Calculate total content length to determine appropriate font size."""
     total_chars = 0
@@ -113,6 +283,7 @@ def calculate_content_length(data):
 
     return total_chars
 
+
 def upload_to_drive(file_path, file_name):
     """Upload PDF to Google Drive and return shareable link."""
     try:
@@ -156,75 +327,97 @@ def upload_to_drive(file_path, file_name):
         print(f"Warning: Failed to upload to Google Drive - {e}")
         return None
 
-def create_pdf(data, user_id):
-    """Create a single-page Al Rawdha Matrimony PDF profile with gender-based header."""
-    # Determine gender for header/text/button colors
-    gender = data.get('Gender', 'Male')
-    gender_color = FEMALE_PINK if str(gender).lower() == 'female' else MALE_BLUE
-
-    # Initial font sizes - will be reduced if content doesn't fit
-    title_font = 12
-    content_font = 10
-    min_font_size = 6  # Minimum readable font size
 
-    # Try generating PDF, reducing font sizes if content doesn't fit on one page
-    while True:
-        pdf = FPDF()
-        pdf.add_page()
+def render_attempt(template, data, user_id, content_font):
+    """Lay the profile out once at content_font: (pdf, fits_on_one_page)."""
+    pdf = template.new_document()
+    line_height = content_font * 0.45  # Proportional to content font
+    spacing = content_font * 0.25  # Proportional to content font
+    fits_on_one_page = _render_pdf_content(pdf, template, data, user_id, content_font + 2, content_font, line_height, spacing)
+    return pdf, fits_on_one_page
 
-        line_height = content_font * 0.45  # Proportional to content font
-        spacing = content_font * 0.25  # Proportional to content font
 
-        fits_on_one_page = _render_pdf_content(pdf, data, user_id, gender, gender_color, title_font, content_font, line_height, spacing)
+def fit_profile(data, user_id):
+    """
+    Render the profile at the largest content font size that fits on one page,
+    shrinking one point per attempt from MAX_CONTENT_FONT; if even
+    MIN_CONTENT_FONT overflows, the multi-page render at that size is kept.
+    """
+    # Determine gender for header/text/button colors
+    template = page_template(data.get('Gender', 'Male'))
 
+    content_font = MAX_CONTENT_FONT
+    while True:
+        pdf, fits_on_one_page = render_attempt(template, data, user_id, content_font)
         if fits_on_one_page:
-            break
+            return pdf
 
         # If we've hit minimum font size and still doesn't fit, give up
-        if content_font <= min_font_size:
-            print(f"WARNING: Content for {user_id} cannot fit on one page even at minimum font size ({min_font_size}pt)")
+        if content_font <= MIN_CONTENT_FONT:
+            print(f"WARNING: Content for {user_id} cannot fit on one page even at minimum font size ({MIN_CONTENT_FONT}pt)")
             print(f"         Using minimum font size and accepting multi-page PDF.")
-            break
+            return pdf
 
-        # Reduce font sizes and try again
-        title_font = max(min_font_size, title_font - 1)
-        content_font = max(min_font_size, content_font - 1)
+        content_font -= 1
         print(f"Content overflow detected for {user_id}. Reducing font size to {content_font}pt...")
 
-    # Save PDF
-    filename = f'data/{user_id}_{datetime.now().strftime("%d_%m_%y")}.pdf'
 
-    # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
+@profile_stage("create_pdf")
+def create_pdf(data, user_id):
+    """Create a single-page matrimony PDF profile (in the tenant's branding) with gender-based header."""
+    # Fit the profile on one page, reducing font sizes if content doesn't fit
+    # (rendering holds a slot in the render pool shared by all tenants)
+    with tenant_slot("render"):
+        pdf = fit_profile(data, user_id)
 
-    pdf.output(filename)
+        # Save PDF
+        filename = data_path(f'data/{user_id}_{datetime.now().strftime("%d_%m_%y")}.pdf')
 
-    return filename
+        # Create data directory if it doesn't exist
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-def _render_pdf_content(pdf, data, user_id, gender, gender_color, title_font, content_font, line_height, spacing):
-    """Render PDF content and return True if it fits on one page."""
+        # Pin the creation date to the day so identical same-day renders hash identically
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        pdf.set_creation_date(today.astimezone())
+        pdf.output(filename)
 
-    # Enable auto page break to detect overflow
-    pdf.set_auto_page_break(True, margin=15)
+        # Deduplicate by content and record it as the profile's current PDF
+        return store_artifact(filename, user_id, "pdf")
 
-    # Header Section with gender-specific background
-    pdf.set_fill_color(*gender_color)
-    pdf.rect(0, 0, 210, 40, 'F')
 
-    # Title: Al Rawdha Matrimony (centered)
-    pdf.set_font("helvetica", "B", 20)
-    pdf.set_text_color(255, 255, 255)  # White text
-    pdf.set_xy(0, 12)
-    pdf.cell(210, 8, "Al Rawdha Matrimony", align="C")
+@profile_stage("create_pdf_and_image")
+def create_pdf_and_image(data, user_id):
+    """
+    Create the profile PDF plus its channel-ready image, recording the image
+    in the prepared image manifest so the Telegram bot only has to upload it.
 
-    # Subheading: Profile ID (centered)
-    pdf.set_font("helvetica", "B", 14)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_xy(0, 24)
-    pdf.cell(210, 6, f"Profile ID: {user_id}", align="C")
+    Returns (pdf_path, image_path); image_path is None if rasterizing failed,
+    in which case the bot falls back to rendering at posting time.
+    """
+    pdf_path = create_pdf(data, user_id)
 
-    # Add logo above footer (will be placed later)
-    logo_path = 'logo.jpg'
+    try:
+        image_path, _ = render_pdf_image(pdf_path)
+    except Exception as e:
+        print(f"Warning: Could not pre-render image for {user_id} - {e}")
+        return pdf_path, None
+
+    if image_path:
+        image_path = store_artifact(image_path, user_id, "image")
+        record_prepared_image(user_id, image_path, pdf_path)
+    return pdf_path, image_path
+
+
+@profile_stage("render_pdf_content")
+def _render_pdf_content(pdf, template, data, user_id, title_font, content_font, line_height, spacing):
+    """Render PDF content on the template's page and return True if it fits on one page."""
+    gender_color = template.colour
+
+    # Enable auto page break to detect overflow
+    pdf.set_auto_page_break(True, margin=15)
+
+    # Header Section with gender-specific background, title and Profile ID
+    template.draw_header(pdf, user_id)
 
     # Start content area
     y_position = 48
@@ -263,7 +456,7 @@ def _render_pdf_content(pdf, data, user_id, gender, gender_color, title_font, co
 
     if personal_details:
         pdf.set_xy(left_margin, y_position)
-        create_gender_buttons(', '.join(personal_details), pdf, gender, content_font)
+        create_gender_buttons(', '.join(personal_details), pdf, template, content_font)
         y_position = pdf.get_y() + spacing
 
     # Helper function to add centered section
@@ -281,7 +474,7 @@ def _render_pdf_content(pdf, data, user_id, gender, gender_color, title_font, co
         if is_buttons:
             # For button content, center the buttons
             pdf.set_xy(left_margin, y_position)
-            create_gender_buttons(content_text, pdf, gender, content_font)
+            create_gender_buttons(content_text, pdf, template, content_font)
             y_position = pdf.get_y() + spacing
         else:
             pdf.set_xy(left_margin, y_position)
@@ -351,7 +544,7 @@ def _render_pdf_content(pdf, data, user_id, gender, gender_color, title_font, co
             pdf.cell(content_width, 5, "Open To ...", align="C")
             y_position += 5 + spacing
             pdf.set_xy(left_margin, y_position)
-            create_gender_buttons(open_to_str, pdf, gender, content_font)
+            create_gender_buttons(open_to_str, pdf, template, content_font)
             y_position = pdf.get_y() + spacing
 
     # Check if content fits on one page - use actual page count
@@ -367,40 +560,92 @@ def _render_pdf_content(pdf, data, user_id, gender, gender_color, title_font, co
 
     # Footer with representative contact (green color, larger font) - fixed at bottom of page 1
     if "Representative's Number" in data and pd.notna(data["Representative's Number"]):
-        rep_number = str(data["Representative's Number"])
-
-        # Disable auto page break temporarily
-        pdf.set_auto_page_break(False)
+        template.draw_footer(pdf, str(data["Representative's Number"]), content_font)
 
-        # Draw green footer background at bottom of page 1
-        pdf.set_fill_color(*PRIMARY_GREEN)
-        footer_height = 15
-        footer_y = 297 - footer_height  # A4 height is 297mm
-        pdf.rect(0, footer_y, 210, footer_height, 'F')
+    return content_fits
 
-        # Add logo above the green footer
-        if os.path.exists(logo_path):
+# -----------------------------
+# RENDER BENCHMARK
+# -----------------------------
+BENCHMARK_WORDS = ("practising", "family", "kind", "honest", "London", "pharmacist", "engineer", "Quran", "travel",
+                   "cooking", "reading", "deen", "respectful", "ambitious", "calm", "community", "sports", "teacher")
+
+
+def sample_profiles(count, seed=0):
+    """Synthetic processed-sheet rows of mixed lengths; about one in ten overflows at the largest font size."""
+    rng = random.Random(seed)
+
+    def text(words):
+        return " ".join(rng.choice(BENCHMARK_WORDS) for _ in range(words)).capitalize() + "."
+
+    profiles = []
+    for n in range(count):
+        scale = 4 if rng.random() < 0.1 else 1
+        profiles.append({
+            "Gender": rng.choice(["Female", "Male"]), "Age": str(rng.randint(20, 45)), "Marriage Status": "Single",
+            "Children?": rng.choice(["No", "Yes, one"]), "Height": "5'6", "Nationality": "British",
+            "Ethnicity": "Somali", "Residence": "London",
+            "Self Summary": text(rng.randint(20, 60) * scale), "Work/Education": text(rng.randint(5, 20) * scale),
+            "Dress": text(rng.randint(3, 10)), "My Islam": text(rng.randint(10, 40) * scale),
+            "Islamic Scholars and Speakers": text(rng.randint(3, 12)), "I'm looking for ...": text(rng.randint(15, 50) * scale),
+            "Preferred Ethnic Background": "Any", "Preferred Age Range": "25-35",
+            "Open to matches from": "Widows, Divorcees", "Representative's Number": f"07{n:09d}",
+            "Profile ID": f"B{n:04d}",
+        })
+    return profiles
+
+
+def benchmark(count):
+    """
+    Render the same sample profiles with and without the resource cache and
+    print renders/sec for each. PDFs are rendered in memory, nothing is written.
+    """
+    global PDF_RESOURCE_CACHE
+    profiles = sample_profiles(count)
+    creation_date = datetime(2024, 1, 1).astimezone()
+    runs = [
+        ("No cache (as before)", False),
+        ("Resource cache", True),
+    ]
+    results = []
+    for label, cached in runs:
+        PDF_RESOURCE_CACHE = cached
+        _templates.clear()
+        _layout_fonts.clear()  # start cold, as a new process would
+        outputs = []
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull  # per-render debug lines
             try:
-                # Position logo above footer (footer starts at 282mm, logo is 25mm wide and proportional height)
-                logo_y = footer_y - 30  # Place logo 30mm above footer
-                pdf.image(logo_path, x=170, y=logo_y, w=25)
-            except Exception as e:
-                print(f"Warning: Could not add logo - {e}")
+                start = time.perf_counter()
+                for profile in profiles:
+                    pdf = fit_profile(profile, profile["Profile ID"])
+                    pdf.set_creation_date(creation_date)
+                    outputs.append(bytes(pdf.output()))
+                elapsed = time.perf_counter() - start
+            finally:
+                sys.stdout = stdout
+        results.append((label, count / elapsed, outputs))
+
+    baseline = results[0][1]
+    identical = all(outputs == results[0][2] for _, _, outputs in results)
+    print(f"\n{'='*50}")
+    print(f"📊 PDF render benchmark: {count} profiles")
+    for label, rate, _ in results:
+        print(f"   ⏱️ {label:<22} {rate:.1f} renders/s ({rate / baseline:.2f}x)")
+    print(f"   {'✅' if identical else '❌'} Identical PDFs: {identical}")
+    print(f"{'='*50}\n")
 
-        # Add contact text in white - scaled with content font
-        pdf.set_xy(5, footer_y + 4)
-        footer_font_size = max(8, min(10, content_font))  # Scale footer font but keep between 8-10pt
-        pdf.set_font("helvetica", "B", footer_font_size)
-        pdf.set_text_color(255, 255, 255)  # White text
-        contact_text = f"Interested? Contact representative: {rep_number}"
-        pdf.cell(200, 7, contact_text, align="C")
-
-    return content_fits
 
 # -----------------------------
 # TESTING WORKFLOW
 # -----------------------------
 if __name__ == "__main__":
+    # Usage: python pdf_formation.py              (render text_overflow.csv)
+    #        python pdf_formation.py benchmark [COUNT]
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+        sys.exit(0)
+
     testing = pd.read_csv('text_overflow.csv')
     for i, row in testing.iterrows():
         try:
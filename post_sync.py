@@ -0,0 +1,68 @@
+import hashlib
+import pandas as pd
+
+# Column added at the end of each posting sheet: hash of the synced columns as last copied from the processed sheet
+ROW_HASH_COLUMN = "Row Hash"
+
+
+def synced_columns(proc):
+    """Columns copied from processed profiles into the posting sheets."""
+    return [
+        proc["Timestamp"],
+        proc["Ammended Timestamp"],
+        proc["Profile ID"],
+        proc["Profile Key"],
+        proc["Full Name"],
+        proc["Gender"],
+        proc["Email"],
+        proc["Phone Number"]
+    ]
+
+
+def latest_timestamp(records, proc):
+    """Most recent of each row's Timestamp / Ammended Timestamp (NaT if neither parses)."""
+    return pd.concat([
+        pd.to_datetime(records[proc["Timestamp"]], format='mixed', dayfirst=True, errors='coerce'),
+        pd.to_datetime(records[proc["Ammended Timestamp"]], format='mixed', dayfirst=True, errors='coerce'),
+    ], axis=1).max(axis=1)
+
+
+def cell_text(value):
+    """A value as it is written to the sheet ("" for blanks)."""
+    return "" if pd.isna(value) else str(value)
+
+
+def row_hash(values):
+    """Short content hash of one row's synced values."""
+    return hashlib.sha1("\x1f".join(map(cell_text, values)).encode()).hexdigest()[:16]
+
+
+def classify_chunk(records, post_index, proc):
+    """
+    Split processed rows of one partition against its posting sheet.
+
+    Returns (updates, new_records): for rows already posted whose synced
+    values changed, (sheet_row, row, changed columns, new hash, reset) tuples,
+    where reset is True when the profile itself was amended (newer timestamp)
+    and must be confirmed again; and rows not posted yet. Unchanged rows are
+    dropped after one hash comparison.
+    """
+    columns = synced_columns(proc)
+    hashes = [row_hash(values) for values in records[columns].itertuples(index=False)]
+    known = records[proc["Profile ID"]].map(lambda profile_id: profile_id in post_index)
+    new_records = records[~known]
+
+    updates = []
+    existing = records[known]
+    existing_hashes = [h for h, is_known in zip(hashes, known) if is_known]
+    for (_, row), new_hash, proc_time in zip(existing.iterrows(), existing_hashes, latest_timestamp(existing, proc)):
+        sheet_row, stored_hash, post_values, post_time = post_index[row[proc["Profile ID"]]]
+        if new_hash == stored_hash:
+            continue
+        changed = [
+            column for column, old_value in zip(columns, post_values)
+            if cell_text(row[column]) != cell_text(old_value)
+        ]
+        reset = pd.notna(proc_time) and pd.notna(post_time) and proc_time > post_time
+        updates.append((sheet_row, row, changed, new_hash, reset))
+    return updates, new_records.assign(**{ROW_HASH_COLUMN: [h for h, is_known in zip(hashes, known) if not is_known]})
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from tenancy import data_path
+from profile_matching import parse_age, parse_age_range, parse_open_to, required_tags
+
+# Parsed preferences, kept next to the processed data
+PREFERENCES_FILE = "data/preferences.csv"
+
+# Source columns (3ab keys) the parsed preferences are derived from
+SOURCE_KEYS = ["Gender", "Age", "Preferred Age Range", "Open to matches from", "Marraige Status", "Children?"]
+
+
+# -----------------------------
+# PARSING STAGE
+# -----------------------------
+
+def parse_preferences(row, proc):
+    """Parse one processed profile into numeric age interval and tag bitmasks."""
+    min_age, max_age = parse_age_range(row.get(proc["Preferred Age Range"]))
+    return {
+        "Age": parse_age(row.get(proc["Age"])),
+        "Min Age": min_age,
+        "Max Age": max_age,
+        "Open To": parse_open_to(row.get(proc["Open to matches from"])),
+        "Required": required_tags(row.get(proc["Marraige Status"]), row.get(proc["Children?"])),
+    }
+
+
+def _source_text(row, proc):
+    """Concatenated source fields, used to detect which profiles need re-parsing."""
+    return "|".join(str(row.get(proc[key], "")) for key in SOURCE_KEYS)
+
+
+def load_preferences():
+    """Load the persisted preferences (empty DataFrame if none yet)."""
+    path = data_path(PREFERENCES_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    preferences = pd.read_csv(path, dtype={"Profile ID": str, "Gender": str, "Source": str})
+    preferences[["Gender", "Source"]] = preferences[["Gender", "Source"]].fillna("")
+    return preferences
+
+
+def update_preferences(proc_records, proc):
+    """
+    Parse preferences for new or changed profiles and persist them to PREFERENCES_FILE.
+
+    Profiles whose source fields are unchanged since the last run keep their
+    stored values, so each profile is parsed once per edit rather than per run.
+    Returns the full preferences DataFrame.
+    """
+    previous = load_preferences()
+    stored = {} if previous.empty else {row["Profile ID"]: row for row in previous.to_dict("records")}
+
+    rows = []
+    parsed_count = 0
+    for _, row in proc_records.iterrows():
+        profile_id = str(row.get(proc["Profile ID"], "")).strip()
+        if not profile_id:
+            continue
+        source = _source_text(row, proc)
+        cached = stored.get(profile_id)
+        if cached is not None and cached["Source"] == source:
+            rows.append(cached)
+            continue
+        parsed_count += 1
+        rows.append({
+            "Profile ID": profile_id,
+            "Gender": str(row.get(proc["Gender"], "")).strip(),
+            **parse_preferences(row, proc),
+            "Source": source,
+        })
+
+    preferences = pd.DataFrame(rows, columns=["Profile ID", "Gender", "Age", "Min Age", "Max Age", "Open To", "Required", "Source"])
+    path = data_path(PREFERENCES_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    preferences.to_csv(path, index=False)
+    print(f"🧭 Preferences: parsed {parsed_count}, reused {len(preferences) - parsed_count}")
+    return preferences
+
+
+# -----------------------------
+# INTERVAL / BITMASK INDEX
+# -----------------------------
+
+class PreferenceIndex:
+    """
+    Answers "which profiles would accept someone of this age and status?".
+
+    Profiles are bucketed by (gender, "Open To" bitmask). Within a bucket they
+    are sorted by minimum preferred age, so a query binary-searches the
+    profiles whose interval starts at or below the age and filters their
+    maximum age. Buckets whose mask lacks a required tag are skipped whole.
+    """
+
+    def __init__(self, preferences):
+        self.buckets = {}
+        if preferences.empty:
+            return
+        for (gender, open_to), group in preferences.groupby(["Gender", "Open To"]):
+            group = group.sort_values("Min Age")
+            self.buckets[(str(gender).lower(), int(open_to))] = (
+                group["Profile ID"].to_numpy(),
+                group["Min Age"].to_numpy(dtype=np.float32),
+                group["Max Age"].to_numpy(dtype=np.float32),
+            )
+
+    def accepting(self, age, required=0, gender=None):
+        """
+        Profile IDs whose preferences accept the given age and required tags.
+
+        Args:
+            age: Age of the person being offered
+            required: Tag bitmask of that person (see profile_matching.required_tags)
+            gender: Only search profiles of this gender ("Female"/"Male"), or None for all
+        """
+        gender = gender.lower() if gender else None
+        found = []
+        for (bucket_gender, open_to), (ids, mins, maxs) in self.buckets.items():
+            if gender and bucket_gender != gender:
+                continue
+            if required & ~open_to:
+                continue
+            end = np.searchsorted(mins, age, side="right")
+            found.append(ids[:end][maxs[:end] >= age])
+        return np.concatenate(found) if found else np.array([], dtype=object)
+
+    def accepting_person(self, age, marriage_status="", children="", gender=None):
+        """Convenience wrapper: describe the person by marriage status / children instead of a bitmask."""
+        return self.accepting(age, required_tags(marriage_status, children), gender)
+
+
+# -----------------------------
+# QUERY WORKFLOW
+# -----------------------------
+if __name__ == "__main__":
+    # Usage: python preference_index.py AGE [MARRIAGE_STATUS] [CHILDREN] [GENDER_TO_SEARCH]
+    # e.g.   python preference_index.py 29 Divorced No Male
+    args = sys.argv[1:] + [""] * 3
+    index = PreferenceIndex(load_preferences())
+
+    start = time.perf_counter()
+    profile_ids = index.accepting_person(float(args[0]), args[1], args[2], args[3] or None)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"🔎 {len(profile_ids)} profile(s) would accept this match ({elapsed_ms:.3f} ms)")
+    for profile_id in profile_ids:
+        print(f"   {profile_id}")
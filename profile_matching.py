@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+import yaml
+
+# "Open to matches from" tags, stored as bit flags
+WIDOWS = 1
+PARENTS = 2
+REVERTS = 4
+DIVORCEES = 8
+OPEN_TO_ALL = WIDOWS | PARENTS | REVERTS | DIVORCEES
+
+# Keyword (lowercase substring) -> tag bit, used to parse "Open to matches from"
+OPEN_TO_KEYWORDS = {
+    "widow": WIDOWS,
+    "parent": PARENTS,
+    "revert": REVERTS,
+    "divorc": DIVORCEES,
+}
+
+# Age range used when no preference is given
+ANY_AGE = (0.0, 200.0)
+
+# Score given to pairs that fail a mutual filter (real scores are between 0 and 3)
+INCOMPATIBLE = np.float32(-1e9)
+
+# Preferred ethnic background phrases meaning "no restriction"
+OPEN_ETHNICITY_WORDS = ("all", "any", "open", "no preference")
+
+
+# -----------------------------
+# PARSING
+# -----------------------------
+
+def parse_age(value):
+    """Extract a numeric age ("29", "29 years") or NaN if unknown."""
+    if value is None or pd.isna(value):
+        return np.nan
+    digits = re.search(r"\d+", str(value))
+    return float(digits.group()) if digits else np.nan
+
+
+def parse_age_range(value):
+    """
+    Parse a preferred age range into a (min, max) interval.
+
+    Accepts "25-32", "25 to 32", "30+", "under 35", a single age, or anything
+    else (including blank) as no preference.
+    """
+    if value is None or pd.isna(value) or not str(value).strip():
+        return ANY_AGE
+    text = str(value).lower()
+    numbers = [float(n) for n in re.findall(r"\d+", text)]
+    if len(numbers) >= 2:
+        return min(numbers[:2]), max(numbers[:2])
+    if len(numbers) == 1:
+        if "+" in text or "over" in text or "above" in text:
+            return numbers[0], ANY_AGE[1]
+        if "under" in text or "below" in text or "<" in text:
+            return ANY_AGE[0], numbers[0]
+        return numbers[0], numbers[0]
+    return ANY_AGE
+
+
+def parse_open_to(value):
+    """Parse "Open to matches from" free text into a bitmask of tags."""
+    if value is None or pd.isna(value):
+        return 0
+    text = str(value).lower()
+    mask = 0
+    for keyword, bit in OPEN_TO_KEYWORDS.items():
+        if keyword in text:
+            mask |= bit
+    return mask
+
+
+def required_tags(marriage_status, children):
+    """Tags another profile must be open to in order to match this one."""
+    status = str(marriage_status).lower() if marriage_status is not None and not pd.isna(marriage_status) else ""
+    mask = 0
+    if "widow" in status:
+        mask |= WIDOWS
+    if "divorc" in status:
+        mask |= DIVORCEES
+    if children is not None and not pd.isna(children):
+        answer = str(children).strip().lower()
+        if answer and answer != "no":
+            mask |= PARENTS
+    return mask
+
+
+def normalize_label(value):
+    """Lowercase / collapse whitespace for categorical fields, or '' if missing."""
+    if value is None or pd.isna(value):
+        return ""
+    return " ".join(str(value).lower().split())
+
+
+# -----------------------------
+# ENCODING
+# -----------------------------
+
+class EncodedProfiles:
+    """
+    Column arrays for one group of profiles (e.g. all women).
+
+    Attributes:
+        ids: Profile IDs (object array)
+        age, pref_min, pref_max: float32 arrays (age NaN if unknown)
+        age_centre, age_inv_half_width: float32 arrays used to score age fit
+        ethnicity: int32 codes into the shared ethnicity vocabulary
+        pref_ethnicity: bool matrix (profiles x vocabulary+1), last column = unknown ethnicity
+        open_to, required: uint8 tag bitmasks
+        residence: int32 codes (-1 if unknown)
+    """
+
+    def __init__(self, records, proc, ethnicity_vocab, residence_vocab):
+        n = len(records)
+        unknown_ethnicity = len(ethnicity_vocab)
+
+        self.ids = records[proc["Profile ID"]].astype(str).to_numpy()
+        self.age = np.array([parse_age(v) for v in records.get(proc["Age"], [None] * n)], dtype=np.float32)
+
+        ranges = [parse_age_range(v) for v in records.get(proc["Preferred Age Range"], [None] * n)]
+        self.pref_min = np.array([r[0] for r in ranges], dtype=np.float32)
+        self.pref_max = np.array([r[1] for r in ranges], dtype=np.float32)
+        self.age_centre = (self.pref_min + self.pref_max) / 2
+        self.age_inv_half_width = 1.0 / np.maximum((self.pref_max - self.pref_min) / 2, 1.0)
+
+        ethnicities = [normalize_label(v) for v in records.get(proc["Ethnicity"], [None] * n)]
+        self.ethnicity = np.array([ethnicity_vocab.get(e, unknown_ethnicity) for e in ethnicities], dtype=np.int32)
+
+        self.pref_ethnicity = np.ones((n, unknown_ethnicity + 1), dtype=bool)
+        preferences = records.get(proc["Preferred Ethnic Background"], [None] * n)
+        for i, preference in enumerate(preferences):
+            accepted = parse_preferred_ethnicities(preference, ethnicity_vocab)
+            if accepted:
+                self.pref_ethnicity[i, :unknown_ethnicity] = False
+                self.pref_ethnicity[i, accepted] = True
+
+        self.open_to = np.array(
+            [parse_open_to(v) for v in records.get(proc["Open to matches from"], [None] * n)], dtype=np.uint8
+        )
+        statuses = records.get(proc["Marraige Status"], [None] * n)
+        children = records.get(proc["Children?"], [None] * n)
+        self.required = np.array([required_tags(s, c) for s, c in zip(statuses, children)], dtype=np.uint8)
+
+        residences = [normalize_label(v) for v in records.get(proc["Residence"], [None] * n)]
+        self.residence = np.array([residence_vocab.get(r, -1) if r else -1 for r in residences], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def parse_preferred_ethnicities(value, ethnicity_vocab):
+    """
+    Return the vocabulary codes named in a preferred ethnic background, or []
+    for no restriction (blank, "open to all", or nothing recognisable).
+    """
+    text = normalize_label(value)
+    if not text or any(word in text for word in OPEN_ETHNICITY_WORDS):
+        return []
+    return [code for label, code in ethnicity_vocab.items() if label and label in text]
+
+
+def build_vocab(values):
+    """Map each distinct normalised label to a dense integer code."""
+    labels = sorted({normalize_label(v) for v in values} - {""})
+    return {label: code for code, label in enumerate(labels)}
+
+
+def encode_groups(records, proc):
+    """Encode processed records into (female, male) EncodedProfiles with shared vocabularies."""
+    ethnicity_vocab = build_vocab(records[proc["Ethnicity"]]) if proc["Ethnicity"] in records else {}
+    residence_vocab = build_vocab(records[proc["Residence"]]) if proc["Residence"] in records else {}
+
+    gender = records[proc["Gender"]].astype(str).str.strip().str.lower()
+    female = EncodedProfiles(records[gender == "female"], proc, ethnicity_vocab, residence_vocab)
+    male = EncodedProfiles(records[gender == "male"], proc, ethnicity_vocab, residence_vocab)
+    return female, male
+
+
+# -----------------------------
+# SCORING
+# -----------------------------
+
+def _age_fit(age, centre, inv_half_width, out):
+    """
+    Write into out how well age sits in a preferred range: 1.0 at its centre,
+    falling to 0 at its edges. Unknown (NaN) ages score 0.
+    """
+    np.subtract(age, centre, out=out)
+    np.abs(out, out=out)
+    np.multiply(out, inv_half_width, out=out)
+    np.fmin(out, 1.0, out=out)  # fmin also maps NaN to 1.0
+    np.subtract(1.0, out, out=out)
+    return out
+
+
+def score_block(a, rows, b):
+    """
+    Score profiles a[rows] against every profile in b.
+
+    Returns a float32 matrix (len(rows) x len(b)), at or below INCOMPATIBLE where the pair
+    fails any mutual filter: age in each other's preferred range, ethnicity
+    in each other's preferred backgrounds, and each side open to the other's
+    marriage status / children tags.
+    """
+    a_age = a.age[rows][:, None]
+    a_min = a.pref_min[rows][:, None]
+    a_max = a.pref_max[rows][:, None]
+    b_age = b.age[None, :]
+
+    # Unknown ages are not filtered out, only scored lower
+    ok = ((a_min <= b_age) & (b_age <= a_max)) | np.isnan(b_age)
+    ok &= ((b.pref_min[None, :] <= a_age) & (a_age <= b.pref_max[None, :])) | np.isnan(a_age)
+
+    # Gather whole rows of the transposed preference matrix - far faster than a column gather
+    ok &= np.ascontiguousarray(a.pref_ethnicity[rows].T)[b.ethnicity].T
+    ok &= b.pref_ethnicity[:, a.ethnicity[rows]].T
+
+    ok &= (b.required[None, :] & ~a.open_to[rows][:, None]) == 0
+    ok &= (a.required[rows][:, None] & ~b.open_to[None, :]) == 0
+
+    # Score = same city + how central each age is in the other's preferred range
+    score = np.empty(ok.shape, dtype=np.float32)
+    fit = np.empty(ok.shape, dtype=np.float32)
+    _age_fit(b_age, a.age_centre[rows][:, None], a.age_inv_half_width[rows][:, None], score)
+    score += _age_fit(a_age, b.age_centre[None, :], b.age_inv_half_width[None, :], fit)
+
+    a_res = a.residence[rows][:, None]
+    same_residence = np.equal(a_res, b.residence[None, :])
+    same_residence &= a_res >= 0
+    score += same_residence
+
+    # Arithmetic penalty is much cheaper than a boolean-mask assignment on large blocks
+    penalty = np.logical_not(ok).astype(np.float32)
+    penalty *= INCOMPATIBLE
+    score += penalty
+    return score
+
+
+def top_k_candidates(a, b, top_k=10, block_size=2048):
+    """
+    For each profile in a, the top_k mutually compatible profiles in b.
+
+    Works through a in blocks of block_size rows so memory stays at
+    O(block_size x len(b)) however large both groups are.
+
+    Returns a DataFrame with Profile ID, Candidate ID, Score and Rank.
+    """
+    columns = ["Profile ID", "Candidate ID", "Score", "Rank"]
+    if len(a) == 0 or len(b) == 0:
+        return pd.DataFrame(columns=columns)
+
+    k = min(top_k, len(b))
+    frames = []
+    for start in range(0, len(a), block_size):
+        rows = np.arange(start, min(start + block_size, len(a)))
+        scores = score_block(a, rows, b)
+
+        # Unordered top-k per row, then sort just those k
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        keep = best_scores > INCOMPATIBLE / 2
+        row_idx = np.repeat(rows[:, None], k, axis=1)
+        ranks = np.repeat(np.arange(1, k + 1)[None, :], len(rows), axis=0)
+        frames.append(pd.DataFrame({
+            "Profile ID": a.ids[row_idx[keep]],
+            "Candidate ID": b.ids[best[keep]],
+            "Score": best_scores[keep].round(3),
+            "Rank": ranks[keep],
+        }))
+
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+def match_profiles(records, proc, top_k=10, block_size=2048):
+    """Top-K mutually compatible opposite-gender candidates for every processed profile."""
+    female, male = encode_groups(records, proc)
+    print(f"💞 Matching {len(female)} female x {len(male)} male profiles (top {top_k})")
+    return pd.concat([
+        top_k_candidates(female, male, top_k, block_size),
+        top_k_candidates(male, female, top_k, block_size),
+    ], ignore_index=True)
+
+
+# -----------------------------
+# EXPORT WORKFLOW
+# -----------------------------
+if __name__ == "__main__":
+    # Usage: python profile_matching.py processed.csv [matches.csv] [top_k]
+    with open("category_names.yaml", "r") as file:
+        proc = yaml.safe_load(file)["3ab"]
+
+    input_csv = sys.argv[1]
+    output_csv = sys.argv[2] if len(sys.argv) > 2 else "data/matches.csv"
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    matches = match_profiles(pd.read_csv(input_csv, dtype=str), proc, top_k)
+    os.makedirs(os.path.dirname(output_csv) or ".", exist_ok=True)
+    matches.to_csv(output_csv, index=False)
+    print(f"✅ Wrote {len(matches)} candidate matches to {output_csv}")
@@ -0,0 +1,179 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from tenancy import data_path
+
+load_dotenv()
+
+
+def profiling_requested():
+    """True if the run was started with --profile or PROFILE=1."""
+    return "--profile" in sys.argv or os.getenv("PROFILE", "").strip().lower() in ("1", "true", "yes")
+
+
+PROFILE = profiling_requested()
+
+# Stack samples are taken this often from every thread inside a profiled stage
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", 5))  # hotspots listed per stage in the summary
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for named pipeline stages.
+
+    Threads mark the stage they are in with stage(); a background thread
+    reads every such thread's Python stack each PROFILE_INTERVAL_MS and
+    counts it under the thread's stage path. Threads outside any stage are
+    not sampled, and with profiling off stage() does nothing at all.
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.active = {}                   # thread id -> stage names, outermost first
+        self.samples = Counter()           # (stage path, stack of frames, root first) -> count
+        self.timings = defaultdict(lambda: [0, 0.0])  # stage -> [calls, wall seconds]
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self._stop = threading.Event()
+        threading.Thread(target=self._sample_loop, daemon=True).start()
+
+    @contextmanager
+    def stage(self, name):
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.active.setdefault(thread_id, []).append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                stages = self.active[thread_id]
+                stages.pop()
+                if not stages:
+                    del self.active[thread_id]
+                # Nested calls of the same stage are timed once, by the outermost
+                if name not in stages:
+                    self.timings[name][0] += 1
+                    self.timings[name][1] += elapsed
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            with self.lock:
+                active = {thread_id: ";".join(stages) for thread_id, stages in self.active.items() if thread_id != me}
+            frames = sys._current_frames()
+            for thread_id, stage_path in active.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[(stage_path, tuple(reversed(stack)))] += 1
+
+    def stop(self):
+        self._stop.set()
+
+    def hotspots(self, stage_name, top=PROFILE_TOP):
+        """Functions with the most samples at the top of the stack inside stage_name: [(function, share)]."""
+        leaves = Counter()
+        for (stage_path, stack), count in self.samples.items():
+            if stage_name in stage_path.split(";"):
+                leaves[stack[-1]] += count
+        total = sum(leaves.values())
+        return [(function, count / total) for function, count in leaves.most_common(top)] if total else []
+
+    def write(self, directory):
+        """
+        Write collapsed stacks ("stage;frame;frame count" lines, as read by
+        flamegraph.pl / speedscope) for the whole run and for each stage, plus
+        summary.json with stage timings and hotspots.
+        """
+        os.makedirs(directory, exist_ok=True)
+        by_stage = defaultdict(list)
+        stage_samples = Counter()
+        lines = []
+        for (stage_path, stack), count in sorted(self.samples.items()):
+            line = f"{stage_path};{';'.join(stack)} {count}"
+            lines.append(line)
+            for stage_name in set(stage_path.split(";")):
+                by_stage[stage_name].append(line)
+                stage_samples[stage_name] += count
+
+        with open(os.path.join(directory, "all.folded"), "w") as file:
+            file.write("\n".join(lines) + "\n")
+        for stage_name, stage_lines in by_stage.items():
+            with open(os.path.join(directory, f"{stage_name}.folded"), "w") as file:
+                file.write("\n".join(stage_lines) + "\n")
+
+        summary = {
+            stage_name: {
+                "calls": calls,
+                "seconds": round(seconds, 3),
+                "samples": stage_samples[stage_name],
+                "hotspots": [{"function": function, "share": round(share, 3)} for function, share in self.hotspots(stage_name)],
+            }
+            for stage_name, (calls, seconds) in self.timings.items()
+        }
+        with open(os.path.join(directory, "summary.json"), "w") as file:
+            json.dump(summary, file, indent=2)
+        return summary
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def _get_profiler():
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler()
+            atexit.register(report)
+        return _profiler
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Mark a block (or, as a decorator, a function) as a named stage for --profile runs.
+
+        with profile_stage("process_amendments"): ...
+        @profile_stage("create_pdf")
+    """
+    if not PROFILE:
+        yield
+        return
+    with _get_profiler().stage(name):
+        yield
+
+
+def report():
+    """Write the profile files and print per-stage timings with their top hotspots."""
+    if _profiler is None or not _profiler.timings:
+        return
+    _profiler.stop()
+
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "run"
+    directory = os.path.join(data_path(PROFILE_DIR), f"{script}_{datetime.now().strftime('%d_%m_%y_%H%M%S')}")
+    summary = _profiler.write(directory)
+
+    print(f"\n{'='*50}")
+    print(f"🔥 PROFILE (sampled every {PROFILE_INTERVAL_MS:g} ms)")
+    for stage_name, stats in sorted(summary.items(), key=lambda item: -item[1]["seconds"]):
+        print(f"   ⏱️ {stage_name}: {stats['seconds']:.2f}s over {stats['calls']} call(s), {stats['samples']} sample(s)")
+        for hotspot in stats["hotspots"]:
+            print(f"      {hotspot['share'] * 100:4.0f}%  {hotspot['function']}")
+    print(f"   📁 Collapsed stacks for flamegraphs: {directory}")
+    print(f"{'='*50}\n")
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from dotenv import load_dotenv
+from tenancy import current_tenant, use_tenant
+
+load_dotenv()
+
+# Worker counts per stage and the number of rendered items allowed to wait for sending.
+# Both pools are threads, so the gain is the overlap of rendering with sending. Rendering is
+# CPU-bound Python (fpdf2) held by the GIL, so more than one render worker does not render faster.
+# Sending is network-bound and does scale with workers.
+PIPELINE_RENDER_WORKERS = int(os.getenv("PIPELINE_RENDER_WORKERS", 1))
+PIPELINE_SEND_WORKERS = int(os.getenv("PIPELINE_SEND_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
+
+_DONE = object()
+
+
+class StageStats:
+    """Counters for one pipeline stage (updated by its workers)."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.failed = 0
+        self.busy = 0.0      # seconds spent inside the stage function, summed over workers
+        self.blocked = 0.0   # seconds spent waiting on the queue (full for render, empty for send)
+        self.lock = threading.Lock()
+
+    def add(self, busy, blocked, ok):
+        with self.lock:
+            self.items += 1
+            self.failed += 0 if ok else 1
+            self.busy += busy
+            self.blocked += blocked
+
+    def line(self, wall):
+        rate = self.items / wall if wall else 0.0
+        utilisation = self.busy / (wall * self.workers) * 100 if wall else 0.0
+        return (f"{self.name}: {self.items} item(s), {self.failed} failed, {rate:.2f}/s, "
+                f"{utilisation:.0f}% busy x{self.workers}, {self.blocked:.1f}s waiting on queue")
+
+
+def run_pipeline(items, render, send, render_workers=PIPELINE_RENDER_WORKERS,
+                 send_workers=PIPELINE_SEND_WORKERS, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Render items and send them in two overlapping stages (thread pools: the
+    next item renders while the previous one is sent, but renders themselves
+    do not run in parallel).
+
+    render(item) runs in the render pool and returns what send needs;
+    send(item, rendered) runs in the send pool. The bounded queue between
+    them gives backpressure: renderers block once queue_size rendered items
+    are waiting, so PDFs are never produced far ahead of the network.
+    An exception in either stage is printed and counts the item as failed.
+
+    Returns {"render": StageStats, "send": StageStats, "wall": seconds}.
+    """
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+
+    ready = queue.Queue(maxsize=max(1, queue_size))
+    render_stats = StageStats("render", render_workers)
+    send_stats = StageStats("send", send_workers)
+    tenant = current_tenant()  # workers act for the tenant that started the pipeline
+
+    def render_worker():
+        with use_tenant(tenant):
+            render_loop()
+
+    def send_worker():
+        with use_tenant(tenant):
+            send_loop()
+
+    def render_loop():
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                rendered = render(item)
+            except Exception as e:
+                render_stats.add(time.perf_counter() - start, 0.0, False)
+                print(f"❌ Render failed: {e}")
+                continue
+            busy = time.perf_counter() - start
+            ready.put((item, rendered))
+            render_stats.add(busy, time.perf_counter() - start - busy, True)
+
+    def send_loop():
+        while True:
+            wait_start = time.perf_counter()
+            entry = ready.get()
+            blocked = time.perf_counter() - wait_start
+            if entry is _DONE:
+                return
+            item, rendered = entry
+            start = time.perf_counter()
+            try:
+                send(item, rendered)
+                ok = True
+            except Exception as e:
+                print(f"❌ Send failed: {e}")
+                ok = False
+            send_stats.add(time.perf_counter() - start, blocked, ok)
+
+    wall_start = time.perf_counter()
+    renderers = [threading.Thread(target=render_worker, daemon=True) for _ in range(max(1, render_workers))]
+    senders = [threading.Thread(target=send_worker, daemon=True) for _ in range(max(1, send_workers))]
+    for thread in renderers + senders:
+        thread.start()
+
+    for thread in renderers:
+        thread.join()
+    for _ in senders:
+        ready.put(_DONE)
+    for thread in senders:
+        thread.join()
+
+    wall = time.perf_counter() - wall_start
+    print(f"⚙️ Pipeline finished in {wall:.1f}s")
+    print(f"   {render_stats.line(wall)}")
+    print(f"   {send_stats.line(wall)}")
+    return {"render": render_stats, "send": send_stats, "wall": wall}
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+from datetime import datetime
+import pandas as pd
+from dotenv import load_dotenv
+from tenancy import data_path
+
+load_dotenv()
+
+# Journal of the run in progress; removed once the run completes
+JOURNAL_FILE = "data/run_journal.jsonl"
+
+# A journal whose resumes keep failing is set aside after this many attempts, so a plan
+# that breaks the same way every time is not replayed forever
+JOURNAL_MAX_RESUMES = int(os.getenv("JOURNAL_MAX_RESUMES", 3))
+
+
+def frame_to_json(frame):
+    """DataFrame -> JSON-able dict (split layout, index kept, NaN as None)."""
+    return {
+        "index": frame.index.tolist(),
+        "columns": frame.columns.tolist(),
+        "data": frame.astype(object).where(frame.notna(), None).values.tolist(),
+    }
+
+
+def frame_from_json(value):
+    return pd.DataFrame(value["data"], index=value["index"], columns=value["columns"])
+
+
+class RunJournal:
+    """
+    Append-only, fsync'd record of a run's progress.
+
+    Each completed step is written as one JSON line before the run moves on,
+    e.g. {"key": "F1234", "step": "email_sent"}. Snapshots of the inputs a run
+    works from (records, sheet values) are journaled too. If the process dies,
+    the next run finds the unfinished journal and resumes: it reuses the
+    snapshots instead of re-downloading sheets and skips every step already done.
+
+    Every resume is journaled too. After max_resumes of them without the run
+    completing, the journal is renamed to *.abandoned-<time> and the run starts fresh.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, enabled=True, max_resumes=JOURNAL_MAX_RESUMES):
+        self.path = data_path(path)
+        self.enabled = enabled
+        self.steps = {}       # (key, step) -> data
+        self.snapshots = {}   # name -> JSON value
+        self.resumes = 0      # earlier resumes of this journal that did not complete
+        self.resuming = False
+        self.lock = threading.Lock()  # steps may be recorded from pipeline worker threads
+
+        if enabled and os.path.exists(self.path):
+            valid_bytes = 0
+            with open(self.path, "rb") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final line from a crash mid-write
+                    valid_bytes += len(line)
+                    if "snapshot" in entry:
+                        self.snapshots[entry["snapshot"]] = entry["value"]
+                    elif "resume" in entry:
+                        self.resumes += 1
+                    elif "step" in entry:
+                        self.steps[(entry["key"], entry["step"])] = entry.get("data", {})
+            # Drop the torn line so new entries start on a clean line
+            if valid_bytes < os.path.getsize(self.path):
+                os.truncate(self.path, valid_bytes)
+            self.resuming = bool(self.snapshots or self.steps)
+
+        if self.resuming and self.resumes >= max_resumes:
+            abandoned = f"{self.path}.abandoned-{datetime.now():%Y%m%d-%H%M%S}"
+            os.replace(self.path, abandoned)
+            print(f"⚠️ Giving up on the interrupted run in {self.path}: {self.resumes} resume(s) failed. "
+                  f"Starting fresh; the journal was kept as {abandoned}")
+            self.steps, self.snapshots, self.resumes, self.resuming = {}, {}, 0, False
+
+        if self.resuming:
+            print(f"♻️ Resuming interrupted run from {self.path} ({len(self.steps)} steps already done, "
+                  f"attempt {self.resumes + 1} of {max_resumes})")
+            self._append({"resume": self.resumes + 1, "at": datetime.now().isoformat(timespec="seconds")})
+
+    def _append(self, entry):
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(entry, default=str) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    # ---- steps ----
+
+    def done(self, key, step):
+        return (str(key), step) in self.steps
+
+    def data(self, key, step):
+        """Data recorded with a completed step (empty dict if none)."""
+        return self.steps.get((str(key), step), {})
+
+    def record(self, key, step, **data):
+        """Mark a step as done; data is stored alongside it for the resume."""
+        with self.lock:
+            self.steps[(str(key), step)] = data
+            self._append({"key": str(key), "step": step, "data": data, "at": datetime.now().isoformat(timespec="seconds")})
+
+    # ---- snapshots ----
+
+    def snapshot(self, name, loader):
+        """Return the journaled value for name, or call loader() and journal its result."""
+        if name in self.snapshots:
+            return self.snapshots[name]
+        value = loader()
+        self.snapshots[name] = value
+        self._append({"snapshot": name, "value": value})
+        return value
+
+    def snapshot_frame(self, name, loader):
+        """snapshot() for DataFrames, preserving the index (sheet row positions)."""
+        return frame_from_json(self.snapshot(name, lambda: frame_to_json(loader())))
+
+    def complete(self):
+        """The run finished: drop the journal so the next run starts fresh."""
+        if self.enabled and os.path.exists(self.path):
+            os.remove(self.path)
+        self.steps, self.snapshots, self.resuming = {}, {}, False
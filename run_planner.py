@@ -0,0 +1,181 @@
+import inspect
+import json
+import os
+import sys
+from datetime import datetime
+
+# -----------------------------
+# QUOTAS (used to estimate how much of each budget a run consumes)
+# -----------------------------
+SHEETS_READS_PER_MINUTE = 60    # Google Sheets API, read requests per minute per user
+SHEETS_WRITES_PER_MINUTE = 60   # Google Sheets API, write requests per minute per user
+GMAIL_EMAILS_PER_DAY = 500      # Gmail SMTP sending limit for a personal account
+TELEGRAM_POSTS_PER_MINUTE = 20  # Telegram limit for messages to the same channel
+
+SHEET_WRITE_METHODS = {"update", "update_cell", "update_cells", "append_row", "append_rows", "batch_update", "add_cols"}
+
+
+def dry_run_requested():
+    """True if the run was started with --dry-run or DRY_RUN=1."""
+    return "--dry-run" in sys.argv or os.getenv("DRY_RUN", "").strip().lower() in ("1", "true", "yes")
+
+
+class TrackedSheet:
+    """
+    Wraps a gspread worksheet for a dry run.
+
+    Reads are passed through (and counted); writes are recorded in the plan
+    instead of being sent to Google Sheets.
+    """
+
+    def __init__(self, sheet, name, plan):
+        self._sheet = sheet
+        self._name = name
+        self._plan = plan
+
+    def __getattr__(self, attr):
+        if attr in SHEET_WRITE_METHODS:
+            return lambda *args, **kwargs: self._plan.record_sheet_write(self._name, attr, args, kwargs)
+        target = getattr(self._sheet, attr)
+        if callable(target):
+            def counted_read(*args, **kwargs):
+                self._plan.sheet_reads += 1
+                return target(*args, **kwargs)
+            return counted_read
+        return target
+
+
+class RunPlan:
+    """Collects the writes a run would perform, for printing and JSON export."""
+
+    def __init__(self, script_name):
+        self.script_name = script_name
+        self.sheet_reads = 0
+        self.sheet_writes = []
+        self.pdfs = []
+        self.emails = []
+        self.telegram_posts = []
+
+    def track(self, sheet, name):
+        """Wrap a worksheet so its writes are planned rather than performed."""
+        return TrackedSheet(sheet, name, self)
+
+    def record_sheet_write(self, sheet_name, method, args, kwargs):
+        """Record a worksheet write call and the number of rows / cells it touches."""
+        entry = {"sheet": sheet_name, "method": method}
+        if method == "update_cell":
+            row, col, value = args[:3]
+            entry.update(row=row, col=col, value=str(value), cells=1)
+        elif method in ("append_rows", "update"):
+            values = args[0] if args else kwargs.get("values", [])
+            entry.update(rows=len(values), cells=sum(len(row) for row in values))
+            if "range_name" in kwargs:
+                entry["range"] = kwargs["range_name"]
+        elif method == "batch_update":
+            data = args[0] if args else kwargs.get("data", [])
+            entry.update(ranges=len(data), cells=sum(len(row) for item in data for row in item["values"]))
+        elif method == "append_row":
+            values = args[0] if args else kwargs.get("values", [])
+            entry.update(rows=1, cells=len(values))
+        elif method == "add_cols":
+            entry.update(cols=args[0] if args else kwargs.get("cols", 0))
+        self.sheet_writes.append(entry)
+
+    def record_pdf(self, profile_id):
+        self.pdfs.append(profile_id)
+
+    def record_email(self, kind, to_email, profile_id=None, matched_on=None):
+        email = {"kind": kind, "to": to_email, "profile_id": profile_id}
+        if matched_on is not None:
+            email["matched_on"] = matched_on
+        self.emails.append(email)
+
+    def record_telegram_post(self, profile_id, sheet_name):
+        self.telegram_posts.append({"profile_id": profile_id, "sheet": sheet_name})
+
+    def email_stub(self, kind, send):
+        """Return a stand-in for the email_formation function send that records instead of sending."""
+        signature = inspect.signature(send)
+
+        def planned_email(*args, **kwargs):
+            # bind against the real sender so each argument is read by name, whatever its position
+            call = signature.bind(*args, **kwargs).arguments
+            self.record_email(kind, call["to_email"], call.get("profile_id"), call.get("matched_on"))
+        return planned_email
+
+    def summary(self):
+        """Totals, estimated API calls and quota usage for the planned run."""
+        rows_appended = sum(w.get("rows", 0) for w in self.sheet_writes if w["method"].startswith("append"))
+        cells_updated = sum(w.get("cells", 0) for w in self.sheet_writes if not w["method"].startswith("append"))
+        write_calls = len(self.sheet_writes)
+
+        return {
+            "rows_appended": rows_appended,
+            "cells_updated": cells_updated,
+            "pdfs_rendered": len(self.pdfs),
+            "emails_queued": len(self.emails),
+            "telegram_posts": len(self.telegram_posts),
+            "api_calls": {
+                "sheets_read": self.sheet_reads,
+                "sheets_write": write_calls,
+                "smtp_send": len(self.emails),
+                "telegram": len(self.telegram_posts),
+            },
+            "quota_usage": {
+                "sheets_write_minutes": round(write_calls / SHEETS_WRITES_PER_MINUTE, 2),
+                "sheets_read_minutes": round(self.sheet_reads / SHEETS_READS_PER_MINUTE, 2),
+                "gmail_daily_percent": round(100 * len(self.emails) / GMAIL_EMAILS_PER_DAY, 1),
+                "telegram_minutes": round(len(self.telegram_posts) / TELEGRAM_POSTS_PER_MINUTE, 2),
+            },
+        }
+
+    def report(self, output_path=None):
+        """Print the plan and write it as JSON; returns the JSON path."""
+        summary = self.summary()
+        from tenancy import data_path  # tenancy imports this module's quota constants
+        output_path = output_path or os.getenv(
+            "DRY_RUN_REPORT", data_path(f"data/dry_run_{self.script_name}_{datetime.now().strftime('%d_%m_%y_%H%M%S')}.json")
+        )
+
+        print(f"\n{'='*50}")
+        print(f"🧪 DRY RUN PLAN ({self.script_name}) - nothing was written")
+        for write in self.sheet_writes:
+            if write["method"] == "update_cell":
+                target = f"row {write['row']} col {write['col']}"
+            elif write["method"] == "batch_update":
+                target = f"{write['cells']} cell(s) in {write['ranges']} range(s)"
+            elif write["method"] == "add_cols":
+                target = f"{write['cols']} column(s)"
+            else:
+                target = f"{write.get('rows', 0)} row(s)"
+            print(f"   📝 {write['sheet']}.{write['method']}: {target}")
+        for profile_id in self.pdfs:
+            print(f"   📄 Render PDF: {profile_id}")
+        for email in self.emails:
+            about = email["profile_id"] or f"matched on {email.get('matched_on')}"
+            print(f"   📩 {email['kind']} email: {about} → {email['to']}")
+        for post in self.telegram_posts:
+            print(f"   📤 Telegram post: {post['profile_id']} ({post['sheet']})")
+
+        print(f"   Rows appended: {summary['rows_appended']} | Cells updated: {summary['cells_updated']}")
+        print(f"   PDFs: {summary['pdfs_rendered']} | Emails: {summary['emails_queued']} | Telegram posts: {summary['telegram_posts']}")
+        calls = summary["api_calls"]
+        quota = summary["quota_usage"]
+        print(f"   API calls: {calls['sheets_read']} Sheets reads, {calls['sheets_write']} Sheets writes, "
+              f"{calls['smtp_send']} SMTP sends, {calls['telegram']} Telegram calls")
+        print(f"   Quota: ~{quota['sheets_write_minutes']} min of Sheets write quota, "
+              f"{quota['gmail_daily_percent']}% of daily Gmail limit")
+        print(f"{'='*50}\n")
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump({
+                "script": self.script_name,
+                "summary": summary,
+                "sheet_writes": self.sheet_writes,
+                "pdfs": self.pdfs,
+                "emails": self.emails,
+                "telegram_posts": self.telegram_posts,
+            }, file, indent=2, default=str)
+        print(f"🧪 Dry run plan written to {output_path}")
+        return output_path
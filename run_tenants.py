@@ -0,0 +1,100 @@
+import os
+import runpy
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from tenancy import load_tenants, use_tenant, current_tenant
+
+load_dotenv()
+
+# Pipeline stages, run in this order for each tenant
+STAGES = {
+    "generate": "1_profile_generator.py",
+    "check": "2_profile_checker.py",
+    "post": "3_telegram_bot.py",
+}
+
+# Tenants processed at the same time (render / SMTP / Sheets pools are shared, see tenancy.py)
+TENANT_WORKERS = int(os.getenv("TENANT_WORKERS", 4))
+
+
+class TenantOutput:
+    """stdout wrapper that prefixes each line with the tenant its thread is working for."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.buffers = threading.local()
+
+    def write(self, text):
+        buffered = getattr(self.buffers, "text", "") + text
+        *lines, self.buffers.text = buffered.split("\n")
+        if lines:
+            prefix = f"[{current_tenant().name}] "
+            with self.lock:
+                self.stream.write("".join(f"{prefix}{line}\n" for line in lines))
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_stage(tenant, stage):
+    """Run one pipeline script for tenant; returns (status, seconds)."""
+    start = time.perf_counter()
+    with use_tenant(tenant):
+        try:
+            runpy.run_path(STAGES[stage], run_name="__main__")
+            status = "ok"
+        except SystemExit as e:
+            status = "ok" if e.code in (None, 0) else f"exit {e.code}"
+        except Exception as e:
+            traceback.print_exc()
+            status = f"failed: {e}"
+    return status, time.perf_counter() - start
+
+
+def run_tenant(tenant, stages):
+    """Run the stages in order for one tenant, stopping at the first failure."""
+    results = []
+    for stage in stages:
+        status, seconds = run_stage(tenant, stage)
+        results.append((stage, status, seconds))
+        if status != "ok":
+            break
+    return results
+
+
+# -----------------------------
+# MULTI-COMMUNITY WORKFLOW
+# -----------------------------
+if __name__ == "__main__":
+    # Usage: python run_tenants.py [generate,check,post] [TENANT ...] [--dry-run]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    stages = list(STAGES)
+    if args and set(args[0].split(",")) <= STAGES.keys():
+        stages = args.pop(0).split(",")
+    names = set(args)
+
+    tenants = [tenant for tenant in load_tenants() if not names or tenant.name in names]
+    if not tenants:
+        print("⚠️ No tenants found (add YAML files to the tenants/ folder)")
+        sys.exit(1)
+
+    print(f"🏘️ Running {', '.join(stages)} for {len(tenants)} tenant(s) with {TENANT_WORKERS} worker(s)")
+    sys.stdout = TenantOutput(sys.stdout)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=TENANT_WORKERS) as pool:
+        outcomes = dict(zip(tenants, pool.map(lambda tenant: run_tenant(tenant, stages), tenants)))
+    sys.stdout = sys.stdout.stream
+
+    print(f"\n{'='*50}")
+    print(f"📊 TENANTS SUMMARY ({time.perf_counter() - start:.1f}s)")
+    for tenant, results in outcomes.items():
+        steps = ", ".join(f"{stage} {status} ({seconds:.1f}s)" for stage, status, seconds in results)
+        print(f"   {tenant.name}: {steps}")
+    print(f"{'='*50}\n")
+    sys.exit(0 if all(status == "ok" for results in outcomes.values() for _, status, _ in results) else 1)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+import pandas as pd
+from tenancy import data_path
+
+# Inverted index over profile free text, kept next to the processed data
+SEARCH_INDEX_FILE = "data/search_index.json"
+
+# Bumped whenever tokenize() changes; an index saved by another version is rebuilt from scratch
+SEARCH_INDEX_VERSION = 2
+
+# Free-text fields (3ab keys) that are indexed
+SEARCH_KEYS = ["Self Summary", "Work Education", "My Islam", "Dress", "I'm looking for..."]
+
+# Position gap between fields so phrases never match across two fields
+FIELD_GAP = 1000
+
+# BM25 parameters and the boost for results containing the whole query as a phrase
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BOOST = 2.0
+
+
+def tokenize(text):
+    """
+    Casefold a text and split it into word tokens in any script (Arabic, Urdu, ...).
+    Diacritics (e.g. Arabic harakat, accents) and the Arabic tatweel are dropped,
+    so a word matches with or without them.
+    """
+    if text is None or pd.isna(text):
+        return []
+    text = unicodedata.normalize("NFKD", str(text).casefold().replace("\u2019", "'"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn").replace("\u0640", "")
+    return [token.strip("'") for token in re.findall(r"[\w']+", text, re.UNICODE) if token.strip("'")]
+
+
+class SearchIndex:
+    """
+    Positional inverted index: term -> {profile_id: [positions]}.
+
+    Each profile's indexed text is fingerprinted, so update() only re-indexes
+    profiles whose text changed and drops profiles no longer present.
+    """
+
+    def __init__(self, postings=None, docs=None):
+        self.postings = postings or {}
+        self.docs = docs or {}  # profile_id -> {"hash", "length", "terms"}
+
+    @classmethod
+    def load(cls, path=SEARCH_INDEX_FILE):
+        """Load a saved index, or an empty one if none exists yet."""
+        path = data_path(path)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as file:
+            saved = json.load(file)
+        if saved.get("version") != SEARCH_INDEX_VERSION:
+            print("🔎 Search index was built by an older tokenizer - re-indexing every profile")
+            return cls()
+        return cls(saved["postings"], saved["docs"])
+
+    def save(self, path=SEARCH_INDEX_FILE):
+        path = data_path(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"version": SEARCH_INDEX_VERSION, "postings": self.postings, "docs": self.docs}, file)
+        os.replace(temp_path, path)
+
+    def _remove(self, profile_id):
+        doc = self.docs.pop(profile_id, None)
+        if doc is None:
+            return
+        for term in doc["terms"]:
+            postings = self.postings.get(term, {})
+            postings.pop(profile_id, None)
+            if not postings:
+                self.postings.pop(term, None)
+
+    def _add(self, profile_id, fields, fingerprint):
+        positions = {}
+        offset = 0
+        for text in fields:
+            tokens = tokenize(text)
+            for position, token in enumerate(tokens, start=offset):
+                positions.setdefault(token, []).append(position)
+            offset += len(tokens) + FIELD_GAP
+
+        for term, term_positions in positions.items():
+            self.postings.setdefault(term, {})[profile_id] = term_positions
+        self.docs[profile_id] = {
+            "hash": fingerprint,
+            "length": sum(len(p) for p in positions.values()),
+            "terms": list(positions),
+        }
+
+    def update(self, proc_records, proc):
+        """
+        Bring the index in line with the processed records.
+
+        Returns (indexed, removed) counts.
+        """
+        columns = [proc[key] for key in SEARCH_KEYS]
+        seen = set()
+        indexed = 0
+
+        for _, row in proc_records.iterrows():
+            profile_id = str(row.get(proc["Profile ID"], "")).strip()
+            if not profile_id:
+                continue
+            seen.add(profile_id)
+
+            fields = [row.get(col, "") for col in columns]
+            fingerprint = hashlib.sha1("\x1f".join(str(f) for f in fields).encode()).hexdigest()
+            if self.docs.get(profile_id, {}).get("hash") == fingerprint:
+                continue
+
+            self._remove(profile_id)
+            self._add(profile_id, fields, fingerprint)
+            indexed += 1
+
+        removed = [profile_id for profile_id in self.docs if profile_id not in seen]
+        for profile_id in removed:
+            self._remove(profile_id)
+        return indexed, len(removed)
+
+    def _phrase_docs(self, terms):
+        """Profile IDs in which terms appear consecutively."""
+        if not terms or any(term not in self.postings for term in terms):
+            return set()
+        candidates = set(self.postings[terms[0]])
+        for term in terms[1:]:
+            candidates &= set(self.postings[term])
+
+        matches = set()
+        for profile_id in candidates:
+            starts = set(self.postings[terms[0]][profile_id])
+            for shift, term in enumerate(terms[1:], start=1):
+                starts &= {p - shift for p in self.postings[term][profile_id]}
+                if not starts:
+                    break
+            if starts:
+                matches.add(profile_id)
+        return matches
+
+    def search(self, query, limit=10):
+        """
+        Ranked search. Words are scored with BM25; "quoted phrases" must appear
+        exactly, and results containing the whole query as a phrase are boosted.
+
+        Returns a list of (profile_id, score), best first.
+        """
+        phrases = [tokenize(p) for p in re.findall(r'"([^"]+)"', query)]
+        terms = tokenize(query)
+        if not terms or not self.docs:
+            return []
+
+        n_docs = len(self.docs)
+        avg_length = sum(doc["length"] for doc in self.docs.values()) / n_docs
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term, {})
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for profile_id, positions in postings.items():
+                tf = len(positions)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.docs[profile_id]["length"] / avg_length)
+                scores[profile_id] = scores.get(profile_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        for phrase in phrases:
+            required = self._phrase_docs(phrase)
+            scores = {profile_id: score for profile_id, score in scores.items() if profile_id in required}
+
+        if len(terms) > 1:
+            for profile_id in self._phrase_docs(terms) & scores.keys():
+                scores[profile_id] *= PHRASE_BOOST
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def update_search_index(proc_records, proc):
+    """Incrementally update the saved search index from the processed records."""
+    index = SearchIndex.load()
+    indexed, removed = index.update(proc_records, proc)
+    index.save()
+    print(f"🔎 Search index: re-indexed {indexed}, removed {removed}, total {len(index.docs)} profiles")
+    return index
+
+
+# -----------------------------
+# QUERY WORKFLOW
+# -----------------------------
+if __name__ == "__main__":
+    # Usage: python search_index.py 'hanafi "software engineer" london'
+    query = " ".join(sys.argv[1:])
+    results = SearchIndex.load().search(query)
+
+    print(f"🔎 {len(results)} result(s) for: {query}")
+    for rank, (profile_id, score) in enumerate(results, start=1):
+        print(f"   {rank}. {profile_id}  ({score:.2f})")
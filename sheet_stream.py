@@ -0,0 +1,52 @@
+import os
+import pandas as pd
+from dotenv import load_dotenv
+from gspread.utils import numericise_all, rowcol_to_a1
+
+load_dotenv()
+
+# Rows fetched per Sheets API call when streaming a worksheet
+SHEET_CHUNK_ROWS = int(os.getenv("SHEET_CHUNK_ROWS", 2000))
+
+
+def iter_sheet_chunks(sheet, chunk_rows=SHEET_CHUNK_ROWS):
+    """
+    Page through a worksheet in fixed-size row ranges, yielding DataFrames.
+
+    Values are typed the way get_all_records() types them (numbers become
+    int/float, blanks stay ""), and each chunk is indexed by the row's 0-based
+    data position, so index + 2 is still the sheet row number. Only one chunk
+    of raw values is held at a time.
+    """
+    headers = sheet.row_values(1)
+    if not headers:
+        return
+    last_column = rowcol_to_a1(1, len(headers)).rstrip("0123456789")
+
+    start = 2
+    while start <= sheet.row_count:
+        end = min(start + chunk_rows - 1, sheet.row_count)
+        values = sheet.get(f"A{start}:{last_column}{end}", pad_values=True)
+        if values and values != [[]]:
+            rows = [numericise_all((row + [""] * len(headers))[:len(headers)]) for row in values]
+            yield pd.DataFrame(rows, columns=headers, index=range(start - 2, start - 2 + len(rows)))
+        start = end + 1
+
+
+def read_sheet(sheet, keep=None, chunk_rows=SHEET_CHUNK_ROWS):
+    """
+    Stream a worksheet into one DataFrame, optionally filtering each chunk.
+
+    keep(chunk) returns the part of a chunk to retain, so a filter such as
+    "newer than the last processed timestamp" runs with memory bounded by the
+    chunk size plus the rows kept. An empty sheet gives an empty DataFrame
+    with the header columns.
+    """
+    kept = []
+    for chunk in iter_sheet_chunks(sheet, chunk_rows):
+        chunk = keep(chunk) if keep else chunk
+        if not chunk.empty:
+            kept.append(chunk)
+    if not kept:
+        return pd.DataFrame(columns=sheet.row_values(1))
+    return pd.concat(kept) if len(kept) > 1 else kept[0]
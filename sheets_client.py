@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import gspread
+from dotenv import load_dotenv
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+load_dotenv()
+
+SERVICE_ACCOUNT_JSON = os.getenv("SERVICE_ACCOUNT_JSON")
+
+SHEETS_SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive",
+]
+
+# Shared by every script and community using the service account (not per-tenant data)
+TOKEN_CACHE_FILE = "data/sheets_token.json"
+SHEET_KEYS_FILE = "data/sheet_keys.json"
+
+_keys_lock = threading.Lock()
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _write_json(path, value, mode=0o644):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode), "w") as file:
+        json.dump(value, file)
+    os.replace(tmp_path, path)
+
+
+class CachedTokenCredentials(Credentials):
+    """Service-account credentials that save each new access token for the next process to reuse."""
+
+    def refresh(self, request):
+        super().refresh(request)
+        _write_json(TOKEN_CACHE_FILE, {
+            "account": self.service_account_email,
+            "scopes": sorted(self.scopes or []),
+            "token": self.token,
+            "expiry": self.expiry.isoformat(),
+        }, mode=0o600)
+
+
+def authorize(service_account_json=SERVICE_ACCOUNT_JSON, scopes=SHEETS_SCOPES):
+    """
+    gspread client for the service account, reusing the cached access token
+    until it expires instead of exchanging a new one in every process.
+    """
+    creds = CachedTokenCredentials.from_service_account_file(service_account_json, scopes=scopes)
+    cached = _read_json(TOKEN_CACHE_FILE)
+    if cached.get("account") == creds.service_account_email and cached.get("scopes") == sorted(scopes):
+        creds.token = cached["token"]
+        creds.expiry = datetime.fromisoformat(cached["expiry"])
+
+    # Refresh once here so sheets opened in parallel don't each exchange a token
+    if not creds.valid:
+        creds.refresh(Request())
+    return gspread.authorize(creds)
+
+
+def open_spreadsheet(client, title):
+    """
+    Open a spreadsheet by title through the cached title -> key map.
+
+    Only the first open of a title searches Drive; later ones go straight to
+    open_by_key. A key whose spreadsheet is gone or now has another title is
+    looked up again.
+    """
+    key = _read_json(SHEET_KEYS_FILE).get(title)
+    if key:
+        try:
+            spreadsheet = client.open_by_key(key)
+            if spreadsheet.title == title:
+                return spreadsheet
+        except (gspread.SpreadsheetNotFound, PermissionError):
+            pass
+
+    spreadsheet = client.open(title)
+    with _keys_lock:
+        keys = _read_json(SHEET_KEYS_FILE)
+        keys[title] = spreadsheet.id
+        _write_json(SHEET_KEYS_FILE, keys)
+    return spreadsheet
+
+
+def open_spreadsheets(client, titles):
+    """open_spreadsheet for several titles at once, in parallel; results in the same order."""
+    with ThreadPoolExecutor(max_workers=max(1, len(titles))) as pool:
+        return list(pool.map(lambda title: open_spreadsheet(client, title), titles))
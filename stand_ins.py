@@ -0,0 +1,230 @@
+import json
+import os
+import random
+import socketserver
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fault injection for both stand-ins (rates are fractions of requests, 0-1)
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", 50))
+STUB_JITTER_MS = float(os.getenv("STUB_JITTER_MS", 20))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", 0))
+STUB_RETRY_AFTER_RATE = float(os.getenv("STUB_RETRY_AFTER_RATE", 0))
+STUB_RETRY_AFTER_SECONDS = int(os.getenv("STUB_RETRY_AFTER_SECONDS", 1))
+STUB_SEED = os.getenv("STUB_SEED")
+
+TELEGRAM_STUB_PORT = int(os.getenv("TELEGRAM_STUB_PORT", 8081))
+SMTP_SINK_PORT = int(os.getenv("SMTP_SINK_PORT", 1025))
+
+
+class Faults:
+    """
+    Latency and failures to inject into stand-in responses.
+
+    decide() sleeps for the configured latency (plus uniform jitter) and
+    returns "ok", "error" or "retry_after". Counts of each outcome are kept
+    for the end-of-run report.
+    """
+
+    def __init__(self, latency_ms=STUB_LATENCY_MS, jitter_ms=STUB_JITTER_MS, error_rate=STUB_ERROR_RATE,
+                 retry_after_rate=STUB_RETRY_AFTER_RATE, retry_after_seconds=STUB_RETRY_AFTER_SECONDS, seed=STUB_SEED):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.random = random.Random(seed)
+        self.outcomes = Counter()
+        self.lock = threading.Lock()
+
+    def decide(self):
+        with self.lock:
+            delay = (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+            roll = self.random.random()
+        time.sleep(delay)
+        if roll < self.retry_after_rate:
+            outcome = "retry_after"
+        elif roll < self.retry_after_rate + self.error_rate:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        with self.lock:
+            self.outcomes[outcome] += 1
+        return outcome
+
+
+# -----------------------------
+# TELEGRAM BOT API STAND-IN
+# -----------------------------
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, payload = self.server.stub.respond(self.path.rsplit("/", 1)[-1], body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramStub:
+    """
+    Local HTTP server answering the Bot API methods the bot uses
+    (sendPhoto, sendMediaGroup, getMe) with canned messages.
+
+    Point the bot at it with TELEGRAM_API_URL=<stub.url>. Injected errors
+    are HTTP 500s; injected rate limits are 429s with retry_after, which
+    python-telegram-bot raises as RetryAfter.
+    """
+
+    def __init__(self, port=TELEGRAM_STUB_PORT, faults=None):
+        self.faults = faults or Faults()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _TelegramHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.methods = Counter()
+        self.photos = 0
+        self.message_id = 0
+        self.lock = threading.Lock()
+
+    def _message(self):
+        with self.lock:
+            self.message_id += 1
+            message_id = self.message_id
+        return {"message_id": message_id, "date": int(time.time()), "chat": {"id": -100, "type": "channel"}}
+
+    def respond(self, method, body):
+        with self.lock:
+            self.methods[method] += 1
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Stand-in", "username": "stand_in_bot"}}
+
+        outcome = self.faults.decide()
+        if outcome == "retry_after":
+            seconds = self.faults.retry_after_seconds
+            return 429, {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {seconds}",
+                         "parameters": {"retry_after": seconds}}
+        if outcome == "error":
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error (injected)"}
+
+        if method == "sendMediaGroup":
+            count = max(1, body.count(b"attach://"))
+            with self.lock:
+                self.photos += count
+            return 200, {"ok": True, "result": [self._message() for _ in range(count)]}
+        if method == "sendPhoto":
+            with self.lock:
+                self.photos += 1
+        return 200, {"ok": True, "result": self._message()}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# -----------------------------
+# SMTP SINK
+# -----------------------------
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        self.reply("220 localhost stand-in ESMTP")
+        for raw in self.rfile:
+            command = raw.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-localhost\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n")
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                    size += len(line)
+                outcome = sink.faults.decide()
+                if outcome == "retry_after":
+                    self.reply("421 4.7.0 Too many messages, try again later (injected)")
+                    return
+                if outcome == "error":
+                    self.reply("451 4.3.0 Temporary failure (injected)")
+                    continue
+                sink.received(size)
+                self.reply("250 2.0.0 Queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SmtpSink:
+    """
+    Local SMTP server that accepts and discards mail.
+
+    Point email_formation at it with SMTP_HOST=127.0.0.1 and
+    SMTP_PORT=<sink.port>. Injected errors answer the message with a 451;
+    injected rate limits answer 421 and drop the connection, as Gmail does.
+    """
+
+    def __init__(self, port=SMTP_SINK_PORT, faults=None):
+        self.faults = faults or Faults()
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", port), _SmtpHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+        self.messages = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def received(self, size):
+        with self.lock:
+            self.messages += 1
+            self.bytes += size
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    # Serve both stand-ins until interrupted, for running the scripts against by hand
+    telegram_stub = TelegramStub().start()
+    smtp_sink = SmtpSink().start()
+    print(f"🧪 Telegram stand-in: TELEGRAM_API_URL={telegram_stub.url}")
+    print(f"🧪 SMTP sink: SMTP_HOST=127.0.0.1 SMTP_PORT={smtp_sink.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n📊 Telegram calls: {dict(telegram_stub.methods)} | outcomes: {dict(telegram_stub.faults.outcomes)}")
+        print(f"📊 Emails received: {smtp_sink.messages} | outcomes: {dict(smtp_sink.faults.outcomes)}")
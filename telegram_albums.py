@@ -0,0 +1,21 @@
+ALBUM_SIZE = 10  # Telegram allows at most 10 photos per media group
+MIN_ALBUM_SIZE = 2  # ...and at least 2
+
+
+def album_groups(items, size=ALBUM_SIZE):
+    """
+    Split queued items into as few albums of at most `size` as possible, evened out
+    so no album is left with a single item (11 -> 6 + 5, 21 -> 7 + 7 + 7).
+
+    Only a lone item gives a 1-item group; send that one as a plain photo.
+    """
+    if not items:
+        return []
+    count = -(-len(items) // size)  # ceil
+    base, extra = divmod(len(items), count)
+    groups, start = [], 0
+    for i in range(count):
+        end = start + base + (1 if i < extra else 0)
+        groups.append(items[start:end])
+        start = end
+    return groups
@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+import yaml
+from dotenv import load_dotenv
+from sheets_client import open_spreadsheet
+from run_planner import SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, GMAIL_EMAILS_PER_DAY, TELEGRAM_POSTS_PER_MINUTE, SHEET_WRITE_METHODS
+
+load_dotenv()
+
+# One YAML file per community; see tenants/al_rawdha.yaml
+TENANTS_DIR = os.getenv("TENANTS_DIR", "tenants")
+
+# Pools shared by every tenant running in the process
+SHARED_RENDER_WORKERS = int(os.getenv("SHARED_RENDER_WORKERS", os.cpu_count() or 2))
+SHARED_SMTP_CONNECTIONS = int(os.getenv("SHARED_SMTP_CONNECTIONS", 4))
+SHARED_SHEETS_CALLS = int(os.getenv("SHARED_SHEETS_CALLS", 8))
+SHARED_TELEGRAM_CALLS = int(os.getenv("SHARED_TELEGRAM_CALLS", 4))
+
+_shared_slots = {
+    "render": threading.BoundedSemaphore(SHARED_RENDER_WORKERS),
+    "email": threading.BoundedSemaphore(SHARED_SMTP_CONNECTIONS),
+    "sheets_read": threading.BoundedSemaphore(SHARED_SHEETS_CALLS),
+    "sheets_write": threading.BoundedSemaphore(SHARED_SHEETS_CALLS),
+    "telegram": threading.BoundedSemaphore(SHARED_TELEGRAM_CALLS),
+}
+
+# Tenants share one service account, so Google's per-user Sheets quota applies to all of them together
+SHARED_SHEETS_READS_PER_MINUTE = int(os.getenv("SHARED_SHEETS_READS_PER_MINUTE", SHEETS_READS_PER_MINUTE))
+SHARED_SHEETS_WRITES_PER_MINUTE = int(os.getenv("SHARED_SHEETS_WRITES_PER_MINUTE", SHEETS_WRITES_PER_MINUTE))
+
+# Branding used when a tenant file leaves it out; colours default to pdf_formation's scheme
+DEFAULT_BRANDING = {
+    "name": "Al Rawdha",
+    "logo": "logo.jpg",
+}
+
+
+# Posting sheets the checker fills when a tenant file sets no partitions:
+# one per gender. "where" keys are category_names.yaml processed-column keys;
+# "post" marks the sheets the Telegram bot confirms and posts from
+DEFAULT_PARTITIONS = [
+    {"sheet": "post_female", "where": {"Gender": "Female"}, "post": True},
+    {"sheet": "post_male", "where": {"Gender": "Male"}, "post": True},
+]
+
+
+class QuotaExceeded(Exception):
+    """A tenant has used up its daily allowance for an operation."""
+
+
+class TenantConfigError(Exception):
+    """A tenant file names a setting that has no value (e.g. an unset ${VAR})."""
+
+
+class RateLimit:
+    """Sliding one-minute window: acquire() sleeps until a call is allowed."""
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.calls = [t for t in self.calls if now - t < 60]
+                if len(self.calls) < self.per_minute:
+                    self.calls.append(now)
+                    return
+                wait = 60 - (now - self.calls[0])
+            time.sleep(wait)
+
+
+_shared_limits = {
+    "sheets_read": RateLimit(SHARED_SHEETS_READS_PER_MINUTE),
+    "sheets_write": RateLimit(SHARED_SHEETS_WRITES_PER_MINUTE),
+}
+
+
+class Tenant:
+    """
+    One community: its sheets, channel, credentials, branding, column mapping
+    and quotas. String values in the YAML may reference environment variables
+    (${GMAIL_APP_PASSWORD}) so secrets stay out of the file.
+    """
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.sheets = settings.get("sheets", {})
+        self.telegram = settings.get("telegram", {})
+        self.gmail = settings.get("gmail", {})
+        self.branding = {**DEFAULT_BRANDING, **settings.get("branding", {})}
+        self.category_names = settings.get("category_names", "category_names.yaml")
+        self.data_dir = settings.get("data_dir", "data").rstrip("/")
+        self.partitions = settings.get("partitions") or DEFAULT_PARTITIONS
+        self.post_sheets = [rule["sheet"] for rule in self.partitions if rule.get("post")]
+
+        # quotas: None turns throttling off (the plain single-community run)
+        quotas = settings.get("quotas", {})
+        self.emails_per_day = None
+        self.limits = {}
+        if quotas is not None:
+            self.emails_per_day = int(quotas.get("emails_per_day", GMAIL_EMAILS_PER_DAY))
+            self.limits = {
+                "sheets_read": RateLimit(int(quotas.get("sheets_reads_per_minute", SHEETS_READS_PER_MINUTE))),
+                "sheets_write": RateLimit(int(quotas.get("sheets_writes_per_minute", SHEETS_WRITES_PER_MINUTE))),
+                "telegram": RateLimit(int(quotas.get("telegram_posts_per_minute", TELEGRAM_POSTS_PER_MINUTE))),
+            }
+        self.email_lock = threading.Lock()
+
+    def sheet_title(self, role):
+        """Spreadsheet title for role, or role itself when the tenant doesn't map it."""
+        title = self.sheets.get(role, role)
+        if not title:
+            raise TenantConfigError(f"{self.name}: no spreadsheet set for '{role}' (is its environment variable set?)")
+        return title
+
+    @classmethod
+    def from_env(cls):
+        """The single-community setup configured through .env (used when no tenant is active)."""
+        return cls("default", {
+            "sheets": {
+                "raw": os.getenv("RAW_PROFILE_GENERATOR"),
+                "amendments": os.getenv("AMMENDED_PROFILE_GENERATOR"),
+                "processed": os.getenv("PROC_PROFILE_GENERATOR"),
+                "post_female": os.getenv("POST_F_PROF"),
+                "post_male": os.getenv("POST_M_PROF"),
+            },
+            "telegram": {"bot_token": os.getenv("TELEGRAM_BOT_TOKEN"), "channel_id": os.getenv("TELEGRAM_CHANNEL_ID")},
+            "gmail": {"user": os.getenv("GMAIL_USER"), "app_password": os.getenv("GMAIL_APP_PASSWORD")},
+            "quotas": None,
+        })
+
+    def load_config(self):
+        """This tenant's category_names.yaml mapping."""
+        with open(self.category_names, "r") as file:
+            return yaml.safe_load(file)
+
+    def reserve_email(self):
+        """Take one email from today's allowance (persisted in the tenant's data dir); QuotaExceeded if it is used up."""
+        self._count_emails(1)
+
+    def release_email(self):
+        """Hand back a reserved email whose send failed, so only delivered emails use the allowance."""
+        self._count_emails(-1)
+
+    def _count_emails(self, change):
+        if self.emails_per_day is None:
+            return
+        with self.email_lock:
+            path = os.path.join(self.data_dir, "email_quota.json")
+            today = date.today().isoformat()
+            sent = {}
+            if os.path.exists(path):
+                with open(path, "r") as file:
+                    sent = json.load(file)
+            count = sent.get(today, 0)
+            if change > 0 and count >= self.emails_per_day:
+                raise QuotaExceeded(f"{self.name}: daily email quota of {self.emails_per_day} reached")
+            os.makedirs(self.data_dir, exist_ok=True)
+            temp_path = path + ".tmp"
+            with open(temp_path, "w") as file:
+                json.dump({today: max(0, count + change)}, file)
+            os.replace(temp_path, path)
+
+
+def _expand(value):
+    if isinstance(value, str):
+        expanded = os.path.expandvars(value)
+        # expandvars leaves unset variables as the literal "${VAR}"; treat those as
+        # unset so callers fall back to the .env defaults instead of using the text
+        return None if "${" in expanded else expanded
+    if isinstance(value, dict):
+        return {key: _expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+
+def load_tenant(path):
+    with open(path, "r") as file:
+        settings = _expand(yaml.safe_load(file) or {})
+    name = settings.get("name") or os.path.splitext(os.path.basename(path))[0]
+    settings.setdefault("data_dir", os.path.join("data", name))
+    return Tenant(name, settings)
+
+
+def load_tenants(directory=TENANTS_DIR):
+    """All tenants configured in directory, sorted by name."""
+    if not os.path.isdir(directory):
+        return []
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith((".yaml", ".yml")))
+    return [load_tenant(path) for path in paths]
+
+
+# -----------------------------
+# ACTIVE TENANT
+# -----------------------------
+# Each runner thread works for one tenant; modules look it up at call time.
+
+_local = threading.local()
+_default_tenant = None
+
+
+def current_tenant():
+    global _default_tenant
+    tenant = getattr(_local, "tenant", None)
+    if tenant is not None:
+        return tenant
+    if _default_tenant is None:
+        _default_tenant = Tenant.from_env()
+    return _default_tenant
+
+
+@contextmanager
+def use_tenant(tenant):
+    """Make tenant the active one for the current thread."""
+    previous = getattr(_local, "tenant", None)
+    _local.tenant = tenant
+    try:
+        yield tenant
+    finally:
+        _local.tenant = previous
+
+
+def data_path(path):
+    """Map a "data/..." path into the active tenant's data directory."""
+    data_dir = current_tenant().data_dir
+    if data_dir == "data" or path == data_dir or path.startswith(data_dir + "/"):
+        return path
+    if path == "data":
+        return data_dir
+    if path.startswith("data/"):
+        return os.path.join(data_dir, path[len("data/"):])
+    return path
+
+
+@contextmanager
+def tenant_slot(kind):
+    """
+    Take a slot in the shared pool for kind ("render", "email", "sheets_read",
+    "sheets_write", "telegram") after waiting for the active tenant's quota.
+    """
+    tenant = current_tenant()
+    if kind == "email":
+        # Reserved up front so concurrent sends cannot overshoot the quota, and handed back if the send fails
+        tenant.reserve_email()
+        try:
+            with _shared_slots[kind]:
+                yield
+        except BaseException:
+            tenant.release_email()
+            raise
+        return
+    if kind in tenant.limits:
+        tenant.limits[kind].acquire()
+        if kind in _shared_limits:
+            _shared_limits[kind].acquire()
+    with _shared_slots[kind]:
+        yield
+
+
+class TenantSheet:
+    """Worksheet wrapper that routes every API call through the tenant's quota and the shared Sheets pool."""
+
+    def __init__(self, sheet, tenant):
+        self._sheet = sheet
+        self._tenant = tenant
+
+    def __getattr__(self, attr):
+        target = getattr(self._sheet, attr)
+        if not callable(target):
+            return target
+        kind = "sheets_write" if attr in SHEET_WRITE_METHODS else "sheets_read"
+
+        def limited(*args, **kwargs):
+            with use_tenant(self._tenant), tenant_slot(kind):
+                return target(*args, **kwargs)
+        return limited
+
+
+def open_sheet(client, role):
+    """Open the active tenant's sheet for role ("raw", "processed", "post_female", ...) or by its own name."""
+    tenant = current_tenant()
+    return TenantSheet(open_spreadsheet(client, tenant.sheet_title(role)).sheet1, tenant)
+
+
+def open_sheets(client, *roles):
+    """open_sheet for several roles at once, in parallel; results in the same order."""
+    tenant = current_tenant()
+
+    def open_for_tenant(role):
+        with use_tenant(tenant):
+            return open_sheet(client, role)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(roles))) as pool:
+        return list(pool.map(open_for_tenant, roles))
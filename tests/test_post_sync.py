@@ -0,0 +1,78 @@
+import pandas as pd
+from post_sync import ROW_HASH_COLUMN, synced_columns, classify_chunk, latest_timestamp, row_hash
+
+PROC = {field: field for field in [
+    "Timestamp", "Ammended Timestamp", "Profile ID", "Profile Key", "Full Name", "Gender", "Email", "Phone Number",
+]}
+COLUMNS = synced_columns(PROC)
+
+
+def profile(profile_id, **changes):
+    row = {
+        "Timestamp": "05/03/2024 10:00:00",
+        "Ammended Timestamp": "",
+        "Profile ID": profile_id,
+        "Profile Key": f"key-{profile_id}",
+        "Full Name": f"Name {profile_id}",
+        "Gender": "Female",
+        "Email": f"{profile_id.lower()}@x.com",
+        "Phone Number": "07123456789",
+    }
+    row.update(changes)
+    return row
+
+
+def post_index_of(rows):
+    """What index_post_sheet builds from posting-sheet rows that carry their hash."""
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    return {
+        profile_id: (position + 2, row_hash(values), values, post_time)
+        for position, profile_id, values, post_time in zip(
+            frame.index, frame["Profile ID"], frame.itertuples(index=False), latest_timestamp(frame, PROC)
+        )
+    }
+
+
+def test_unchanged_rows_are_dropped_and_new_rows_hashed():
+    post_index = post_index_of([profile("F1")])
+    records = pd.DataFrame([profile("F1"), profile("F2")], columns=COLUMNS)
+
+    updates, new_records = classify_chunk(records, post_index, PROC)
+
+    assert updates == []
+    assert new_records["Profile ID"].tolist() == ["F2"]
+    assert new_records[ROW_HASH_COLUMN].tolist() == [row_hash(records[COLUMNS].iloc[1])]
+
+
+def test_edit_without_newer_timestamp_keeps_confirmation():
+    post_index = post_index_of([profile("F1"), profile("F2")])
+    records = pd.DataFrame([profile("F1", **{"Phone Number": "07999999999"}), profile("F2")], columns=COLUMNS)
+
+    updates, new_records = classify_chunk(records, post_index, PROC)
+
+    assert new_records.empty
+    [(sheet_row, row, changed, new_hash, reset)] = updates
+    assert sheet_row == 2
+    assert changed == ["Phone Number"]
+    assert new_hash == row_hash(records[COLUMNS].iloc[0])
+    assert not reset
+
+
+def test_amended_profile_is_reset():
+    post_index = post_index_of([profile("F1"), profile("F2", **{"Ammended Timestamp": "01/04/2024 09:00:00"})])
+    records = pd.DataFrame([
+        profile("F1", **{"Ammended Timestamp": "20/03/2024 12:00:00", "Full Name": "New Name"}),
+        # An older amendment than the one already posted does not send the profile back for confirmation
+        profile("F2", **{"Ammended Timestamp": "15/03/2024 09:00:00"}),
+    ], columns=COLUMNS)
+
+    updates, _ = classify_chunk(records, post_index, PROC)
+
+    by_id = {row["Profile ID"]: (sheet_row, changed, reset) for sheet_row, row, changed, _, reset in updates}
+    assert by_id["F1"] == (2, ["Ammended Timestamp", "Full Name"], True)
+    assert by_id["F2"] == (3, ["Ammended Timestamp"], False)
+
+
+def test_blank_and_missing_values_hash_alike():
+    assert row_hash(["a", None, ""]) == row_hash(["a", "", float("nan")])
+    assert row_hash(["a", "b"]) != row_hash(["ab", ""])
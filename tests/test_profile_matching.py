@@ -0,0 +1,101 @@
+import random
+import pandas as pd
+import pytest
+from profile_matching import (
+    match_profiles, parse_age, parse_age_range, parse_open_to, parse_preferred_ethnicities,
+    required_tags, normalize_label, build_vocab,
+)
+
+FIELDS = ["Profile ID", "Gender", "Age", "Preferred Age Range", "Ethnicity", "Preferred Ethnic Background",
+          "Marraige Status", "Children?", "Open to matches from", "Residence"]
+PROC = {field: field for field in FIELDS}
+
+
+def random_records(count, seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "Profile ID": f"P{i}",
+            "Gender": rng.choice(["Female", "Male"]),
+            "Age": rng.choice(["22", "27 years", "31", "38", "", None]),
+            "Preferred Age Range": rng.choice(["20-30", "25 to 35", "30+", "under 33", "28", "", None]),
+            "Ethnicity": rng.choice(["Somali", "Arab", "Pakistani", "Bengali", ""]),
+            "Preferred Ethnic Background": rng.choice(["Open to all", "Somali", "Arab, Pakistani", "Bengali", ""]),
+            "Marraige Status": rng.choice(["Never married", "Divorced", "Widowed", ""]),
+            "Children?": rng.choice(["No", "Yes", "2", ""]),
+            "Open to matches from": rng.choice(["Widows, Divorcees", "Parents", "Reverts", "Divorcees, Parents", ""]),
+            "Residence": rng.choice(["London", "Birmingham", " london ", ""]),
+        })
+    return pd.DataFrame(rows)
+
+
+def age_fit(age, pref_min, pref_max):
+    if age != age:  # NaN
+        return 0.0
+    half_width = max((pref_max - pref_min) / 2, 1.0)
+    return 1.0 - min(abs(age - (pref_min + pref_max) / 2) / half_width, 1.0)
+
+
+def reference_matches(records, top_k):
+    """One pair at a time, straight from the parsing rules: the behaviour the arrays must reproduce."""
+    ethnicity_vocab = build_vocab(records["Ethnicity"])
+    profiles = []
+    for _, row in records.iterrows():
+        accepted = parse_preferred_ethnicities(row["Preferred Ethnic Background"], ethnicity_vocab)
+        profiles.append({
+            "id": row["Profile ID"],
+            "gender": row["Gender"].lower(),
+            "age": parse_age(row["Age"]),
+            "range": parse_age_range(row["Preferred Age Range"]),
+            "ethnicity": ethnicity_vocab.get(normalize_label(row["Ethnicity"])),
+            "accepts": set(accepted) if accepted else None,
+            "open_to": parse_open_to(row["Open to matches from"]),
+            "required": required_tags(row["Marraige Status"], row["Children?"]),
+            "residence": normalize_label(row["Residence"]),
+        })
+
+    def accepts(a, b):
+        low, high = a["range"]
+        age_ok = b["age"] != b["age"] or low <= b["age"] <= high
+        # An unknown ethnicity is never filtered out
+        ethnicity_ok = a["accepts"] is None or b["ethnicity"] is None or b["ethnicity"] in a["accepts"]
+        return age_ok and ethnicity_ok and b["required"] & ~a["open_to"] == 0
+
+    results = {}
+    for a in profiles:
+        scores = []
+        for b in profiles:
+            if b["gender"] == a["gender"] or not (accepts(a, b) and accepts(b, a)):
+                continue
+            score = age_fit(b["age"], *a["range"]) + age_fit(a["age"], *b["range"])
+            score += 1.0 if a["residence"] and a["residence"] == b["residence"] else 0.0
+            scores.append(round(score, 3))
+        results[a["id"]] = sorted(scores, reverse=True)[:top_k]
+    return results
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 2048])
+def test_matches_agree_with_pairwise_reference(block_size):
+    records = random_records(120, seed=block_size)
+    top_k = 5
+    matches = match_profiles(records, PROC, top_k=top_k, block_size=block_size)
+    expected = reference_matches(records, top_k)
+
+    for profile_id, scores in expected.items():
+        found = matches[matches["Profile ID"] == profile_id].sort_values("Rank")
+        assert found["Score"].tolist() == pytest.approx(scores, abs=2e-3), profile_id
+        assert found["Rank"].tolist() == list(range(1, len(scores) + 1))
+
+
+def test_matches_are_mutual_and_opposite_gender():
+    records = random_records(80, seed=3)
+    gender = dict(zip(records["Profile ID"], records["Gender"]))
+    matches = match_profiles(records, PROC, top_k=len(records))
+    pairs = set(zip(matches["Profile ID"], matches["Candidate ID"]))
+
+    assert pairs
+    for profile_id, candidate_id in pairs:
+        assert gender[profile_id] != gender[candidate_id]
+        # Every filter is mutual, so with top_k covering everyone each match shows up from both sides
+        assert (candidate_id, profile_id) in pairs
@@ -0,0 +1,63 @@
+import pandas as pd
+from run_journal import RunJournal
+
+
+def test_resume_skips_done_steps_and_reuses_snapshots(tmp_path):
+    path = str(tmp_path / "run_journal.jsonl")
+    records = pd.DataFrame({"Profile ID": ["F1", "M2"], "Email": ["a@x.com", None]}, index=[3, 7])
+
+    journal = RunJournal(path)
+    assert not journal.resuming
+    journal.snapshot_frame("records", lambda: records)
+    journal.record("F1", "email_sent")
+    journal.record("batch", "rows_writing", profile_ids=["F1", "M2"])
+    # ...the process dies here
+
+    resumed = RunJournal(path)
+    assert resumed.resuming
+    assert resumed.done("F1", "email_sent")
+    assert not resumed.done("M2", "email_sent")
+    assert resumed.data("batch", "rows_writing") == {"profile_ids": ["F1", "M2"]}
+
+    def reload():
+        raise AssertionError("a resumed run must not re-read the sheet")
+    snapshot = resumed.snapshot_frame("records", reload)
+    assert snapshot.index.tolist() == [3, 7]
+    assert snapshot["Profile ID"].tolist() == ["F1", "M2"]
+    assert snapshot["Email"].isna().tolist() == [False, True]
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = tmp_path / "run_journal.jsonl"
+    journal = RunJournal(str(path))
+    journal.record("F1", "email_sent")
+    with open(path, "a") as file:
+        file.write('{"key": "M2", "st')  # crash mid-write
+
+    resumed = RunJournal(str(path))
+    assert resumed.done("F1", "email_sent")
+    assert not resumed.done("M2", "email_sent")
+    resumed.record("M2", "email_sent")
+    assert RunJournal(str(path)).done("M2", "email_sent")
+
+
+def test_completed_run_starts_fresh(tmp_path):
+    path = tmp_path / "run_journal.jsonl"
+    journal = RunJournal(str(path))
+    journal.record("F1", "email_sent")
+    journal.complete()
+
+    assert not path.exists()
+    assert not RunJournal(str(path)).resuming
+
+
+def test_journal_is_set_aside_after_repeated_failed_resumes(tmp_path):
+    path = tmp_path / "run_journal.jsonl"
+    RunJournal(str(path), max_resumes=2).record("F1", "email_sent")
+    assert RunJournal(str(path), max_resumes=2).resuming
+    assert RunJournal(str(path), max_resumes=2).resuming
+
+    fresh = RunJournal(str(path), max_resumes=2)
+    assert not fresh.resuming
+    assert not fresh.done("F1", "email_sent")
+    assert list(tmp_path.glob("run_journal.jsonl.abandoned-*"))
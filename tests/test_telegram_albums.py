@@ -0,0 +1,25 @@
+from telegram_albums import album_groups, ALBUM_SIZE, MIN_ALBUM_SIZE
+
+
+def sizes(count):
+    return [len(group) for group in album_groups(list(range(count)))]
+
+
+def test_single_profile_is_not_an_album():
+    # One ready profile goes out through send_image, never as a 1-item media group
+    assert sizes(1) == [1]
+
+
+def test_eleven_profiles_leave_no_single_leftover():
+    groups = album_groups(list(range(11)))
+    assert [len(group) for group in groups] == [6, 5]
+    assert [item for group in groups for item in group] == list(range(11))
+
+
+def test_albums_stay_within_telegram_limits():
+    assert sizes(0) == []
+    for count in range(2, 65):
+        assert all(MIN_ALBUM_SIZE <= size <= ALBUM_SIZE for size in sizes(count)), count
+        assert sum(sizes(count)) == count
+    assert sizes(21) == [7, 7, 7]
+    assert sizes(10) == [10]
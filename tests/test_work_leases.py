@@ -0,0 +1,81 @@
+import time
+import pytest
+from work_leases import LeaseStore, Worker, amendment_key, submission_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LeaseStore(path=str(tmp_path / "leases.sqlite"), ttl=60)
+
+
+def test_a_held_lease_cannot_be_taken_by_another_holder(store):
+    assert store.acquire("submission:a", "worker-0")
+    assert not store.acquire("submission:a", "worker-1")
+    # The same holder (e.g. the restarted worker of that shard) gets it straight back
+    assert store.acquire("submission:a", "worker-0")
+    assert store.holder("submission:a") == "worker-0"
+
+
+def test_completed_keys_are_never_claimed_again(store):
+    assert store.acquire("submission:a", "worker-0")
+    store.complete(["submission:a"], "worker-0")
+    assert not store.acquire("submission:a", "worker-0")
+    assert not store.acquire("submission:a", "worker-1")
+    assert store.done_keys("submission:") == {"submission:a"}
+
+
+def test_released_lease_is_free_at_once(store):
+    assert store.acquire("submission:a", "worker-0")
+    store.release("submission:a", "worker-0")
+    assert store.holder("submission:a") is None
+    assert store.acquire("submission:a", "worker-1")
+
+
+def test_abandoned_lease_frees_up_after_ttl(tmp_path):
+    store = LeaseStore(path=str(tmp_path / "leases.sqlite"), ttl=0.2)
+    assert store.acquire("submission:a", "crashed")
+    assert not store.acquire("submission:a", "worker-1")
+    time.sleep(0.3)
+    assert store.acquire("submission:a", "worker-1")
+
+
+def test_renewed_lease_outlives_its_first_ttl(tmp_path):
+    store = LeaseStore(path=str(tmp_path / "leases.sqlite"), ttl=0.4)
+    assert store.acquire("submission:a", "worker-0")
+    time.sleep(0.25)
+    store.renew(["worker-0"])
+    time.sleep(0.25)
+    assert not store.acquire("submission:a", "worker-1")
+
+
+def test_worker_claims_complete_and_reserve(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("WORKER_SHARD", raising=False)
+    first, second = Worker("profile_generator"), Worker("profile_generator")
+    second.holder += ":other"
+
+    assert first.claim("submission:a")
+    assert not second.claim("submission:a")
+    first.complete("submission:a")
+    assert first.done_keys("submission:") == {"submission:a"}
+
+    assert first.reserve("profile_id:F1234")
+    assert not second.reserve("profile_id:F1234")
+
+    assert first.claim("submission:b")
+    first.release("submission:b")
+    assert second.claim("submission:b")
+
+
+def test_dry_run_worker_claims_everything(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    worker = Worker("profile_generator", enabled=False)
+    assert worker.claim("submission:a") and worker.claim("submission:a")
+    assert worker.done_keys("submission:") == set()
+    assert not (tmp_path / "data").exists()
+
+
+def test_keys_ignore_timestamp_formatting():
+    assert submission_key("05/03/2024 10:00:00", "A@x.com ") == submission_key("2024-03-05 10:00:00", "a@x.com")
+    assert amendment_key("F1", "05/03/2024 10:00:00", "a@x.com") == amendment_key("F1", "2024-03-05T10:00:00", "A@X.COM")
+    assert amendment_key("F1", "05/03/2024 10:00:00", "a@x.com") != amendment_key("F2", "05/03/2024 10:00:00", "a@x.com")
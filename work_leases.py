@@ -0,0 +1,242 @@
+import atexit
+import os
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+from contextlib import closing
+import pandas as pd
+from dotenv import load_dotenv
+from tenancy import current_tenant, data_path
+
+load_dotenv()
+
+# Lease store shared by every worker on this host (one per tenant data folder)
+LEASE_DB = "data/leases.sqlite"
+
+# A lease not renewed for this long is considered abandoned (crashed worker)
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", 120))
+HEARTBEAT_SECONDS = LEASE_TTL_SECONDS / 4
+
+
+def shard_spec():
+    """(shard, shards) from --shard I/N or WORKER_SHARD=I/N; (0, 1) when unsharded."""
+    spec = os.getenv("WORKER_SHARD", "")
+    for i, arg in enumerate(sys.argv):
+        if arg == "--shard" and i + 1 < len(sys.argv):
+            spec = sys.argv[i + 1]
+        elif arg.startswith("--shard="):
+            spec = arg.split("=", 1)[1]
+    if not spec:
+        return 0, 1
+    shard, shards = (int(part) for part in spec.split("/"))
+    if not 0 <= shard < shards:
+        raise ValueError(f"Invalid shard {spec}: expected I/N with 0 <= I < N")
+    return shard, shards
+
+
+def shard_of(key, shards):
+    """Stable shard number for a record key (same on every host and run)."""
+    return zlib.crc32(str(key).encode()) % shards
+
+
+def parse_timestamp(value):
+    """Parse a sheet timestamp: ISO strings as-is, form timestamps day-first."""
+    text = str(value).strip()
+    return pd.to_datetime(text, dayfirst=not re.match(r"^\d{4}-", text), errors="coerce")
+
+
+def sheet_timestamp(value):
+    """A timestamp in the form sheets' own day-first format, so dayfirst parsing reads it back unchanged."""
+    text = "" if pd.isna(value) else str(value).strip()
+    parsed = parse_timestamp(text) if text else pd.NaT
+    return parsed.strftime("%d/%m/%Y %H:%M:%S") if pd.notna(parsed) else text
+
+
+def submission_key(timestamp, email):
+    """Identity of one form submission, stable however its timestamp was formatted."""
+    parsed = parse_timestamp(timestamp)
+    stamp = parsed.isoformat() if pd.notna(parsed) else str(timestamp).strip()
+    return f"submission:{stamp}|{str(email).strip().lower()}"
+
+
+def amendment_key(profile_id, timestamp, email):
+    """Identity of one amendment, independent of its row position in the amendment sheet."""
+    return "amendment:" + submission_key(timestamp, email).split(":", 1)[1] + f"|{profile_id}"
+
+
+class LeaseStore:
+    """
+    SQLite table of leases: key -> (holder, expiry, done).
+
+    acquire() succeeds when the key is free, expired or already held by the
+    same holder, inside an IMMEDIATE transaction so two processes can never
+    both win. complete() marks a key done for good, so later runs skip it.
+    """
+
+    def __init__(self, path=LEASE_DB, ttl=LEASE_TTL_SECONDS):
+        self.path = data_path(path)
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "key TEXT PRIMARY KEY, holder TEXT, expires REAL, done INTEGER DEFAULT 0)"
+            )
+
+    def _connect(self):
+        # A connection per call keeps the store usable from the heartbeat thread
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def acquire(self, key, holder):
+        now = time.time()
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT holder, expires, done FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[2] or (row[0] != holder and row[1] > now)):
+                db.execute("ROLLBACK")
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO leases (key, holder, expires, done) VALUES (?, ?, ?, 0)",
+                (key, holder, now + self.ttl),
+            )
+            db.execute("COMMIT")
+            return True
+        finally:
+            db.close()
+
+    def complete(self, keys, holder):
+        with closing(self._connect()) as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO leases (key, holder, expires, done) VALUES (?, ?, ?, 1)",
+                [(key, holder, time.time()) for key in keys],
+            )
+
+    def release(self, key, holder):
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM leases WHERE key = ? AND holder = ? AND done = 0", (key, holder))
+
+    def renew(self, holders):
+        with closing(self._connect()) as db:
+            db.execute(
+                f"UPDATE leases SET expires = ? WHERE done = 0 AND holder IN ({','.join('?' * len(holders))})",
+                (time.time() + self.ttl, *holders),
+            )
+
+    def holder(self, key):
+        """Current holder of an unfinished lease, or None."""
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT holder FROM leases WHERE key = ? AND done = 0", (key,)).fetchone()
+        return row[0] if row else None
+
+    def done_keys(self, prefix):
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT key FROM leases WHERE done = 1 AND key LIKE ?", (prefix + "%",)).fetchall()
+        return {key for (key,) in rows}
+
+
+def _process_alive(token):
+    """False only if token names a process on this host that no longer exists."""
+    parts = token.split(":")
+    if len(parts) != 3 or parts[0] != socket.gethostname():
+        return True
+    pid = parts[1]
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Worker:
+    """
+    One process working on one shard of a script's records.
+
+    Only one process per (tenant, script, shard) runs at a time: start()
+    takes the worker lease and keeps it (and every record claim) alive with a
+    heartbeat. Records are claimed under a holder name that is stable for the
+    shard, so a restarted worker picks up its own unfinished claims at once,
+    while claims of a crashed worker on another shard layout free up after
+    LEASE_TTL_SECONDS. With enabled=False (dry runs) every check passes.
+    """
+
+    def __init__(self, script_name, enabled=True):
+        self.shard, self.shards = shard_spec()
+        self.enabled = enabled
+        self.label = f"{self.shard}of{self.shards}"
+        self.holder = f"{socket.gethostname()}:{current_tenant().name}:{script_name}:{self.label}"
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"  # this process, for the worker lease
+        self.store = LeaseStore() if enabled else None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Take the worker lease; False if another process is already running this shard."""
+        if not self.enabled:
+            return True
+        key = f"worker:{self.holder}"
+        if not self.store.acquire(key, self.token):
+            # A process on this host that died without stopping need not wait out the TTL
+            owner = self.store.holder(key)
+            if owner is None or _process_alive(owner):
+                return False
+            self.store.release(key, owner)
+            if not self.store.acquire(key, self.token):
+                return False
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+        atexit.register(self.stop)  # a run that ends in an exception frees its shard at once
+        print(f"🔒 Worker {self.label} started")
+        return True
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            try:
+                self.store.renew([self.holder, self.token])
+            except sqlite3.Error as e:
+                print(f"⚠️ Lease heartbeat failed: {e}")
+
+    def stop(self):
+        if not self.enabled or self._stop.is_set():
+            return
+        self._stop.set()
+        self.store.release(f"worker:{self.holder}", self.token)
+
+    def in_shard(self, key):
+        return self.shards == 1 or shard_of(key, self.shards) == self.shard
+
+    def claim(self, key, shard_key=None):
+        """True if the record belongs to this shard and this worker now holds it."""
+        if not self.in_shard(key if shard_key is None else shard_key):
+            return False
+        return not self.enabled or self.store.acquire(key, self.holder)
+
+    def claim_exclusive(self, key):
+        """Claim a key regardless of shard (e.g. a shared maintenance step)."""
+        return not self.enabled or self.store.acquire(key, self.holder)
+
+    def reserve(self, key):
+        """Permanently take a unique value (e.g. a Profile ID); False if anyone already has it."""
+        if not self.enabled:
+            return True
+        if not self.store.acquire(key, self.holder):
+            return False
+        self.store.complete([key], self.holder)
+        return True
+
+    def complete(self, *keys):
+        if self.enabled and keys:
+            self.store.complete(keys, self.holder)
+
+    def release(self, key):
+        if self.enabled:
+            self.store.release(key, self.holder)
+
+    def done_keys(self, prefix):
+        return self.store.done_keys(prefix) if self.enabled else set()